@@ -0,0 +1,118 @@
+"""Before/after timings for the schema migrations (indexes) and WAL tuning.
+
+Builds a synthetic books table with the original schema in the default
+rollback-journal mode, times the repository's query shapes, then opens it
+with BookRepository (which migrates and enables WAL) and times them again.
+
+Usage: PYTHONPATH=. python benchmarks/bench_db.py [--books 1000000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from oceanofpdf_downloader.models import BookState
+from oceanofpdf_downloader.repository import CREATE_TABLE_SQL, BookRepository
+
+STATE_WEIGHTS = {
+    BookState.SKIPPED: 70,
+    BookState.BLACKLISTED: 20,
+    BookState.DONE: 8,
+    BookState.NEW: 2,
+    BookState.RETRY: 0.05,
+    BookState.SCHEDULED: 0.01,
+}
+LANGUAGES = ["English", "German", "French", "Spanish", "Unknown"]
+GENRES = ["Fiction", "Romance", "Historical Fiction, Historical Romance", "Textbooks", "Unknown"]
+
+
+def build(path: str, n: int) -> None:
+    rng = random.Random(42)
+    states = rng.choices(list(STATE_WEIGHTS), weights=list(STATE_WEIGHTS.values()), k=n)
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.executemany(
+        "INSERT INTO books (title, detail_url, language, genre, state, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (f"Book {i}", f"https://oceanofpdf.com/authors/a{i % 5000}/book-{i}/",
+             rng.choice(LANGUAGES), rng.choice(GENRES), states[i].value,
+             f"2026-{1 + i * 12 // n:02d}-01 00:00:00",
+             f"2026-{1 + rng.randrange(12):02d}-{1 + rng.randrange(28):02d} {rng.randrange(24):02d}:00:00")
+            for i in range(n)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def update_state_sql(conn: sqlite3.Connection, book_id: int, state: BookState) -> None:
+    """update_state as it was before state_transitions: one UPDATE and commit."""
+    conn.execute("UPDATE books SET state = ?, updated_at = datetime('now') WHERE id = ?", (state.value, book_id))
+    conn.commit()
+
+
+def measure(repo: BookRepository, migrated: bool = True) -> dict[str, float]:
+    conn = repo._connect()
+    ids = [row[0] for row in conn.execute("SELECT id FROM books ORDER BY random() LIMIT 200")]
+    # The unmigrated schema has no state_transitions table for update_state to log to
+    update_state = repo.update_state if migrated else lambda i, state: update_state_sql(conn, i, state)
+    return {
+        "get_books_by_state(SCHEDULED)": timed(lambda: repo.get_books_by_state(BookState.SCHEDULED)),
+        "get_books_by_state(RETRY)": timed(lambda: repo.get_books_by_state(BookState.RETRY)),
+        "editor first page (ORDER BY updated_at DESC LIMIT 100)": timed(lambda: conn.execute(
+            "SELECT * FROM books WHERE state != 'blacklisted' ORDER BY updated_at DESC LIMIT 100").fetchall()),
+        "count per state (GROUP BY state)": timed(lambda: conn.execute(
+            "SELECT state, COUNT(*) FROM books GROUP BY state").fetchall()),
+        "200 single-row update_state commits": timed(
+            lambda: [update_state(i, BookState.SKIPPED) for i in ids], repeat=1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "books.db")
+        start = time.perf_counter()
+        build(path, args.books)
+        print(f"Built {args.books} books in {time.perf_counter() - start:.1f}s, sqlite {sqlite3.sqlite_version}")
+
+        before_repo = BookRepository.__new__(BookRepository)
+        before_repo.db_path = path
+        before_repo._shared = sqlite3.connect(path)
+        before_repo._shared.row_factory = sqlite3.Row
+        # The repository selects author, which the original schema lacks; add it
+        # just for the "before" run and drop it again so migration 3 can add it.
+        before_repo._shared.execute("ALTER TABLE books ADD COLUMN author TEXT NOT NULL DEFAULT 'Unknown'")
+        before = measure(before_repo, migrated=False)
+        before_repo._shared.execute("ALTER TABLE books DROP COLUMN author")
+        before_repo._shared.commit()
+        before_repo._shared.close()
+
+        start = time.perf_counter()
+        repo = BookRepository(path)
+        print(f"Migrated to schema version {repo.schema_version()} in {time.perf_counter() - start:.1f}s")
+        after = measure(repo)
+
+    width = max(len(name) for name in before)
+    print(f"\n{'query':<{width}}  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}")
+    for name in before:
+        print(f"{name:<{width}}  {before[name]:10.2f}  {after[name]:10.2f}  {before[name] / after[name]:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
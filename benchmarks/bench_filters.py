@@ -0,0 +1,76 @@
+"""Compare the compiled keyword matcher with the original per-keyword loop.
+
+Usage: PYTHONPATH=. python benchmarks/bench_filters.py [--books 100000] [--keywords 5000]
+"""
+import argparse
+import random
+import time
+from unittest.mock import patch
+
+from oceanofpdf_downloader import filters
+from oceanofpdf_downloader.models import Book
+
+GENRES = ["Fiction", "Romance", "Historical Fiction, Historical Romance", "Textbooks", "Mystery, Thriller"]
+
+
+def legacy_is_blacklisted(book: Book) -> bool:
+    """The matching loop filters.py used before keyword lists were compiled."""
+    title_lower = book.title.lower()
+    for word in filters._title_blacklist:
+        if word.lower() in title_lower:
+            return True
+    genre_lower = book.genre.lower()
+    for word in filters._genre_blacklist:
+        if word.lower() in genre_lower:
+            return True
+    language_lower = book.language.lower()
+    for word in filters._language_blacklist:
+        if word.lower() in language_lower:
+            return True
+    return False
+
+
+def make_words(rng: random.Random, n: int) -> list[str]:
+    letters = "abcdefghiklmnoprstuvwy"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(n)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--keywords", type=int, default=5_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    vocab = make_words(rng, 50_000)
+    books = [
+        Book(title=" ".join(rng.choices(vocab, k=rng.randint(2, 6))).title(), detail_url=f"https://x/{i}",
+             language=rng.choice(["English", "German", "French"]), genre=rng.choice(GENRES))
+        for i in range(args.books)
+    ]
+    title_words = [w.title() for w in rng.sample(vocab, args.keywords)]
+    genre_words = make_words(rng, args.keywords // 10) + ["Thriller"]
+
+    with patch.object(filters, "_title_blacklist", title_words), \
+            patch.object(filters, "_genre_blacklist", genre_words), \
+            patch.object(filters, "_language_blacklist", ["Klingon"]):
+        start = time.perf_counter()
+        legacy = [legacy_is_blacklisted(b) for b in books]
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        filters.is_blacklisted(books[0])
+        compile_s = time.perf_counter() - start
+        start = time.perf_counter()
+        compiled = [filters.is_blacklisted(b) for b in books]
+        compiled_s = time.perf_counter() - start
+
+    assert legacy == compiled, "compiled matcher disagrees with the per-keyword loop"
+    print(f"{args.books} books, {len(title_words)} title + {len(genre_words)} genre keywords, "
+          f"{sum(compiled)} blacklisted")
+    print(f"per-keyword loop   {legacy_s * 1000:9.0f} ms")
+    print(f"compiled matcher   {compiled_s * 1000:9.0f} ms  (+{compile_s * 1000:.0f} ms to compile once)")
+    print(f"speedup            {legacy_s / compiled_s:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
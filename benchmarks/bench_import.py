@@ -0,0 +1,61 @@
+"""Compare per-row commits with the single-transaction bulk import.
+
+Usage: PYTHONPATH=. python benchmarks/bench_import.py [--books 10000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.repository import INSERT_BOOK_SQL, BookRepository
+from oceanofpdf_downloader.utils import url_key
+
+
+def make_books(n: int, prefix: str) -> list[Book]:
+    return [
+        Book(title=f"Book {i}", detail_url=f"https://oceanofpdf.com/{prefix}/book-{i}/",
+             language="English", genre="Fiction")
+        for i in range(n)
+    ]
+
+
+def per_row(repo: BookRepository, books: list[Book]) -> int:
+    """The previous import_books: one commit and one follow-up SELECT per book."""
+    conn = repo._connect()
+    count = 0
+    for book in books:
+        cursor = conn.execute(INSERT_BOOK_SQL,
+                              (book.title, book.detail_url, book.language, book.genre, book.author,
+                               url_key(book.detail_url), BookState.NEW.value))
+        conn.commit()
+        if cursor.rowcount:
+            conn.execute("SELECT * FROM books WHERE id = ?", (cursor.lastrowid,)).fetchone()
+            count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = BookRepository(os.path.join(tmp, "books.db"))
+
+        start = time.perf_counter()
+        per_row(repo, make_books(args.books, "per-row"))
+        per_row_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        repo.import_books(make_books(args.books, "bulk"))
+        bulk_s = time.perf_counter() - start
+
+    print(f"{args.books} books, sqlite {sqlite3.sqlite_version}")
+    print(f"  per-row commits : {per_row_s * 1000:9.1f} ms")
+    print(f"  bulk transaction: {bulk_s * 1000:9.1f} ms  ({per_row_s / bulk_s:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare per-book MLSelector.score calls with score_batch.
+
+Needs sentence-transformers and downloads the configured model on first use.
+
+Usage: PYTHONPATH=. python benchmarks/bench_ml.py [--books 2000] [--batch-size 128]
+"""
+import argparse
+import random
+import time
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.ml_selector import MLSelector, SentenceTransformerEmbedder
+from oceanofpdf_downloader.models import Book
+
+WORDS = "the of a and in my love night house secret garden history algebra dragon queen kitchen war".split()
+GENRES = ["Fiction", "Romance", "Historical Fiction", "Textbooks", "Mystery, Thriller"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=128)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    books = [
+        Book(" ".join(rng.choices(WORDS, k=rng.randint(2, 6))).title(), f"https://x/{i}", "English",
+             rng.choice(GENRES))
+        for i in range(args.books)
+    ]
+
+    config = Config(max_pages=1, ml_batch_size=args.batch_size)
+    ml = MLSelector(config)
+    train = books[:200]
+    ml._pipeline = Pipeline([
+        ("embed", SentenceTransformerEmbedder(config.ml_sentence_transformer_model, config.ml_batch_size)),
+        ("clf", LogisticRegression(max_iter=1000)),
+    ]).fit([ml._book_to_text(b) for b in train], [int(b.genre == "Textbooks") for b in train])
+
+    start = time.perf_counter()
+    single = [ml.score(b) for b in books]
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = ml.score_batch(books)
+    batch_s = time.perf_counter() - start
+
+    assert max(abs(a - b) for a, b in zip(single, batch)) < 1e-4
+    print(f"{args.books} books, batch size {args.batch_size}")
+    print(f"score() per book   {single_s:8.2f} s")
+    print(f"score_batch()      {batch_s:8.2f} s")
+    print(f"speedup            {single_s / batch_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
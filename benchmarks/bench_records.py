@@ -0,0 +1,93 @@
+"""Compare the old sqlite3.Row -> dataclass conversion with the positional,
+interning row factory used for BookRecord now.
+
+Reports time and the memory retained by the result list.
+
+Usage: PYTHONPATH=. python benchmarks/bench_records.py [--books 100000]
+"""
+import argparse
+import gc
+import sqlite3
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.repository import BookRepository
+
+LANGUAGES = ["English", "German", "French", "Spanish", "Unknown"]
+GENRES = ["Fiction", "Romance", "Historical Fiction, Historical Romance", "Textbooks", "Unknown"]
+
+
+@dataclass
+class LegacyBookRecord:
+    """BookRecord as it was: a regular dataclass with a __dict__."""
+    id: int
+    title: str
+    detail_url: str
+    language: str
+    genre: str
+    state: BookState
+    created_at: str
+    updated_at: str
+    author: str = "Unknown"
+
+
+def legacy_load(repo: BookRepository) -> list:
+    conn = repo._connect()
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    rows = cursor.execute("SELECT * FROM books WHERE state = 'new'").fetchall()
+    return [
+        LegacyBookRecord(
+            id=row["id"], title=row["title"], detail_url=row["detail_url"],
+            language=row["language"], genre=row["genre"], state=BookState(row["state"]),
+            created_at=row["created_at"], updated_at=row["updated_at"], author=row["author"],
+        )
+        for row in rows
+    ]
+
+
+def compact_load(repo: BookRepository) -> list:
+    return repo.get_books_by_state(BookState.NEW)
+
+
+def measure(fn, repo: BookRepository) -> tuple[float, float]:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        fn(repo)
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    result = fn(repo)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best * 1000, retained / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=100_000)
+    args = parser.parse_args()
+
+    repo = BookRepository(":memory:")
+    repo.insert_books([
+        Book(f"Book {i}", f"https://oceanofpdf.com/authors/a{i % 500}/book-{i}/",
+             LANGUAGES[i % len(LANGUAGES)], GENRES[i % len(GENRES)])
+        for i in range(args.books)
+    ])
+
+    print(f"{args.books} rows")
+    print(f"{'loader':<10}  {'ms':>8}  {'retained MB':>12}")
+    results = {}
+    for name, fn in [("legacy", legacy_load), ("compact", compact_load)]:
+        results[name] = measure(fn, repo)
+        print(f"{name:<10}  {results[name][0]:8.1f}  {results[name][1]:12.1f}")
+    (t0, m0), (t1, m1) = results["legacy"], results["compact"]
+    print(f"saved       {t0 - t1:8.1f}  {m0 - m1:12.1f}   ({t0 / t1:.1f}x faster, {m0 / m1:.1f}x less memory)")
+
+
+if __name__ == "__main__":
+    main()
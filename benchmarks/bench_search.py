@@ -0,0 +1,75 @@
+"""Compare the FTS5 search path with the LIKE fallback.
+
+Usage: PYTHONPATH=. python benchmarks/bench_search.py [--books 300000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from oceanofpdf_downloader.models import Book
+from oceanofpdf_downloader.repository import BookRepository
+
+COMMON = "the of a and in to my love night house secret garden history".split()
+GENRES = ["Fiction", "Romance", "Historical Fiction, Historical Romance", "Textbooks", "Mystery, Thriller"]
+QUERIES = ["python", "histo", '"secret garden"', "dragon queen", "thriller", "kitchn"]
+
+
+def make_vocab(rng: random.Random, n: int) -> list[str]:
+    """Pseudo-words standing in for the long tail of real title vocabulary."""
+    letters = "abcdefghiklmnoprstuvwy"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(n)]
+
+
+def make_title(rng: random.Random, vocab: list[str]) -> str:
+    words = rng.choices(COMMON, k=2) + rng.choices(vocab, k=rng.randint(1, 4))
+    if rng.random() < 0.01:
+        words.append(rng.choice(["python", "dragon", "queen", "kitchen"]))
+    rng.shuffle(words)
+    return " ".join(words).title()
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=300_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    vocab = make_vocab(rng, 50_000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = BookRepository(os.path.join(tmp, "books.db"))
+        repo.insert_books([
+            Book(title=make_title(rng, vocab), detail_url=f"https://x/{i}/",
+                 language=rng.choice(["English", "German"]), genre=rng.choice(GENRES))
+            for i in range(args.books)
+        ])
+        print(f"{args.books} books")
+        print(f"{'query':<18} {'hits':>7} {'LIKE ms':>9} {'FTS ms':>9}")
+        for query in QUERIES:
+            hits = len(repo.search_books(query))
+            like_ms = timed(lambda: repo._search_books_like(query.strip('"')))
+            fts_ms = timed(lambda: repo.search_books(query))
+            print(f"{query:<18} {hits:7d} {like_ms:9.1f} {fts_ms:9.1f}")
+
+        # The editor shows the first screenful; ranked FTS can stop early
+        print("\nfirst 50 hits only (LIMIT applied to the same ranked query):")
+        conn = repo._connect()
+        for query in QUERIES:
+            fts_ms = timed(lambda: conn.execute(
+                "SELECT rowid FROM books_fts WHERE books_fts MATCH ? ORDER BY rank LIMIT 50",
+                (query if query.startswith('"') else f'"{query}"*',)).fetchall())
+            print(f"{query:<18} {fts_ms:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Time a full export and a fresh import of a synthetic books database.
+
+Usage: PYTHONPATH=. python benchmarks/bench_transfer.py [--books 1000000] [--format jsonl]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from oceanofpdf_downloader import transfer
+from oceanofpdf_downloader.models import Book
+from oceanofpdf_downloader.repository import BookRepository
+
+LANGUAGES = ["English", "German", "French", "Spanish", "Unknown"]
+GENRES = ["Fiction", "Romance", "Historical Fiction, Historical Romance", "Textbooks", "Unknown"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--format", default="jsonl", choices=["jsonl", "csv", "parquet"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = BookRepository(os.path.join(tmp, "source.db"))
+        for start in range(0, args.books, 50_000):
+            source.insert_books([
+                Book(f"Book {i}", f"https://oceanofpdf.com/authors/a{i % 5000}/book-{i}/",
+                     LANGUAGES[i % 5], GENRES[i % 5], f"Author {i % 5000}")
+                for i in range(start, min(start + 50_000, args.books))
+            ])
+
+        path = os.path.join(tmp, f"books.{args.format}")
+        start = time.perf_counter()
+        path, count = transfer.export_books(source, path)
+        export_s = time.perf_counter() - start
+
+        target = BookRepository(os.path.join(tmp, "target.db"))
+        start = time.perf_counter()
+        transfer.import_books(target, path)
+        import_s = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+    print(f"{count} books, {os.path.basename(path)} {size_mb:.0f} MB")
+    print(f"  export: {export_s:6.1f} s  ({count / export_s:,.0f} rows/s)")
+    print(f"  import: {import_s:6.1f} s  ({count / import_s:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
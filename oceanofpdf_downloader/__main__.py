@@ -1,18 +1,24 @@
 import argparse
+import os
 
 from loguru import logger
 from rich.console import Console
 
 from oceanofpdf_downloader.browser import BrowserSession
 from oceanofpdf_downloader.config import load_config
-from oceanofpdf_downloader.display import display_book_records
+from oceanofpdf_downloader.display import display_book_records, display_filter_report, display_rule_changes
 from oceanofpdf_downloader.downloader import BookDownloader
-from oceanofpdf_downloader.filters import filter_books, is_autoselected, is_blacklisted
+from oceanofpdf_downloader.filters import classify, flush_stats, report_rules, sync_rules
+from oceanofpdf_downloader.format_policy import FormatPolicy
 from oceanofpdf_downloader.live_display import LiveDisplay
-from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.models import BookState
+from oceanofpdf_downloader.postprocess import PostProcessor
 from oceanofpdf_downloader.repository import BookRepository
-from oceanofpdf_downloader.scraper import BookScraper
+from oceanofpdf_downloader.scheduler import DownloadBudget, DownloadScheduler, Priority
+from oceanofpdf_downloader.scraper import BookScraper, is_known
 from oceanofpdf_downloader.selection import review_ml_selected, select_books
+from oceanofpdf_downloader.url_filter import KnownUrlFilter
+from oceanofpdf_downloader.utils import url_key
 
 
 def main() -> None:
@@ -33,6 +39,46 @@ def main() -> None:
         "--auto-only", action="store_true",
         help="Skip manual selection; only download auto-selected books (NEW books stay NEW)",
     )
+    parser.add_argument(
+        "--undo", nargs="+", metavar=("SINCE", "UNTIL"),
+        help='Revert state changes made between SINCE and UNTIL (UTC, "YYYY-MM-DD HH:MM"; UNTIL defaults to now) and exit',
+    )
+    parser.add_argument(
+        "--undo-source", metavar="SOURCE",
+        help="With --undo, only revert changes made by SOURCE (filter, rules, ml, selection, ml-review, dedupe, editor, download, resume, revert)",
+    )
+    parser.add_argument(
+        "--archive", type=float, metavar="DAYS",
+        help="Move SKIPPED/BLACKLISTED/INVALID books unchanged for DAYS into the archive table and exit",
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Optimise the search index and VACUUM the database (after --archive if both are given), then exit",
+    )
+    parser.add_argument(
+        "--export", metavar="PATH",
+        help="Export all books to PATH (.jsonl, .csv or .parquet, optionally .gz for the text formats) and exit",
+    )
+    parser.add_argument(
+        "--import", dest="import_path", metavar="PATH",
+        help="Import books from an --export file (resumes an interrupted import) and exit",
+    )
+    parser.add_argument(
+        "--fetch-format", metavar="FORMAT",
+        help="Download FORMAT (e.g. pdf) for DONE books where it was skipped by the format policy, then exit",
+    )
+    parser.add_argument(
+        "--sync-rules", action="store_true",
+        help="Re-apply changed blacklist/autoselect rules to books already in the database and exit",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="With --sync-rules, only show the state changes that would be made",
+    )
+    parser.add_argument(
+        "--filter-report", action="store_true",
+        help="Show per-rule hit counts, timings, and dead or shadowed filter keywords, then exit",
+    )
     args = parser.parse_args()
 
     if args.train:
@@ -77,24 +123,28 @@ def main() -> None:
         ]
         training_tp = training_fn = training_fp = training_tn = 0
 
+        # Only books without a score from this model are encoded; the rest is SQL
+        scored, flipped = ml.refresh_scores(repo, states_to_check)
+        if scored:
+            console.print(f"  Scored {scored} book(s) not yet scored by this model "
+                          f"({flipped} changed decision)\n")
+        stats = repo.score_stats(ml.model_id, config.ml_confidence_threshold)
+
         for state in states_to_check:
-            books = repo.get_books_by_state(state)
-            if not books:
+            if state not in stats:
                 continue
-            scores = [ml.score(Book(b.title, b.detail_url, b.language, b.genre)) for b in books]
-            scheduled = sum(1 for s in scores if s >= config.ml_confidence_threshold)
-            skipped = len(scores) - scheduled
-            avg = sum(scores) / len(scores)
-            pct_sched = scheduled / len(scores) * 100
-            pct_skip = skipped / len(scores) * 100
+            total, scheduled, avg, score_min, score_max = stats[state]
+            skipped = total - scheduled
+            pct_sched = scheduled / total * 100
+            pct_skip = skipped / total * 100
             table.add_row(
                 state.value,
-                str(len(books)),
+                str(total),
                 f"{scheduled} ({pct_sched:.0f}%)",
                 f"{skipped} ({pct_skip:.0f}%)",
                 f"{avg:.2f}",
-                f"{min(scores):.2f}",
-                f"{max(scores):.2f}",
+                f"{score_min:.2f}",
+                f"{score_max:.2f}",
             )
             if state == BookState.DONE:
                 training_tp += scheduled
@@ -118,6 +168,68 @@ def main() -> None:
         console.print()
         return
 
+    if args.undo:
+        if len(args.undo) > 2:
+            parser.error("--undo takes SINCE and an optional UNTIL")
+        repo = BookRepository()
+        since, until = args.undo[0], args.undo[1] if len(args.undo) > 1 else None
+        reverted = repo.revert_transitions(since, until, source=args.undo_source)
+        logger.info("Reverted {} book(s) to their state before {}", reverted, since)
+        return
+
+    if args.archive is not None or args.compact:
+        repo = BookRepository()
+        if args.archive is not None:
+            repo.archive_books(args.archive)
+        if args.compact:
+            size_before = os.path.getsize(repo.db_path)
+            repo.compact()
+            logger.info("Compacted {}: {:.1f} MB -> {:.1f} MB", repo.db_path,
+                        size_before / 1024 / 1024, os.path.getsize(repo.db_path) / 1024 / 1024)
+        return
+
+    if args.export or args.import_path:
+        from oceanofpdf_downloader import transfer
+        repo = BookRepository()
+        if args.import_path:
+            transfer.import_books(repo, args.import_path)
+        if args.export:
+            transfer.export_books(repo, args.export)
+        return
+
+    if args.fetch_format:
+        fmt = args.fetch_format.lower().lstrip(".")
+        config = load_config(max_pages=0)
+        repo = BookRepository()
+        records = repo.get_books_missing_format(fmt)
+        if not records:
+            logger.info("No DONE books are missing the {} format", fmt)
+            return
+        logger.info("Fetching {} for {} book(s)", fmt, len(records))
+        policy = FormatPolicy([fmt], fetch_all=True, max_bytes=config.max_file_size_mb * 1024 * 1024)
+        with BrowserSession(config) as session:
+            downloader = BookDownloader(config, repo, session)
+            try:
+                fetched = sum(1 for record in records if downloader.download_book(record, policy=policy))
+            finally:
+                downloader.close()
+        logger.info("Fetched {} for {}/{} book(s)", fmt, fetched, len(records))
+        return
+
+    if args.filter_report:
+        display_filter_report(report_rules(BookRepository()), Console())
+        return
+
+    if args.sync_rules:
+        repo = BookRepository()
+        changes = sync_rules(repo, dry_run=args.dry_run)
+        flush_stats(repo)
+        if changes:
+            display_rule_changes(changes, Console())
+        verb = "Would change" if args.dry_run else "Changed"
+        logger.info("{} the state of {} book(s) to match the filter rules", verb, len(changes))
+        return
+
     if args.editor:
         from oceanofpdf_downloader.editor import run_editor
         run_editor()
@@ -128,6 +240,17 @@ def main() -> None:
     console = Console()
     repo = BookRepository()
 
+    # Bring stored books in line with filter rules edited since the last run
+    rule_changes = sync_rules(repo, dry_run=True)
+    if rule_changes:
+        console.print("\n[bold cyan]The filter rules have changed since the last run:[/bold cyan]")
+        display_rule_changes(rule_changes, console)
+        if console.input("Apply these state changes? [Y/n]: ").strip().lower() in ("", "y", "yes"):
+            sync_rules(repo)
+    else:
+        sync_rules(repo)
+    flush_stats(repo)
+
     # Check for previously scheduled and failed books
     scheduled = repo.get_books_by_state(BookState.SCHEDULED)
     retry = repo.get_books_by_state(BookState.RETRY)
@@ -142,12 +265,10 @@ def main() -> None:
             return
         elif answer in ("", "y", "yes"):
             # Mark retry books as scheduled again
-            for book in retry:
-                repo.update_state(book.id, BookState.SCHEDULED)
+            repo.update_states([book.id for book in retry], BookState.SCHEDULED, source="resume")
             logger.info("Resuming with {} pending books", len(pending))
         else:
-            for book in pending:
-                repo.update_state(book.id, BookState.SKIPPED)
+            repo.update_states([book.id for book in pending], BookState.SKIPPED, source="resume")
             logger.info("Skipped {} pending books", len(pending))
             pending = []
 
@@ -210,79 +331,100 @@ def main() -> None:
     with BrowserSession(config) as session:
         scraper = BookScraper(config, session)
 
+        known = KnownUrlFilter.open(repo, config.known_urls_path, config.known_urls_bloom_threshold)
         live.enable()
-        books = scraper.scrape_all_pages(repo, live_display=live)
+        books = scraper.scrape_all_pages(repo, live_display=live, known=known)
         live.disable()
 
-        books = filter_books(books)
-
-        new_count = repo.import_books(books)
-        logger.info("Imported {} new books ({} duplicates skipped)", new_count, len(books) - new_count)
+        scraped_count = len(books)
+        books = [b for b in books if not is_known(b.detail_url, repo, known)]
+
+        # Classify once and insert each book in its initial state; blacklisted
+        # books are stored too so they are never re-scraped
+        classified = [classify(b) for b in books]
+        new_records = repo.insert_books(books, [state for state, _ in classified], source="filter")
+        flush_stats(repo)
+        matches = {b.detail_url: match for b, (_, match) in zip(books, classified)}
+        known.add_keys(url_key(r.detail_url) for r in new_records)
+        known.save(config.known_urls_path, repo.url_key_fingerprint())
+        new_count = len(new_records)
+        logger.info("Imported {} new books ({} duplicates skipped)", new_count, scraped_count - new_count)
+
+        blacklisted = [r for r in new_records if r.state == BookState.BLACKLISTED]
+        autoselected = [r for r in new_records if r.state == BookState.SCHEDULED]
+        for records, label in ((blacklisted, "blacklisted"), (autoselected, "auto-scheduled")):
+            if records:
+                logger.info("{} book(s) {} by filter", len(records), label)
+                for record in records:
+                    genre_str = f" ({record.genre})" if record.genre != "Unknown" else ""
+                    match = matches[record.detail_url]
+                    console.print(f"  - {record.title}{genre_str} — {match.field} matches '{match.keyword}'")
 
         new_books = repo.get_books_by_state(BookState.NEW)
 
-        # Mark blacklisted books
-        blacklisted = []
-        for record in new_books:
-            book = Book(title=record.title, detail_url=record.detail_url,
-                        language=record.language, genre=record.genre)
-            if is_blacklisted(book):
-                repo.update_state(record.id, BookState.BLACKLISTED)
-                blacklisted.append(record)
-        if blacklisted:
-            logger.info("{} book(s) blacklisted by filter", len(blacklisted))
-            for record in blacklisted:
-                genre_str = f" ({record.genre})" if record.genre != "Unknown" else ""
-                console.print(f"  - {record.title}{genre_str}")
-            new_books = repo.get_books_by_state(BookState.NEW)
-
-        # Auto-schedule matching books
-        autoselected = []
-        for record in new_books:
-            book = Book(title=record.title, detail_url=record.detail_url,
-                        language=record.language, genre=record.genre)
-            if is_autoselected(book):
-                repo.update_state(record.id, BookState.SCHEDULED)
-                autoselected.append(record)
-        if autoselected:
-            logger.info("{} book(s) auto-scheduled by filter", len(autoselected))
-            for record in autoselected:
-                genre_str = f" ({record.genre})" if record.genre != "Unknown" else ""
-                console.print(f"  - {record.title}{genre_str}")
-            new_books = repo.get_books_by_state(BookState.NEW)
-
         # ML auto-selection
         ml_selected = []
-        if config.ml_autoselect:
+        ml_scores: dict[int, float] = {}
+        ml_selector = None
+        if config.ml_autoselect or config.ml_online_updates:
             from oceanofpdf_downloader.ml_selector import MLSelector
             ml_selector = MLSelector(config)
-            if ml_selector.load():
-                ml_selected = [r for r in new_books if ml_selector.predict(
-                    Book(title=r.title, detail_url=r.detail_url,
-                         language=r.language, genre=r.genre))]
-                for record in ml_selected:
-                    repo.update_state(record.id, BookState.SCHEDULED)
-                if ml_selected:
-                    logger.info("{} book(s) auto-scheduled by ML", len(ml_selected))
-                    ml_selected = review_ml_selected(ml_selected, repo, console)
-                    new_books = repo.get_books_by_state(BookState.NEW)
-            else:
-                logger.warning("ml_autoselect enabled but no trained model — run with --train first")
-
-        if args.auto_only:
-            newly_scheduled = list(autoselected) + ml_selected
-        else:
-            newly_scheduled = select_books(new_books, repo, console)
-            newly_scheduled.extend(autoselected)
-            newly_scheduled.extend(ml_selected)
+            if not ml_selector.load():
+                logger.warning("ML is enabled but there is no trained model — run with --train first")
+                ml_selector = None
+        learn = (lambda labels: ml_selector.update(labels, repo)) if ml_selector and config.ml_online_updates else None
+
+        if ml_selector and config.ml_autoselect:
+            ml_selector.refresh_scores(repo, [BookState.NEW])
+            ml_scores = {book_id: score for book_id, (score, _) in
+                         repo.get_scores([r.id for r in new_books]).items()}
+            ml_selected = [r for r in new_books if ml_scores[r.id] >= config.ml_confidence_threshold]
+            repo.update_states([r.id for r in ml_selected], BookState.SCHEDULED, source="ml")
+            if ml_selected:
+                logger.info("{} book(s) auto-scheduled by ML", len(ml_selected))
+                ml_selected = review_ml_selected(ml_selected, repo, console, learn)
+                new_books = repo.get_books_by_state(BookState.NEW)
+
+        selected = [] if args.auto_only else select_books(new_books, repo, console, learn)
+        newly_scheduled = [*selected, *autoselected, *ml_selected]
+
+        if config.duplicate_threshold and newly_scheduled:
+            from oceanofpdf_downloader.dedupe import find_duplicates
+            duplicates = find_duplicates(
+                newly_scheduled, [*repo.iter_books(BookState.DONE), *pending], config.duplicate_threshold,
+            )
+            # Books the user picked by hand are kept; only automatic picks are skipped
+            for record in selected:
+                original = duplicates.pop(record.id, None)
+                if original:
+                    logger.warning("Keeping '{}' as selected, though it looks like '{}'",
+                                   record.title, original.title)
+            if duplicates:
+                repo.update_states(list(duplicates), BookState.SKIPPED, source="dedupe")
+                logger.info("{} scheduled book(s) skipped as near-duplicates", len(duplicates))
+                newly_scheduled = [r for r in newly_scheduled if r.id not in duplicates]
+                autoselected = [r for r in autoselected if r.id not in duplicates]
+                ml_selected = [r for r in ml_selected if r.id not in duplicates]
 
         all_scheduled = pending + newly_scheduled
         logger.info("{} book(s) scheduled for download.", len(all_scheduled))
 
         if all_scheduled:
-            downloader = BookDownloader(config, repo, session)
+            post_processor = PostProcessor(config, repo) if config.post_process else None
+            downloader = BookDownloader(config, repo, session, post_processor=post_processor)
+            scheduler = DownloadScheduler(
+                DownloadBudget.from_config(config), config.download_dir, repo.get_expected_sizes(),
+            )
+            scheduler.prioritise(pending, Priority.SELECTED)
+            scheduler.prioritise(autoselected, Priority.AUTOSELECT)
+            scheduler.prioritise(ml_selected, Priority.ML, ml_scores)
             live.enable()
-            done = downloader.download_all(all_scheduled, console, live_display=live)
+            try:
+                done = downloader.download_all(all_scheduled, console, live_display=live, scheduler=scheduler)
+            finally:
+                downloader.close()
+                if post_processor:
+                    post_processor.close()
             live.disable()
             console.print(f"\n[bold]Download complete: {done}/{len(all_scheduled)} succeeded[/bold]")
         else:
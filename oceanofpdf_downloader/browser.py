@@ -8,6 +8,7 @@ from playwright.sync_api import sync_playwright
 from playwright_stealth import Stealth
 
 from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.download_watchdog import DownloadProgress
 
 CLOUDFLARE_TIMEOUT = 300  # 5 minutes
 CLOUDFLARE_POLL_INTERVAL = 2  # seconds
@@ -22,6 +23,7 @@ class BrowserSession:
         self._context = None
         self._stealth = Stealth()
         self._xvfb = None
+        self._download_progress: dict = {}
 
     def __enter__(self):
         if platform.system() == "Linux" and "DISPLAY" not in os.environ:
@@ -41,6 +43,7 @@ class BrowserSession:
                 headless=self.config.headless,
                 args=launch_args,
                 accept_downloads=True,
+                downloads_path=self.config.download_dir,
             )
             logger.info("Launched persistent Chrome browser")
         except Exception:
@@ -50,6 +53,7 @@ class BrowserSession:
                 headless=self.config.headless,
                 args=launch_args,
                 accept_downloads=True,
+                downloads_path=self.config.download_dir,
             )
             logger.info("Launched persistent Chromium browser")
 
@@ -90,8 +94,20 @@ class BrowserSession:
             "downloadPath": self.config.download_dir,
         })
 
+        # Page.enable turns on the download events that tell the downloader when
+        # a file is complete; Playwright's Download object only offers blocking waits
+        progress = DownloadProgress()
+        cdp.on("Page.downloadProgress", progress.update)
+        cdp.send("Page.enable")
+        self._download_progress[page] = progress
+        page.on("close", lambda closed: self._download_progress.pop(closed, None))
+
         return page
 
+    def download_progress(self, page) -> DownloadProgress:
+        """Browser-reported state of the latest download started from page."""
+        return self._download_progress[page]
+
     def navigate(self, page, url: str) -> None:
         """Navigate to a URL, handling Cloudflare challenges if encountered."""
         page.goto(url, wait_until="domcontentloaded")
@@ -16,6 +16,24 @@ class Config:
     download_timeout_ms: int = 45000
     await_download: bool = True
     download_wait_ms: int = 10000
+    download_stall_timeout_ms: int = 30000
+    download_poll_interval_ms: int = 250
+    post_process: bool = False
+    post_process_workers: int = 2
+    library_layout: str = "{language}/{genre}"
+    mirror_failure_threshold: int = 3
+    mirror_cooldown_seconds: int = 900
+    max_books_per_run: int = 0
+    max_mb_per_run: int = 0
+    min_free_disk_mb: int = 0
+    run_deadline: str = ""
+    preferred_formats: list[str] = field(default_factory=lambda: ["epub", "pdf"])
+    fetch_all_formats: bool = False
+    max_file_size_mb: int = 0
+    duplicate_threshold: float = 0.8
+    known_urls_path: str = field(default_factory=lambda: os.path.expanduser(
+        "~/.config/oceanofpdf-downloader/known_urls.bin"))
+    known_urls_bloom_threshold: int = 500_000
     log_lines: int = 10
     profile_dir: str = field(default_factory=lambda: os.path.expanduser("~/.config/oceanofpdf-downloader/browser-profile/"))
     paginated: bool = True
@@ -28,6 +46,15 @@ class Config:
     ml_positive_examples_path: str = field(default_factory=lambda: os.path.expanduser(
         "~/.config/oceanofpdf-downloader/ml_positives.txt"))
     ml_sentence_transformer_model: str = "all-MiniLM-L6-v2"
+    # Texts per sentence-transformer forward pass when scoring or training
+    ml_batch_size: int = 128
+    # Learn from each selection/review decision in place (needs a model trained with this on)
+    ml_online_updates: bool = False
+    # Online labels after which the model is retrained from the whole database
+    ml_full_retrain_every: int = 500
+    # On-disk embeddings keyed by model and text hash; None encodes every text every time
+    ml_embedding_cache_dir: str | None = field(default_factory=lambda: os.path.expanduser(
+        "~/.config/oceanofpdf-downloader/embeddings"))
 
 
 def load_config(**kwargs) -> Config:
@@ -0,0 +1,154 @@
+import hashlib
+import re
+import unicodedata
+from typing import Generic, Hashable, Iterable, TypeVar
+
+import numpy as np
+from loguru import logger
+
+from oceanofpdf_downloader.models import BookRecord
+
+# 64 hash functions in 16 bands of 4: pairs with Jaccard similarity 0.8 share
+# a band with probability ~0.99, pairs at 0.3 only ~0.12.
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+
+# Universal hash permutations h -> (a*h + b) mod p, with fixed seeds so
+# signatures are stable across runs.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)[:, None]
+_PERM_B = _rng.integers(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)[:, None]
+
+KeyT = TypeVar("KeyT", bound=Hashable)
+
+
+def normalise_title(title: str, author: str = "Unknown") -> str:
+    """Lower-case, accent- and punctuation-free "title author" text.
+
+    Drops the site's "[PDF] [EPUB]"/"Download" decoration and a trailing
+    "by <author>" (new-releases titles include it), so the same book scraped
+    from different listings normalises alike.
+    """
+    text = re.sub(r"\[(pdf|epub)\]|\bdownload\b", " ", title, flags=re.IGNORECASE)
+    if (not author or author == "Unknown") and " by " in text:
+        text, author = text.rsplit(" by ", 1)
+    if author and author != "Unknown":
+        text = re.sub(rf"\s+by\s+{re.escape(author)}\s*$", "", text, flags=re.IGNORECASE)
+        text = f"{text} {author}"
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """32-bit hashes of text's character shingles."""
+    if len(text) <= size:
+        text = text.ljust(size)
+    return {
+        int.from_bytes(hashlib.blake2b(text[i:i + size].encode(), digest_size=4).digest(), "big")
+        for i in range(len(text) - size + 1)
+    }
+
+
+def minhash(text: str) -> tuple[int, ...]:
+    """MinHash signature of text's shingles; equal positions estimate Jaccard similarity."""
+    hashed = np.fromiter(shingles(text), dtype=np.uint64)
+    # uint64 products wrap around; still a good hash family (as in datasketch)
+    with np.errstate(over="ignore"):
+        values = (_PERM_A * hashed + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return tuple(values.min(axis=1).tolist())
+
+
+def similarity(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class NearDuplicateIndex(Generic[KeyT]):
+    """MinHash LSH index: finds stored texts whose estimated Jaccard similarity
+    to a query is at least threshold, without comparing against every entry."""
+
+    def __init__(self, threshold: float = 0.8) -> None:
+        self.threshold = threshold
+        self._rows = NUM_PERM // BANDS
+        self._buckets: list[dict[tuple[int, ...], list[KeyT]]] = [{} for _ in range(BANDS)]
+        self._signatures: dict[KeyT, tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _bands(self, signature: tuple[int, ...]) -> Iterable[tuple[int, tuple[int, ...]]]:
+        for band in range(BANDS):
+            yield band, signature[band * self._rows:(band + 1) * self._rows]
+
+    def add(self, key: KeyT, text: str) -> None:
+        signature = minhash(text)
+        self._signatures[key] = signature
+        for band, chunk in self._bands(signature):
+            self._buckets[band].setdefault(chunk, []).append(key)
+
+    def query(self, text: str) -> list[tuple[KeyT, float]]:
+        """Stored keys similar to text, most similar first."""
+        signature = minhash(text)
+        candidates: set[KeyT] = set()
+        for band, chunk in self._bands(signature):
+            candidates.update(self._buckets[band].get(chunk, ()))
+        matches = [(key, similarity(signature, self._signatures[key])) for key in candidates]
+        return sorted(
+            ((key, score) for key, score in matches if score >= self.threshold),
+            key=lambda match: -match[1],
+        )
+
+
+def book_text(record: BookRecord) -> str:
+    return normalise_title(record.title, record.author)
+
+
+def numbers(text: str) -> tuple[int, ...]:
+    """Numeric tokens of normalised text, e.g. (2,) for "reaper academy book 2".
+
+    Series volumes differ only in these, which barely moves their shingle
+    similarity, so texts whose numbers differ never count as duplicates.
+    """
+    return tuple(sorted(int(token) for token in text.split() if token.isdigit()))
+
+
+def find_duplicates(
+    candidates: list[BookRecord],
+    library: Iterable[BookRecord],
+    threshold: float = 0.8,
+) -> dict[int, BookRecord]:
+    """Map candidate ids to a library book (or an earlier candidate) they near-duplicate.
+
+    library is the set of books already downloaded or kept; candidates are
+    checked against it and against each other, first one wins. Books whose
+    titles carry different numbers (volumes of a series) never match.
+    """
+    index: NearDuplicateIndex[int] = NearDuplicateIndex(threshold)
+    books: dict[int, BookRecord] = {}
+    book_numbers: dict[int, tuple[int, ...]] = {}
+    for record in library:
+        text = book_text(record)
+        index.add(record.id, text)
+        books[record.id] = record
+        book_numbers[record.id] = numbers(text)
+
+    duplicates: dict[int, BookRecord] = {}
+    for record in candidates:
+        text = book_text(record)
+        own_numbers = numbers(text)
+        matches = [
+            (key, score) for key, score in index.query(text)
+            if key != record.id and book_numbers[key] == own_numbers
+        ]
+        if matches:
+            original = books[matches[0][0]]
+            duplicates[record.id] = original
+            logger.info("'{}' looks like a duplicate of '{}' ({:.0%} similar)",
+                        record.title, original.title, matches[0][1])
+        else:
+            index.add(record.id, text)
+            books[record.id] = record
+            book_numbers[record.id] = own_numbers
+    return duplicates
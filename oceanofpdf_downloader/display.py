@@ -1,6 +1,7 @@
 from rich.console import Console
 from rich.table import Table
 
+from oceanofpdf_downloader.filters import RuleChange, RuleReport
 from oceanofpdf_downloader.models import Book, BookRecord
 
 
@@ -47,3 +48,69 @@ def display_book_records(records: list[BookRecord], console: Console | None = No
         table.add_row(str(i), record.title, record.language, record.genre, record.state.value, record.detail_url)
 
     console.print(table)
+
+
+def display_rule_changes(changes: list[RuleChange], console: Console | None = None) -> None:
+    """Display the state changes a filter rule sync would make."""
+    if console is None:
+        console = Console()
+
+    table = Table(title=f"Filter Rule Changes ({len(changes)})")
+    table.add_column("#", style="dim", width=5)
+    table.add_column("Title", style="grey85")
+    table.add_column("From")
+    table.add_column("To", style="bold")
+    table.add_column("Reason")
+
+    for i, change in enumerate(changes, 1):
+        table.add_row(str(i), change.record.title, change.record.state.value, change.state.value, change.reason)
+
+    console.print(table)
+
+
+def display_filter_report(report: RuleReport, console: Console | None = None) -> None:
+    """Display rule timings, hit counts, dead rules and shadowed rules."""
+    if console is None:
+        console = Console()
+
+    if report.since is None:
+        console.print("[yellow]No filter statistics recorded yet.[/yellow]")
+        return
+    console.print(f"[bold]Filter statistics since {report.since[:19]}[/bold]")
+
+    table = Table(title="Cost per Rule List")
+    table.add_column("Rule")
+    table.add_column("Keywords", justify="right")
+    table.add_column("Calls", justify="right")
+    table.add_column("Total ms", justify="right")
+    table.add_column("Avg µs", justify="right")
+    for timing in report.timings:
+        table.add_row(timing.rule, str(timing.keywords), str(timing.calls),
+                      f"{timing.elapsed_ns / 1e6:.1f}", f"{timing.avg_us:.1f}")
+    console.print(table)
+
+    table = Table(title="Hits per Keyword")
+    table.add_column("Rule")
+    table.add_column("Keyword", style="grey85")
+    table.add_column("Hits", justify="right")
+    table.add_column("Last hit", style="dim")
+    for (rule, keyword), (hits, last_hit_at) in sorted(report.hits.items(), key=lambda item: -item[1][0]):
+        table.add_row(rule, keyword, str(hits), last_hit_at[:19])
+    console.print(table)
+
+    if report.dead:
+        table = Table(title=f"Dead Rules ({len(report.dead)})")
+        table.add_column("Rule")
+        table.add_column("Keyword", style="grey85")
+        for rule, keyword in report.dead:
+            table.add_row(rule, keyword)
+        console.print(table)
+
+    if report.shadowed:
+        table = Table(title=f"Shadowed Rules ({len(report.shadowed)})")
+        table.add_column("Rule")
+        table.add_column("Keyword", style="grey85")
+        table.add_column("Always decided by")
+        for rule, keyword, by_rule, by_keyword in report.shadowed:
+            table.add_row(rule, keyword, f"{by_rule} '{by_keyword}'")
+        console.print(table)
@@ -0,0 +1,194 @@
+import os
+import time
+from typing import Callable
+
+from loguru import logger
+
+# Suffixes browsers use for files that are still being written.
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".download")
+
+
+class DownloadStalledError(TimeoutError):
+    """Raised when a download never starts or stops making progress."""
+
+
+class DownloadProgress:
+    """A page's download state as the browser reports it (CDP Page.downloadProgress).
+
+    BrowserSession feeds update() from the page's CDP session; reset() before
+    starting a download so only its events count.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.state: str | None = None
+        self.received_bytes = 0
+
+    def update(self, event: dict) -> None:
+        self.state = event.get("state")
+        self.received_bytes = int(event.get("receivedBytes", 0))
+
+
+def _open_inotify(directory: str):
+    """Return an inotify watch on directory, or None if inotify_simple is unavailable."""
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return None
+    try:
+        inotify = INotify()
+        inotify.add_watch(directory, flags.CREATE | flags.MODIFY | flags.MOVED_TO | flags.DELETE)
+    except OSError as e:
+        logger.debug("inotify unavailable for {}: {}", directory, e)
+        return None
+    return inotify
+
+
+class DownloadWatchdog:
+    """Waits for browser downloads in a directory based on progress, not wall-clock time.
+
+    Progress is the growth of partial files (e.g. Chrome's .crdownload) that
+    appeared after snapshot(). A download that has not started within
+    start_timeout_ms, or whose partial files stop growing for stall_timeout_ms,
+    raises DownloadStalledError. wait() returns as soon as the finished file
+    is in place. Directory changes are picked up through inotify when
+    inotify_simple is installed, otherwise by polling.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        start_timeout_ms: int,
+        stall_timeout_ms: int,
+        poll_interval_ms: int = 250,
+        use_inotify: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.directory = directory
+        self.start_timeout = start_timeout_ms / 1000
+        self.stall_timeout = stall_timeout_ms / 1000
+        self.poll_interval = poll_interval_ms / 1000
+        self._clock = clock
+        self._sleep = sleep
+        self._inotify = _open_inotify(directory) if use_inotify and os.path.isdir(directory) else None
+        self._baseline: dict[str, int] = {}
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _scan(self) -> dict[str, int]:
+        """Return {filename: size} for all regular files in the directory."""
+        files: dict[str, int] = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            files[entry.name] = entry.stat().st_size
+                    except FileNotFoundError:
+                        continue  # renamed away between listing and stat
+        except FileNotFoundError:
+            pass
+        return files
+
+    def snapshot(self) -> None:
+        """Record the current directory contents; only changes after this count as activity."""
+        self._baseline = self._scan()
+        if self._inotify is not None:
+            self._inotify.read(timeout=0)  # drop stale events
+
+    def _is_new(self, name: str, size: int) -> bool:
+        return self._baseline.get(name) != size
+
+    def _pause(self) -> None:
+        if self._inotify is not None:
+            self._inotify.read(timeout=int(self.poll_interval * 1000))
+        else:
+            self._sleep(self.poll_interval)
+
+    def wait(self, filename: str | None = None, require_start: bool = True) -> str | None:
+        """Block until a download that started after snapshot() completes.
+
+        filename is the expected final name; any other new file also counts once
+        no partial files remain (browsers may add " (1)" suffixes). Returns the
+        path of the finished file. With require_start=False, returns None right
+        away if no download activity is visible in the directory, e.g. when the
+        browser stores the file elsewhere.
+        """
+        started_at = self._clock()
+        last_change = started_at
+        last_progress: tuple[int, int] | None = None
+        started = False
+
+        while True:
+            files = self._scan()
+            partials = {
+                name: size for name, size in files.items()
+                if name.endswith(PARTIAL_SUFFIXES) and self._is_new(name, size)
+            }
+            finished = [
+                name for name, size in files.items()
+                if not name.endswith(PARTIAL_SUFFIXES) and self._is_new(name, size)
+            ]
+
+            if filename in finished and not any(p.startswith(filename) for p in partials):
+                return os.path.join(self.directory, filename)
+            if finished and not partials:
+                return os.path.join(self.directory, finished[0])
+
+            now = self._clock()
+            progress = (len(partials), sum(partials.values()))
+            if partials:
+                if not started or progress != last_progress:
+                    last_change = now
+                started = True
+            last_progress = progress
+
+            if not started:
+                if not require_start:
+                    return None
+                if now - started_at >= self.start_timeout:
+                    raise DownloadStalledError(
+                        f"Download did not start within {self.start_timeout:.0f}s"
+                    )
+            elif now - last_change >= self.stall_timeout:
+                raise DownloadStalledError(
+                    f"Download stalled: no progress for {self.stall_timeout:.0f}s "
+                    f"({progress[1]} bytes received)"
+                )
+
+            self._pause()
+
+    def follow(self, progress: DownloadProgress, pump: Callable[[int], None]) -> None:
+        """Block until the browser reports an already started download finished.
+
+        pump(ms) must let browser events through (e.g. page.wait_for_timeout).
+        Bytes the browser reports received, and the growth of files new since
+        snapshot(), count as progress; none for stall_timeout raises
+        DownloadStalledError, as does a download the browser cancels.
+        """
+        last_change = self._clock()
+        last_progress: tuple[int, int] | None = None
+        while True:
+            if progress.state == "completed":
+                return
+            if progress.state == "canceled":
+                raise DownloadStalledError("Download was canceled by the browser")
+
+            files = self._scan()
+            on_disk = sum(size for name, size in files.items() if self._is_new(name, size))
+            now = self._clock()
+            if (progress.received_bytes, on_disk) != last_progress:
+                last_progress = (progress.received_bytes, on_disk)
+                last_change = now
+            elif now - last_change >= self.stall_timeout:
+                raise DownloadStalledError(
+                    f"Download stalled: no progress for {self.stall_timeout:.0f}s "
+                    f"({max(last_progress)} bytes received)"
+                )
+            pump(int(self.poll_interval * 1000))
@@ -9,8 +9,21 @@ from rich.markup import escape
 
 from oceanofpdf_downloader.browser import BrowserSession
 from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.download_watchdog import DownloadStalledError, DownloadWatchdog
+from oceanofpdf_downloader.format_policy import (
+    FAILED,
+    FALLBACK,
+    FETCH,
+    FETCHED,
+    SKIPPED,
+    TOO_LARGE,
+    FormatPolicy,
+)
+from oceanofpdf_downloader.mirrors import MirrorHealth
 from oceanofpdf_downloader.models import BookRecord, BookState
+from oceanofpdf_downloader.postprocess import PostProcessor
 from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.scheduler import DownloadScheduler
 from oceanofpdf_downloader.utils import rename_file
 
 
@@ -51,16 +64,101 @@ def parse_download_forms(html: str) -> list[DownloadForm]:
 class BookDownloader:
     """Downloads scheduled books using a shared BrowserSession."""
 
-    def __init__(self, config: Config, repo: BookRepository, session: BrowserSession) -> None:
+    def __init__(
+        self,
+        config: Config,
+        repo: BookRepository,
+        session: BrowserSession,
+        post_processor: PostProcessor | None = None,
+        policy: FormatPolicy | None = None,
+    ) -> None:
         self.config = config
         self.repo = repo
         self.session = session
+        self.post_processor = post_processor
+        self.policy = policy or FormatPolicy.from_config(config)
+        self.mirrors = MirrorHealth(
+            repo.load_mirror_stats(),
+            failure_threshold=config.mirror_failure_threshold,
+            cooldown_seconds=config.mirror_cooldown_seconds,
+        )
+        self.bytes_downloaded = 0
+        # download_timeout_ms bounds the start of an awaited download (expect_download);
+        # download_wait_ms bounds the start of an un-awaited one. Once started, a
+        # transfer may run as long as it keeps making progress.
+        self.watchdog = DownloadWatchdog(
+            config.download_dir,
+            start_timeout_ms=config.download_wait_ms,
+            stall_timeout_ms=config.download_stall_timeout_ms,
+            poll_interval_ms=config.download_poll_interval_ms,
+        )
+
+    def close(self) -> None:
+        """Release the watchdog's inotify handle."""
+        self.watchdog.close()
+
+    def _fetch_form(self, page, record: BookRecord, form: DownloadForm) -> str | None:
+        """Submit one download form and wait for the file. Returns its path, or None on failure."""
+        started = time.monotonic()
+        path = None
+        try:
+            final_name = rename_file(form.filename)
+            save_path = os.path.join(self.config.download_dir, final_name)
 
-    def download_book(self, record: BookRecord) -> bool:
-        """Open a book's detail page, find download forms, and download all files.
+            # Find the form's submit button and click it while expecting a download.
+            # A server_id can serve several files and a file can be offered by several
+            # servers, so the form is located by both.
+            form_selector = (
+                f'form[action*="Fetching_Resource.php"]:has(input[name="id"][value="{form.server_id}"]) '
+                f'input[name="filename"][value="{form.filename}"]'
+            )
+            form_element = page.locator(form_selector).first
+            submit_button = form_element.locator("xpath=ancestor::form").locator(
+                'input[type="submit"], input[type="image"], button[type="submit"]'
+            )
 
-        Returns True if at least one file was downloaded successfully.
+            self.watchdog.snapshot()
+            if self.config.await_download:
+                progress = self.session.download_progress(page)
+                progress.reset()
+                with page.expect_download(timeout=self.config.download_timeout_ms) as download_info:
+                    submit_button.click()
+                download = download_info.value
+                # Wait for the browser's completion event while bytes keep arriving,
+                # so save_as only copies a finished file and never blocks on a stall
+                try:
+                    self.watchdog.follow(progress, page.wait_for_timeout)
+                except DownloadStalledError:
+                    download.cancel()
+                    raise
+                download.save_as(save_path)
+                download.delete()
+                path = save_path
+                logger.info("Downloaded: {}", save_path)
+            else:
+                submit_button.click()
+                logger.info("Clicked download for '{}', watching {} (await_download disabled)",
+                            form.filename, self.config.download_dir)
+                path = self.watchdog.wait(form.filename)
+                logger.info("Downloaded: {}", path)
+            nbytes = os.path.getsize(path) if path and os.path.exists(path) else None
+            self.mirrors.record_success(form.server_id, time.monotonic() - started, nbytes)
+        except Exception as e:
+            logger.error("Failed to download '{}' from '{}': {}", form.filename, form.server_id, e)
+            self.mirrors.record_failure(form.server_id, time.monotonic() - started)
+            path = None
+
+        time.sleep(self.mirrors.pause_for(form.server_id, self.config.pause_seconds))
+        return path
+
+    def download_book(self, record: BookRecord, policy: FormatPolicy | None = None) -> bool:
+        """Open a book's detail page, find download forms, and download the formats the policy picks.
+
+        Every form's outcome is recorded in format_decisions so skipped formats
+        can be fetched later. Returns True if at least one file was downloaded
+        successfully.
         """
+        policy = policy or self.policy
         page = self.session.new_page()
         try:
             logger.info("Opening detail page: {}", record.detail_url)
@@ -73,77 +171,113 @@ class BookDownloader:
                 return False
 
             logger.info("Found {} download form(s) for '{}'", len(forms), record.title)
-            success_count = 0
+            # Every mirror offering a file, healthiest first
+            forms_by_name: dict[str, list[DownloadForm]] = {}
+            for form in self.mirrors.order(forms):
+                forms_by_name.setdefault(form.filename, []).append(form)
+            plan = policy.plan(list(forms_by_name), sizes=self.repo.get_known_file_sizes(record.id))
+            fetched_format = None
 
-            for form in forms:
-                try:
-                    final_name = rename_file(form.filename)
-                    save_path = os.path.join(self.config.download_dir, final_name)
-
-                    # Find the form's submit button and click it while expecting a download
-                    # Use filename to locate the correct form (server_id can be shared across forms)
-                    form_selector = f'form[action*="Fetching_Resource.php"] input[name="filename"][value="{form.filename}"]'
-                    form_element = page.locator(form_selector).first
-                    submit_button = form_element.locator("xpath=ancestor::form").locator(
-                        'input[type="submit"], input[type="image"], button[type="submit"]'
-                    )
+            for decision in plan:
+                if decision.decision == FALLBACK and fetched_format:
+                    decision.decision, decision.reason = SKIPPED, f"{fetched_format} already fetched"
+                if decision.decision not in (FETCH, FALLBACK):
+                    logger.info("Not fetching '{}': {}", decision.filename, decision.reason)
+                    continue
 
-                    if self.config.await_download:
-                        with page.expect_download(timeout=self.config.download_timeout_ms) as download_info:
-                            submit_button.click()
-                        download = download_info.value
-                        download.save_as(save_path)
-                        logger.info("Downloaded: {}", save_path)
-                    else:
-                        submit_button.click()
-                        logger.info("Clicked download for '{}', waiting {}ms (await_download disabled)",
-                                    form.filename, self.config.download_wait_ms)
-                        time.sleep(self.config.download_wait_ms / 1000)
-                        logger.info("File should be in: {}", self.config.download_dir)
-                    success_count += 1
-
-                    time.sleep(self.config.pause_seconds)
-                except Exception as e:
-                    logger.error("Failed to download '{}': {}", form.filename, e)
-
-            return success_count > 0
+                path = None
+                for form in forms_by_name[decision.filename]:
+                    path = self._fetch_form(page, record, form)
+                    if path is not None:
+                        break
+                if path is None:
+                    decision.decision, decision.reason = FAILED, "download failed"
+                    continue
+
+                decision.size = os.path.getsize(path) if os.path.exists(path) else None
+                if policy.too_large(decision.size):
+                    logger.warning("'{}' is {} bytes, over the size limit — discarding", path, decision.size)
+                    os.remove(path)
+                    decision.decision, decision.reason = TOO_LARGE, f"{decision.size} bytes over limit"
+                    continue
+
+                decision.decision = FETCHED
+                fetched_format = fetched_format or decision.fmt
+                self.bytes_downloaded += decision.size or 0
+                if self.post_processor:
+                    self.post_processor.submit(record, path)
+
+            self.repo.record_format_decisions(record.id, plan)
+            return fetched_format is not None
         except Exception as e:
             logger.error("Error processing '{}': {}", record.title, e)
             return False
         finally:
             page.close()
 
-    def download_all(self, records: list[BookRecord], console: Console, live_display=None) -> int:
+    def download_all(
+        self,
+        records: list[BookRecord],
+        console: Console,
+        live_display=None,
+        scheduler: DownloadScheduler | None = None,
+    ) -> int:
         """Download all scheduled books, updating state after each.
 
+        With a scheduler, books are downloaded in priority order and the run
+        stops once its budget is used up; books not reached stay SCHEDULED.
+
         Returns the number of successfully downloaded books.
         """
+        if scheduler:
+            records = scheduler.order(records)
+            scheduler.log_plan(records)
+
         if not live_display:
             console.print(f"\n[bold cyan]Downloading {len(records)} book(s)...[/bold cyan]")
             for record in records:
                 console.print(f"  - {record.title}")
 
-        for i, record in enumerate(records, 1):
-            if live_display:
-                live_display.set_progress(
-                    f"[bold cyan]Downloading {i} / {len(records)}:[/bold cyan] {escape(record.title)}"
-                )
-            else:
-                console.print(f"\n[bold][{i}/{len(records)}] {record.title}[/bold]")
-
-            success = self.download_book(record)
+        done = 0
+        with self.repo.writer() as writer:
+            for i, record in enumerate(records, 1):
+                if scheduler:
+                    reason = scheduler.stop_reason(i - 1, self.bytes_downloaded, record)
+                    if reason:
+                        logger.warning("Stopping downloads: {} — {} book(s) left scheduled",
+                                       reason, len(records) - i + 1)
+                        break
 
-            if success:
-                self.repo.update_state(record.id, BookState.DONE)
                 if live_display:
-                    logger.info("Done: {}", record.title)
+                    live_display.set_progress(
+                        f"[bold cyan]Downloading {i} / {len(records)}:[/bold cyan] {escape(record.title)}"
+                    )
                 else:
-                    console.print(f"  [green]Done[/green]")
-            else:
-                self.repo.update_state(record.id, BookState.RETRY)
-                if live_display:
-                    logger.warning("Failed — marked for retry: {}", record.title)
+                    console.print(f"\n[bold][{i}/{len(records)}] {record.title}[/bold]")
+
+                success = self.download_book(record)
+
+                # Updates are queued and committed in batches by the writer; leaving
+                # the block flushes whatever is still pending
+                if success:
+                    done += 1
+                    writer.update_state(record.id, BookState.DONE, source="download")
+                    if live_display:
+                        logger.info("Done: {}", record.title)
+                    else:
+                        console.print(f"  [green]Done[/green]")
                 else:
-                    console.print(f"  [red]Failed — marked for retry[/red]")
+                    writer.update_state(record.id, BookState.RETRY, source="download")
+                    if live_display:
+                        logger.warning("Failed — marked for retry: {}", record.title)
+                    else:
+                        console.print(f"  [red]Failed — marked for retry[/red]")
+
+                writer.save_mirror_stats(self.mirrors.stats)
+                if self.post_processor:
+                    self.post_processor.collect()
+
+        if self.post_processor:
+            self.post_processor.collect(wait=True)
 
-        return sum(1 for r in records if self.repo.get_by_url(r.detail_url).state == BookState.DONE)
+        return done
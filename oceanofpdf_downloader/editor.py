@@ -7,7 +7,7 @@ from textual.screen import ModalScreen
 from textual.widgets import DataTable, Footer, Input, Label, ListItem, ListView
 
 from oceanofpdf_downloader.models import BookRecord, BookState
-from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.repository import BatchWriter, BookRepository
 
 
 COLUMNS = [
@@ -20,6 +20,11 @@ COLUMNS = [
 
 EDITABLE_STATES = [s for s in BookState if s != BookState.BLACKLISTED]
 
+# Rows fetched per page, and how close to the last loaded row the cursor may
+# get before the next page is fetched.
+PAGE_SIZE = 200
+LOAD_AHEAD_ROWS = 20
+
 
 class StateModal(ModalScreen):
     """Pop-up for selecting a new book state."""
@@ -99,7 +104,7 @@ class SearchModal(ModalScreen):
     """
 
     def compose(self) -> ComposeResult:
-        yield Label("Search title, language, genre (empty to reset):")
+        yield Label('Search title, language, genre, author — "quotes" for phrases (empty to reset):')
         yield Input(placeholder="…")
 
     def on_mount(self) -> None:
@@ -140,6 +145,9 @@ class BookEditorApp(App):
         self.repo = repo
         self._current_query: str | None = None
         self._books: list[BookRecord] = []
+        self._total = 0
+        self._exhausted = False
+        self._writer: BatchWriter | None = None
 
     def compose(self) -> ComposeResult:
         yield DataTable(id="books-table", zebra_stripes=True, cursor_type="row")
@@ -150,17 +158,37 @@ class BookEditorApp(App):
         table = self.query_one(DataTable)
         for key, label in COLUMNS:
             table.add_column(label, key=key)
+        self._writer = self.repo.writer()
         self._refresh_books()
 
+    def on_unmount(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
     def _refresh_books(self) -> None:
-        if self._current_query:
-            self._books = self.repo.search_books(self._current_query)
-        else:
-            self._books = self.repo.get_all_books()
+        """Reload from the first page, e.g. after a state change or a new search."""
+        self._books = []
+        self._exhausted = False
+        self.query_one(DataTable).clear()
+        self._total = self.repo.count_books(exclude_blacklisted=True, query=self._current_query)
+        self._load_more()
+
+    def _load_more(self) -> None:
+        """Append the next keyset page of books to the table."""
+        if self._exhausted:
+            return
+        last = self._books[-1] if self._books else None
+        page = self.repo.page_books(
+            after=(last.updated_at, last.id) if last else None,
+            limit=PAGE_SIZE,
+            exclude_blacklisted=True,
+            query=self._current_query,
+        )
+        self._exhausted = len(page) < PAGE_SIZE
+        self._books.extend(page)
 
         table = self.query_one(DataTable)
-        table.clear()
-        for b in self._books:
+        for b in page:
             table.add_row(
                 str(b.id),
                 b.state.value,
@@ -171,7 +199,11 @@ class BookEditorApp(App):
 
         status = self.query_one("#status-bar", Label)
         filter_info = f'  (filter: "{self._current_query}")' if self._current_query else ""
-        status.update(f"{len(self._books)} entries{filter_info}")
+        status.update(f"{self._total} entries{filter_info}")
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        if event.cursor_row >= len(self._books) - LOAD_AHEAD_ROWS:
+            self._load_more()
 
     def _current_book(self) -> BookRecord | None:
         table = self.query_one(DataTable)
@@ -188,8 +220,11 @@ class BookEditorApp(App):
         saved_row = self.query_one(DataTable).cursor_row
         new_state = await self.push_screen_wait(StateModal())
         if new_state is not None:
-            self.repo.update_state(book.id, new_state)
+            self._writer.update_state(book.id, new_state, source="editor")
+            self._writer.flush()
             self._refresh_books()
+            while saved_row >= len(self._books) and not self._exhausted:
+                self._load_more()
             table = self.query_one(DataTable)
             table.move_cursor(row=min(saved_row, len(self._books) - 1))
 
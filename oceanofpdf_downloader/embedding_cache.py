@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not serialised across processes
+    fcntl = None
+
+
+def text_key(text: str) -> int:
+    """64-bit signed hash of an embedded text; the cache index key."""
+    digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class EmbeddingCache:
+    """Append-only on-disk store of text embeddings for one model.
+
+    <directory>/<model>/ holds meta.json (model name and dimension),
+    vectors.f16 (float16 rows, memory-mapped for reads) and keys.i64 (the
+    text_key of each row, in row order). Rows are appended vectors first,
+    keys second; a row only exists once its key is written, so a torn append
+    is cut back on the next open. Opening and add() hold an flock on
+    <model>/lock, so processes sharing the cache never interleave appends.
+    """
+
+    def __init__(self, directory: str, model_name: str) -> None:
+        self.model_name = model_name
+        self.path = os.path.join(directory, re.sub(r"[^\w.-]+", "_", model_name))
+        self.dim = 0
+        self._keys = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, 0), dtype=np.float16)
+        self._sorted_keys = self._keys
+        self._order = np.empty(0, dtype=np.intp)
+        # Locked too: cutting a torn tail must not cut another process's append short
+        with self._locked():
+            self._open()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self) -> None:
+        self.dim = 0
+        self._set_rows(np.empty(0, dtype=np.int64))
+        try:
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("model") != self.model_name:
+            logger.warning("Embedding cache {} belongs to {!r} — starting it afresh", self.path, meta.get("model"))
+            for name in ("meta.json", "keys.i64", "vectors.f16"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            return
+        self.dim = int(meta["dim"])
+        keys_path, vectors_path = self._file("keys.i64"), self._file("vectors.f16")
+        keys = np.fromfile(keys_path, dtype=np.int64) if os.path.exists(keys_path) else self._keys
+        vector_bytes = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        rows = min(len(keys), vector_bytes // (2 * self.dim))
+        # Cut a torn append back to whole rows so the next append lines up
+        for path, size in ((keys_path, rows * 8), (vectors_path, rows * 2 * self.dim)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self._set_rows(keys[:rows])
+
+    def _set_rows(self, keys: np.ndarray) -> None:
+        self._keys = keys
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        if len(keys):
+            self._vectors = np.memmap(self._file("vectors.f16"), dtype=np.float16, mode="r",
+                                      shape=(len(keys), self.dim))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def lookup(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """(vectors, hit mask) for texts; rows of misses are zero. Vectors are float32."""
+        keys = np.fromiter((text_key(t) for t in texts), dtype=np.int64, count=len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if not len(self._keys) or not len(texts):
+            return vectors, np.zeros(len(texts), dtype=bool)
+        pos = np.searchsorted(self._sorted_keys, keys).clip(max=len(self._sorted_keys) - 1)
+        hit = self._sorted_keys[pos] == keys
+        vectors[hit] = self._vectors[self._order[pos[hit]]]
+        return vectors, hit
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def add(self, texts: list[str], vectors: np.ndarray) -> None:
+        """Append embeddings for texts not stored yet."""
+        if not len(texts):
+            return
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self._locked():
+            # Pick up rows other processes appended since this cache was opened
+            self._open()
+            if self.dim and vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                tmp = self._file("meta.json.tmp")
+                with open(tmp, "w") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+                os.replace(tmp, self._file("meta.json"))
+            keys = np.fromiter((text_key(t) for t in texts), dtype=np.int64, count=len(texts))
+            keys, first = np.unique(keys, return_index=True)
+            new = ~np.isin(keys, self._sorted_keys)
+            keys, vectors = keys[new], vectors[first[new]]
+            if not len(keys):
+                return
+            with open(self._file("vectors.f16"), "ab") as f:
+                vectors.tofile(f)
+            with open(self._file("keys.i64"), "ab") as f:
+                keys.tofile(f)
+            self._set_rows(np.concatenate([self._keys, keys]))
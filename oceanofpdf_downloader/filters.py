@@ -1,4 +1,12 @@
+import hashlib
 import importlib
+import json
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
 
 from loguru import logger
 
@@ -10,7 +18,8 @@ from oceanofpdf_downloader.filter_config import (
     TITLE_AUTOSELECT,
     TITLE_BLACKLIST,
 )
-from oceanofpdf_downloader.models import Book
+from oceanofpdf_downloader.models import Book, BookRecord, BookState
+from oceanofpdf_downloader.repository import BookRepository
 
 
 def _load_config() -> dict[str, list[str]]:
@@ -61,48 +70,329 @@ _genre_autoselect = _config["genre_autoselect"]
 _language_autoselect = _config["language_autoselect"]
 
 
-def is_blacklisted(book: Book) -> bool:
-    """Check if a book matches any blacklist keyword (case-insensitive)."""
-    title_lower = book.title.lower()
-    genre_lower = book.genre.lower()
-    language_lower = book.language.lower()
+@dataclass(frozen=True)
+class FilterMatch:
+    """The rule that matched: which book field, and the keyword as configured."""
+    field: str
+    keyword: str
+
+
+def _trie_pattern(words: list[str]) -> str:
+    """One regex alternation for words, with shared prefixes factored out.
+
+    ["romance", "roman", "rome"] becomes "rom(?:an(?:ce)?|e)", so the regex
+    engine tests each text position against a trie instead of every keyword.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Case-insensitive "does any keyword occur in the text" test, compiled once per keyword list."""
+
+    def __init__(self, words: list[str]) -> None:
+        self._keywords: dict[str, str] = {}
+        for word in words:
+            self._keywords.setdefault(word.lower(), word)
+        self._regex = re.compile(_trie_pattern(list(self._keywords))) if self._keywords else None
+
+    def search(self, text: str) -> str | None:
+        """The configured keyword found in text (first occurrence), or None."""
+        if self._regex is None:
+            return None
+        match = self._regex.search(text.lower())
+        return self._keywords[match.group(0)] if match else None
+
+
+# Compiled once per loaded rule list. Entries keep their list alive, so its id
+# cannot be reused by another list; a replaced or extended list is recompiled.
+_matchers: dict[int, tuple[list[str], int, KeywordMatcher]] = {}
+
+
+def _matcher(words: list[str]) -> KeywordMatcher:
+    entry = _matchers.get(id(words))
+    if entry is None or entry[0] is not words or entry[1] != len(words):
+        entry = _matchers[id(words)] = (words, len(words), KeywordMatcher(words))
+    return entry[2]
+
+
+class FilterStats:
+    """Per-rule hit counts and per-list match timings, collected in memory.
 
-    for word in _title_blacklist:
-        if word.lower() in title_lower:
-            return True
+    Rules are keyed by list name ("title_blacklist") and lowercased keyword.
+    flush_stats persists and resets them; report_rules reads them back.
+    """
 
-    for word in _genre_blacklist:
-        if word.lower() in genre_lower:
-            return True
+    def __init__(self) -> None:
+        self.hits: Counter[tuple[str, str]] = Counter()
+        self.calls: Counter[str] = Counter()
+        self.elapsed_ns: Counter[str] = Counter()
 
-    for word in _language_blacklist:
-        if word.lower() in language_lower:
-            return True
+    def __bool__(self) -> bool:
+        return bool(self.calls)
 
-    return False
+
+stats = FilterStats()
+
+
+def _match(book: Book, kind: str, rules: list[tuple[str, list[str]]]) -> FilterMatch | None:
+    for field, words in rules:
+        if not words:
+            continue
+        rule = f"{field}_{kind}"
+        start = time.perf_counter_ns()
+        keyword = _matcher(words).search(getattr(book, field))
+        stats.elapsed_ns[rule] += time.perf_counter_ns() - start
+        stats.calls[rule] += 1
+        if keyword is not None:
+            stats.hits[rule, keyword.lower()] += 1
+            return FilterMatch(field, keyword)
+    return None
+
+
+def flush_stats(repo: BookRepository) -> None:
+    """Add the collected filter statistics to the database totals and reset them."""
+    global stats
+    if stats:
+        repo.record_filter_stats(dict(stats.hits), {rule: (stats.calls[rule], stats.elapsed_ns[rule])
+                                                    for rule in stats.calls})
+        stats = FilterStats()
+
+
+@contextmanager
+def stats_paused() -> Iterator[None]:
+    """Match without counting, e.g. while planning changes that may never be applied."""
+    global stats
+    saved, stats = stats, FilterStats()
+    try:
+        yield
+    finally:
+        stats = saved
+
+
+def blacklist_match(book: Book) -> FilterMatch | None:
+    """The first blacklist rule the book matches (case-insensitive substring), or None."""
+    return _match(book, "blacklist", [("title", _title_blacklist), ("genre", _genre_blacklist),
+                                      ("language", _language_blacklist)])
+
+
+def autoselect_match(book: Book) -> FilterMatch | None:
+    """The first autoselect rule the book matches (case-insensitive substring), or None."""
+    return _match(book, "autoselect", [("title", _title_autoselect), ("genre", _genre_autoselect),
+                                       ("language", _language_autoselect)])
+
+
+def is_blacklisted(book: Book) -> bool:
+    """Check if a book matches any blacklist keyword (case-insensitive)."""
+    return blacklist_match(book) is not None
 
 
 def is_autoselected(book: Book) -> bool:
     """Check if a book matches any autoselect keyword (case-insensitive)."""
-    title_lower = book.title.lower()
-    genre_lower = book.genre.lower()
-    language_lower = book.language.lower()
+    return autoselect_match(book) is not None
 
-    for word in _title_autoselect:
-        if word.lower() in title_lower:
-            return True
 
-    for word in _genre_autoselect:
-        if word.lower() in genre_lower:
-            return True
+def classify(book: Book) -> tuple[BookState, FilterMatch | None]:
+    """A scraped book's initial state and the rule that decided it.
 
-    for word in _language_autoselect:
-        if word.lower() in language_lower:
-            return True
-
-    return False
+    Blacklist wins over autoselect: BLACKLISTED, then SCHEDULED, else NEW.
+    """
+    match = blacklist_match(book)
+    if match:
+        return BookState.BLACKLISTED, match
+    match = autoselect_match(book)
+    if match:
+        return BookState.SCHEDULED, match
+    return BookState.NEW, None
 
 
 def filter_books(books: list[Book]) -> list[Book]:
     """Filter out blacklisted books."""
     return [b for b in books if not is_blacklisted(b)]
+
+
+# --- re-applying changed rules to stored books ---
+
+RULE_LISTS = ("title_blacklist", "genre_blacklist", "language_blacklist",
+              "title_autoselect", "genre_autoselect", "language_autoselect")
+
+# Transition sources whose state decisions follow the rules; books moved by
+# anything else (the user, ML, downloads) are never touched by a rule sync.
+RULE_SOURCES = ("filter", "rules")
+
+
+def current_rules() -> dict[str, list[str]]:
+    """The keyword lists in effect, keyed by RULE_LISTS name."""
+    return {
+        "title_blacklist": list(_title_blacklist),
+        "genre_blacklist": list(_genre_blacklist),
+        "language_blacklist": list(_language_blacklist),
+        "title_autoselect": list(_title_autoselect),
+        "genre_autoselect": list(_genre_autoselect),
+        "language_autoselect": list(_language_autoselect),
+    }
+
+
+def _keyword_set(rules: dict[str, list[str]], name: str) -> set[str]:
+    return {word.lower() for word in rules.get(name, [])}
+
+
+def rules_fingerprint(rules: dict[str, list[str]]) -> str:
+    """Stable hash of a rule set; ignores keyword case, order and duplicates."""
+    canonical = {name: sorted(_keyword_set(rules, name)) for name in RULE_LISTS}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class RuleChange:
+    """A stored book whose state changes under the current rules."""
+    record: BookRecord
+    state: BookState
+    reason: str
+
+
+def plan_rule_changes(repo: BookRepository, old_rules: dict[str, list[str]]) -> list[RuleChange]:
+    """State changes that bring stored books from old_rules in line with the current rules.
+
+    Only keywords added or removed since old_rules are looked up, and only in
+    books they can affect: NEW books matching an added keyword, and books the
+    rules themselves blacklisted or scheduled (RULE_SOURCES) that match an
+    added blacklist word or a removed keyword. Each candidate is then
+    classified against the full current rules.
+    """
+    new_rules = current_rules()
+    lookups: list[tuple[BookState, str, set[str], tuple[str, ...] | None]] = []
+    for field in ("title", "genre", "language"):
+        old_bl, new_bl = _keyword_set(old_rules, f"{field}_blacklist"), _keyword_set(new_rules, f"{field}_blacklist")
+        old_as, new_as = _keyword_set(old_rules, f"{field}_autoselect"), _keyword_set(new_rules, f"{field}_autoselect")
+        lookups += [
+            (BookState.NEW, field, (new_bl - old_bl) | (new_as - old_as), None),
+            (BookState.SCHEDULED, field, (new_bl - old_bl) | (old_as - new_as), RULE_SOURCES),
+            (BookState.BLACKLISTED, field, old_bl - new_bl, RULE_SOURCES),
+        ]
+
+    candidates: dict[int, BookRecord] = {}
+    for state, field, keywords, sources in lookups:
+        if not keywords:
+            continue
+        matcher = KeywordMatcher(sorted(keywords))
+        for record in repo.books_with_keywords(state, field, sorted(keywords), sources):
+            if matcher.search(getattr(record, field)) is not None:
+                candidates[record.id] = record
+
+    changes: list[RuleChange] = []
+    for record in candidates.values():
+        state, match = classify(Book(record.title, record.detail_url, record.language, record.genre, record.author))
+        if state != record.state:
+            reason = f"{match.field} matches '{match.keyword}'" if match else "no rule matches"
+            changes.append(RuleChange(record, state, reason))
+    return changes
+
+
+def sync_rules(repo: BookRepository, dry_run: bool = False) -> list[RuleChange]:
+    """Re-apply the filter rules to stored books if they changed since the last sync.
+
+    The first call only records the current rules as the baseline. With
+    dry_run the planned changes are returned but nothing is written, and
+    the matches are left out of the rule statistics so a dry run followed by
+    the real one counts each book once. Changes are logged with source
+    "rules", so --undo can revert them.
+    """
+    rules = current_rules()
+    fingerprint = rules_fingerprint(rules)
+    applied = repo.applied_ruleset()
+    if applied is not None and applied[0] == fingerprint:
+        return []
+    if dry_run:
+        with stats_paused():
+            return plan_rule_changes(repo, applied[1]) if applied else []
+    changes = plan_rule_changes(repo, applied[1]) if applied else []
+    repo.apply_state_changes([(change.record.id, change.state) for change in changes], source="rules")
+    repo.record_ruleset(fingerprint, rules)
+    return changes
+
+
+# --- rule profiling ---
+
+@dataclass(frozen=True)
+class RuleTiming:
+    rule: str
+    keywords: int
+    calls: int
+    elapsed_ns: int
+
+    @property
+    def avg_us(self) -> float:
+        return self.elapsed_ns / self.calls / 1000 if self.calls else 0.0
+
+
+@dataclass(frozen=True)
+class RuleReport:
+    """Pruning hints for the current rules, from the stored hit counters and timings.
+
+    hits: (rule, keyword) -> (hits, last_hit_at), for every keyword that has fired.
+    dead: (rule, keyword) pairs of the current rules that never matched since counting began.
+    shadowed: (rule, keyword, by_rule, by_keyword): the keyword can never decide
+    a match because, on the keyword's own text, the compiled matchers checked
+    first (its own list, or the same field's blacklist for an autoselect
+    keyword) report by_keyword instead.
+    timings: one entry per rule list, most total time first.
+    """
+    since: str | None
+    hits: dict[tuple[str, str], tuple[int, str]]
+    dead: list[tuple[str, str]]
+    shadowed: list[tuple[str, str, str, str]]
+    timings: list[RuleTiming]
+
+
+def _shadowing(rules: dict[str, list[str]]) -> list[tuple[str, str, str, str]]:
+    # Any text containing a keyword contains its own text, so whatever the matchers
+    # report for that text, in classify's order, claims every book the keyword could
+    shadowed = []
+    for rule in RULE_LISTS:
+        field, kind = rule.split("_")
+        checked_first = [rule] if kind == "blacklist" else [f"{field}_blacklist", rule]
+        matchers = {other_rule: KeywordMatcher(rules.get(other_rule, [])) for other_rule in checked_first}
+        for keyword in sorted(_keyword_set(rules, rule)):
+            for other_rule in checked_first:
+                fired = matchers[other_rule].search(keyword)
+                if fired is None:
+                    continue
+                if (other_rule, fired.lower()) != (rule, keyword):
+                    shadowed.append((rule, keyword, other_rule, fired.lower()))
+                break
+    return shadowed
+
+
+def report_rules(repo: BookRepository) -> RuleReport:
+    """Dead, shadowed and expensive rules among the current rules."""
+    rules = current_rules()
+    hits = repo.filter_rule_hits()
+    stored = repo.filter_timings()
+    timings = sorted(
+        (RuleTiming(rule, len(_keyword_set(rules, rule)), *stored[rule][:2]) for rule in RULE_LISTS if rule in stored),
+        key=lambda t: t.elapsed_ns, reverse=True,
+    )
+    return RuleReport(
+        since=min((since for _, _, since in stored.values()), default=None),
+        hits=hits,
+        dead=[(rule, keyword) for rule in RULE_LISTS for keyword in sorted(_keyword_set(rules, rule))
+              if (rule, keyword) not in hits],
+        shadowed=_shadowing(rules),
+        timings=timings,
+    )
@@ -0,0 +1,78 @@
+import os
+from dataclasses import dataclass
+from typing import Sequence
+
+from oceanofpdf_downloader.config import Config
+
+# Decisions recorded per form in the format_decisions table.
+FETCH = "fetch"
+FALLBACK = "fallback"
+FETCHED = "fetched"
+SKIPPED = "skipped"
+TOO_LARGE = "too_large"
+FAILED = "failed"
+
+
+def form_format(filename: str) -> str:
+    """Return the lower-case file extension without the dot, e.g. "epub"."""
+    return os.path.splitext(filename)[1].lstrip(".").lower()
+
+
+@dataclass
+class FormatDecision:
+    filename: str
+    fmt: str
+    decision: str
+    reason: str
+    size: int | None = None
+
+
+class FormatPolicy:
+    """Chooses which of a book's download forms to fetch.
+
+    Forms are ranked by preferred_formats. Unless fetch_all is set, only the
+    best-ranked form is fetched; the others are fallbacks, tried in order only
+    if it fails or turns out larger than max_bytes. Formats not listed in
+    preferred_formats are skipped, as are forms whose size is already known
+    (from an earlier run) to exceed max_bytes.
+    """
+
+    def __init__(self, preferred_formats: Sequence[str], fetch_all: bool = False, max_bytes: int = 0) -> None:
+        self.preferred_formats = [f.lower().lstrip(".") for f in preferred_formats]
+        self.fetch_all = fetch_all
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_config(cls, config: Config) -> "FormatPolicy":
+        return cls(
+            config.preferred_formats,
+            fetch_all=config.fetch_all_formats,
+            max_bytes=config.max_file_size_mb * 1024 * 1024,
+        )
+
+    def too_large(self, size: int | None) -> bool:
+        return bool(self.max_bytes and size is not None and size > self.max_bytes)
+
+    def plan(self, filenames: Sequence[str], sizes: dict[str, int] | None = None) -> list[FormatDecision]:
+        """Return a decision per filename, FETCH/FALLBACK ones first in the order to try them."""
+        sizes = sizes or {}
+        candidates: list[FormatDecision] = []
+        skipped: list[FormatDecision] = []
+        for filename in filenames:
+            fmt = form_format(filename)
+            size = sizes.get(filename)
+            if fmt not in self.preferred_formats:
+                skipped.append(FormatDecision(filename, fmt, SKIPPED, "format not wanted", size))
+            elif self.too_large(size):
+                skipped.append(FormatDecision(filename, fmt, TOO_LARGE, f"{size} bytes over limit", size))
+            else:
+                candidates.append(FormatDecision(filename, fmt, FALLBACK, "", size))
+
+        candidates.sort(key=lambda d: self.preferred_formats.index(d.fmt))
+        for i, decision in enumerate(candidates):
+            if self.fetch_all or i == 0:
+                decision.decision = FETCH
+                decision.reason = "all formats wanted" if self.fetch_all else "preferred format"
+            else:
+                decision.reason = f"fallback for {candidates[0].fmt}"
+        return candidates + skipped
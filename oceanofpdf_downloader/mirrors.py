@@ -0,0 +1,102 @@
+import time
+from typing import Callable, Sequence, TypeVar
+
+from loguru import logger
+
+from oceanofpdf_downloader.models import ServerStats
+
+# Weight of the newest observation in the rolling (exponentially weighted) averages.
+EWMA_ALPHA = 0.3
+MAX_BACKOFF_FACTOR = 5
+
+FormT = TypeVar("FormT")
+
+
+def _ewma(old: float | None, new: float) -> float:
+    return new if old is None else (1 - EWMA_ALPHA) * old + EWMA_ALPHA * new
+
+
+class MirrorHealth:
+    """Tracks per-server download health and decides which mirrors to try first.
+
+    Servers are ordered by rolling success rate, then throughput, then
+    latency; servers never seen before rank as healthy so they get tried.
+    After failure_threshold consecutive failures a server's circuit opens
+    and it is skipped for cooldown_seconds; the next attempt after that is
+    a trial, and another failure re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        stats: dict[str, ServerStats] | None = None,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 900,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.stats: dict[str, ServerStats] = stats if stats is not None else {}
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+
+    def _get(self, server_id: str) -> ServerStats:
+        return self.stats.setdefault(server_id, ServerStats())
+
+    def is_open(self, server_id: str) -> bool:
+        """True while the server's circuit breaker is open (server should be skipped)."""
+        stats = self.stats.get(server_id)
+        return stats is not None and stats.open_until > self._clock()
+
+    def record_success(self, server_id: str, seconds: float, nbytes: int | None = None) -> None:
+        stats = self._get(server_id)
+        stats.attempts += 1
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        stats.open_until = 0.0
+        stats.success_rate = _ewma(stats.success_rate, 1.0)
+        stats.latency_s = _ewma(stats.latency_s, seconds)
+        if nbytes and seconds > 0:
+            stats.throughput_bps = _ewma(stats.throughput_bps, nbytes / seconds)
+
+    def record_failure(self, server_id: str, seconds: float) -> None:
+        stats = self._get(server_id)
+        stats.attempts += 1
+        stats.consecutive_failures += 1
+        stats.success_rate = _ewma(stats.success_rate, 0.0)
+        stats.latency_s = _ewma(stats.latency_s, seconds)
+        if stats.consecutive_failures >= self.failure_threshold:
+            stats.open_until = self._clock() + self.cooldown_seconds
+            logger.warning(
+                "Mirror '{}' failed {} times in a row — skipping it for {:.0f}s",
+                server_id, stats.consecutive_failures, self.cooldown_seconds,
+            )
+
+    def _sort_key(self, server_id: str) -> tuple[float, float, float]:
+        stats = self.stats.get(server_id)
+        if stats is None:
+            return (-1.0, 0.0, 0.0)
+        return (
+            -stats.success_rate,
+            -(stats.throughput_bps or 0.0),
+            stats.latency_s or 0.0,
+        )
+
+    def order(self, forms: Sequence[FormT], server_of: Callable[[FormT], str] = lambda f: f.server_id) -> list[FormT]:
+        """Return forms healthiest-server first, dropping servers whose circuit is open.
+
+        If every server is open, all forms are returned (in health order) so a
+        book is never failed without at least trying.
+        """
+        ranked = sorted(forms, key=lambda f: self._sort_key(server_of(f)))
+        available = [f for f in ranked if not self.is_open(server_of(f))]
+        if available:
+            skipped = len(ranked) - len(available)
+            if skipped:
+                logger.info("Skipping {} form(s) on mirrors with an open circuit", skipped)
+            return available
+        return ranked
+
+    def pause_for(self, server_id: str, base_seconds: float) -> float:
+        """Pause before hitting a server again, backing off while it keeps failing."""
+        stats = self.stats.get(server_id)
+        failures = stats.consecutive_failures if stats else 0
+        return base_seconds * min(1 + failures, MAX_BACKOFF_FACTOR)
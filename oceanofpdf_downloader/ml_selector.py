@@ -1,16 +1,23 @@
 import os
+import uuid
+from itertools import islice
+from typing import Iterable
 
 import joblib
+import numpy as np
 from loguru import logger
 from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import Pipeline
 
-from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.embedding_cache import EmbeddingCache
+from oceanofpdf_downloader.models import Book, BookRecord, BookState
 from oceanofpdf_downloader.repository import BookRepository
 
 MODEL_VERSION = 2
 MIN_SAMPLES_PER_CLASS = 3
+# Books per predict_proba call in score_batch; bounds memory for DB-wide scoring
+SCORE_CHUNK_SIZE = 4096
 
 
 class SentenceTransformerEmbedder(BaseEstimator, TransformerMixin):
@@ -18,12 +25,17 @@ class SentenceTransformerEmbedder(BaseEstimator, TransformerMixin):
 
   The underlying transformer is loaded lazily and excluded from pickling so
   that joblib only serialises the model name and the fitted classifier weights,
-  not the full transformer checkpoint.
+  not the full transformer checkpoint. With cache_dir, embeddings are read
+  from an EmbeddingCache and only texts not seen before are encoded.
   """
 
-  def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
+  def __init__(self, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 128,
+               cache_dir: str | None = None) -> None:
     self.model_name = model_name
+    self.batch_size = batch_size
+    self.cache_dir = cache_dir
     self._model = None
+    self._cache = None
 
   def _load(self):
     if self._model is None:
@@ -36,28 +48,67 @@ class SentenceTransformerEmbedder(BaseEstimator, TransformerMixin):
     self._load()
     return self
 
+  def _encode(self, texts: list[str]) -> np.ndarray:
+    return self._load().encode(
+      texts, batch_size=self.batch_size, show_progress_bar=False, convert_to_numpy=True,
+    )
+
   def transform(self, X):
-    return self._load().encode(list(X), show_progress_bar=False)
+    texts = list(X)
+    if not self.cache_dir:
+      return self._encode(texts)
+    if self._cache is None:
+      self._cache = EmbeddingCache(self.cache_dir, self.model_name)
+    vectors, hit = self._cache.lookup(texts)
+    missing = [t for t, h in zip(texts, hit) if not h]
+    if missing:
+      # Round fresh embeddings through float16 like cached ones, so a text
+      # scores the same whether or not it was cached
+      encoded = self._encode(missing).astype(np.float16)
+      self._cache.add(missing, encoded)
+      if not hit.any():
+        return encoded.astype(np.float32)
+      vectors[~hit] = encoded
+    logger.debug("Embedding cache: {} hit(s), {} encoded", int(hit.sum()), len(missing))
+    return vectors
 
   def __getstate__(self):
     state = self.__dict__.copy()
     state["_model"] = None  # don't pickle transformer weights
+    state["_cache"] = None
     return state
 
+  def __setstate__(self, state):
+    # Models saved before these settings existed
+    state.setdefault("batch_size", 128)
+    state.setdefault("cache_dir", None)
+    state.setdefault("_cache", None)
+    self.__dict__.update(state)
+
 
 class MLSelector:
   def __init__(self, config) -> None:
     self.config = config
     self._pipeline = None
+    # Identifies the trained model whose scores are stored in books.model_version
+    self.model_id: str | None = None
+    # Labels learned online since the last full train() (see update)
+    self.online_updates = 0
 
   def _book_to_text(self, book) -> str:
     return f"{book.title} {book.genre} {book.language}"
 
-  def train(self, repo: BookRepository) -> None:
-    positives = repo.get_books_by_state(BookState.DONE)
+  def train(self, repo: BookRepository, compare_with: Pipeline | None = None) -> None:
+    """Fit a new model on every labelled book and save it.
+
+    With ml_online_updates the classifier is an SGDClassifier that update()
+    can refine in place; otherwise a LogisticRegression. compare_with is a
+    previous pipeline whose agreement with the new one is logged.
+    """
+    positives = repo.get_books_by_state(BookState.DONE, include_archived=True)
     negatives = (
-      repo.get_books_by_state(BookState.SKIPPED)
-      + repo.get_books_by_state(BookState.BLACKLISTED)
+      repo.get_books_by_state(BookState.SKIPPED, include_archived=True)
+      + repo.get_books_by_state(BookState.BLACKLISTED, include_archived=True)
     )
 
     if len(positives) < MIN_SAMPLES_PER_CLASS:
@@ -112,22 +163,78 @@ class MLSelector:
       + [0] * (len(negatives) + len(extra_negative_texts))
     )
 
+    if self.config.ml_online_updates:
+      # partial_fit cannot balance classes itself, so fix the weights now
+      weights = {label: len(labels) / (2 * labels.count(label)) for label in (0, 1)}
+      clf = SGDClassifier(loss="log_loss", class_weight=weights, random_state=0)
+    else:
+      clf = LogisticRegression(class_weight="balanced", max_iter=1000)
     pipeline = Pipeline([
-      ("embed", SentenceTransformerEmbedder(self.config.ml_sentence_transformer_model)),
-      ("clf", LogisticRegression(class_weight="balanced", max_iter=1000)),
+      ("embed", SentenceTransformerEmbedder(
+        self.config.ml_sentence_transformer_model, self.config.ml_batch_size, self.config.ml_embedding_cache_dir,
+      )),
+      ("clf", clf),
     ])
     pipeline.fit(texts, labels)
 
-    model_dir = os.path.dirname(self.config.ml_model_path)
-    if model_dir:
-      os.makedirs(model_dir, exist_ok=True)
-    joblib.dump({"version": MODEL_VERSION, "pipeline": pipeline}, self.config.ml_model_path)
+    if compare_with is not None:
+      X = pipeline.named_steps["embed"].transform(texts)
+      agreement = (compare_with.named_steps["clf"].predict(X) == pipeline.named_steps["clf"].predict(X)).mean()
+      logger.info("Online model agreed with the full retrain on {:.1%} of {} labelled book(s)", agreement, len(texts))
+
     self._pipeline = pipeline
+    self.model_id = uuid.uuid4().hex
+    self.online_updates = 0
+    self._save()
     logger.info(
       "ML model trained: {} positive, {} negative — saved to {}",
       len(positives), len(negatives), self.config.ml_model_path,
     )
 
+  def _save(self) -> None:
+    """Write the model atomically, so a crash mid-save leaves the previous checkpoint."""
+    model_dir = os.path.dirname(self.config.ml_model_path)
+    if model_dir:
+      os.makedirs(model_dir, exist_ok=True)
+    tmp = f"{self.config.ml_model_path}.tmp"
+    joblib.dump({
+      "version": MODEL_VERSION,
+      "pipeline": self._pipeline,
+      "model_id": self.model_id,
+      "online_updates": self.online_updates,
+    }, tmp)
+    os.replace(tmp, self.config.ml_model_path)
+
+  def update(self, labels: list[tuple[Book | BookRecord, int]], repo: BookRepository | None = None) -> None:
+    """Learn from new decisions (1 = wanted, 0 = not) without retraining, then checkpoint.
+
+    Only models trained with ml_online_updates can learn online. After
+    ml_full_retrain_every online labels the model is retrained from scratch
+    on the whole database (when repo is given) and the two are compared.
+    """
+    if not labels:
+      return
+    if self._pipeline is None:
+      raise RuntimeError("Model not loaded — call load() or train() first")
+    clf = self._pipeline.named_steps["clf"]
+    if not hasattr(clf, "partial_fit"):
+      logger.debug("Model was not trained for online updates — enable ml_online_updates and run --train")
+      return
+    X = self._pipeline.named_steps["embed"].transform([self._book_to_text(b) for b, _ in labels])
+    clf.partial_fit(X, [label for _, label in labels])
+    self.online_updates += len(labels)
+    self.model_id = f"{self.model_id.split('+')[0]}+{self.online_updates}"
+    self._save()
+    logger.debug("ML model updated online with {} label(s) ({} since last full retrain)",
+                 len(labels), self.online_updates)
+
+    if repo is not None and self.online_updates >= self.config.ml_full_retrain_every:
+      logger.info("{} online update(s) since the last full retrain — retraining", self.online_updates)
+      try:
+        self.train(repo, compare_with=self._pipeline)
+      except ValueError as e:
+        logger.warning("Full retrain skipped: {}", e)
+
   def load(self) -> bool:
     if not os.path.exists(self.config.ml_model_path):
       return False
@@ -139,6 +246,13 @@ class MLSelector:
       )
       return False
     self._pipeline = data["pipeline"]
+    # Models saved before model ids existed are identified by their file
+    stat = os.stat(self.config.ml_model_path)
+    self.model_id = data.get("model_id") or f"file-{stat.st_mtime_ns}-{stat.st_size}"
+    self.online_updates = data.get("online_updates", 0)
+    embedder = self._pipeline.named_steps["embed"]
+    embedder.batch_size = self.config.ml_batch_size
+    embedder.cache_dir, embedder._cache = self.config.ml_embedding_cache_dir, None
     return True
 
   def _load_negative_examples(self) -> list[str]:
@@ -160,16 +274,49 @@ class MLSelector:
           titles.append(line)
     return titles
 
-  def predict(self, book: Book) -> bool:
+  def score_batch(self, books: Iterable[Book | BookRecord]) -> np.ndarray:
+    """Return P(positive) for every book, in order, as a float array.
+
+    Texts are encoded SCORE_CHUNK_SIZE books at a time, in ml_batch_size
+    forward passes, so any iterable (e.g. repo.iter_books) can be scored
+    with bounded memory.
+    """
     if self._pipeline is None:
       raise RuntimeError("Model not loaded — call load() or train() first")
-    text = self._book_to_text(book)
-    prob = self._pipeline.predict_proba([text])[0][1]
-    return float(prob) >= self.config.ml_confidence_threshold
+    texts = (self._book_to_text(b) for b in books)
+    chunks = []
+    while chunk := list(islice(texts, SCORE_CHUNK_SIZE)):
+      chunks.append(self._pipeline.predict_proba(chunk)[:, 1])
+    return np.concatenate(chunks) if chunks else np.empty(0)
 
-  def score(self, book: Book) -> float:
-    """Return raw P(positive) without applying the threshold."""
+  def predict_batch(self, books: Iterable[Book | BookRecord]) -> np.ndarray:
+    """Return a bool array: score_batch(books) >= ml_confidence_threshold."""
+    return self.score_batch(books) >= self.config.ml_confidence_threshold
+
+  def refresh_scores(self, repo: BookRepository, states: list[BookState]) -> tuple[int, int]:
+    """Score and store books in states whose stored score is missing or from another model.
+
+    Returns (books scored, books whose decision flipped against their previous
+    stored score). Books already scored by this model are not re-encoded.
+    """
     if self._pipeline is None:
       raise RuntimeError("Model not loaded — call load() or train() first")
-    text = self._book_to_text(book)
-    return float(self._pipeline.predict_proba([text])[0][1])
+    scored = flipped = 0
+    threshold = self.config.ml_confidence_threshold
+    for batch in repo.iter_unscored_books(self.model_id, states, SCORE_CHUNK_SIZE):
+      scores = self.score_batch(batch)
+      previous = repo.get_scores([b.id for b in batch])
+      flipped += sum(1 for b, s in zip(batch, scores)
+                     if b.id in previous and (previous[b.id][0] >= threshold) != (s >= threshold))
+      repo.store_scores(list(zip([b.id for b in batch], scores.tolist())), self.model_id)
+      scored += len(batch)
+    if scored:
+      logger.info("Scored {} book(s) with model {} ({} decision(s) flipped)", scored, self.model_id, flipped)
+    return scored, flipped
+
+  def predict(self, book: Book) -> bool:
+    return bool(self.predict_batch([book])[0])
+
+  def score(self, book: Book) -> float:
+    """Return raw P(positive) without applying the threshold."""
+    return float(self.score_batch([book])[0])
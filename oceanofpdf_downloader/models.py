@@ -18,9 +18,10 @@ class Book:
     detail_url: str
     language: str
     genre: str
+    author: str = "Unknown"
 
 
-@dataclass
+@dataclass(slots=True)
 class BookRecord:
     id: int
     title: str
@@ -30,3 +31,16 @@ class BookRecord:
     state: BookState
     created_at: str
     updated_at: str
+    author: str = "Unknown"
+
+
+@dataclass
+class ServerStats:
+    """Rolling health statistics for one download mirror (DownloadForm.server_id)."""
+    attempts: int = 0
+    successes: int = 0
+    consecutive_failures: int = 0
+    success_rate: float = 1.0
+    latency_s: float | None = None
+    throughput_bps: float | None = None
+    open_until: float = 0.0
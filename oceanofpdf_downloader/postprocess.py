@@ -0,0 +1,255 @@
+import hashlib
+import os
+import re
+import shutil
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+from loguru import logger
+
+from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.models import BookRecord
+from oceanofpdf_downloader.repository import BookRepository
+
+UNKNOWN = "Unknown"
+
+# EPUB dc:language codes -> the language names used on the listing pages.
+LANGUAGE_NAMES = {
+    "de": "German",
+    "en": "English",
+    "es": "Spanish",
+    "fr": "French",
+    "it": "Italian",
+    "nl": "Dutch",
+    "pt": "Portuguese",
+}
+
+_ISBN_RE = re.compile(r"(?:97[89][- ]?)?\d{1,5}[- ]?\d{1,7}[- ]?\d{1,7}[- ]?[\dX]")
+_UNSAFE_PATH_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+@dataclass
+class FileMetadata:
+    author: str | None = None
+    isbn: str | None = None
+    page_count: int | None = None
+    language: str | None = None
+    genre: str | None = None
+
+
+@dataclass
+class PostProcessResult:
+    book_id: int
+    path: str
+    sha256: str
+    size: int
+    metadata: FileMetadata
+
+
+def _normalise_isbn(text: str) -> str | None:
+    for candidate in _ISBN_RE.findall(text):
+        digits = candidate.replace("-", "").replace(" ", "")
+        if len(digits) in (10, 13):
+            return digits
+    return None
+
+
+def extract_epub_metadata(path: str) -> FileMetadata:
+    """Read author, ISBN, language and subjects from an EPUB's OPF package document."""
+    ns = {
+        "c": "urn:oasis:names:tc:opendocument:xmlns:container",
+        "opf": "http://www.idpf.org/2007/opf",
+        "dc": "http://purl.org/dc/elements/1.1/",
+    }
+    with zipfile.ZipFile(path) as zf:
+        container = ElementTree.fromstring(zf.read("META-INF/container.xml"))
+        rootfile = container.find(".//c:rootfile", ns)
+        if rootfile is None:
+            return FileMetadata()
+        opf = ElementTree.fromstring(zf.read(rootfile.get("full-path")))
+
+    metadata = FileMetadata()
+    creator = opf.find(".//dc:creator", ns)
+    if creator is not None and creator.text:
+        metadata.author = creator.text.strip()
+    for identifier in opf.findall(".//dc:identifier", ns):
+        scheme = identifier.get(f"{{{ns['opf']}}}scheme", "")
+        text = identifier.text or ""
+        if "isbn" in (scheme + text).lower() and (isbn := _normalise_isbn(text)):
+            metadata.isbn = isbn
+            break
+    language = opf.find(".//dc:language", ns)
+    if language is not None and language.text:
+        code = language.text.strip().split("-")[0].lower()
+        metadata.language = LANGUAGE_NAMES.get(code, language.text.strip())
+    subjects = [s.text.strip() for s in opf.findall(".//dc:subject", ns) if s.text and s.text.strip()]
+    if subjects:
+        metadata.genre = ", ".join(subjects)
+    return metadata
+
+
+def extract_pdf_metadata(path: str) -> FileMetadata:
+    """Best-effort author, ISBN and page count from a PDF.
+
+    Uses pypdf when installed; otherwise scans the raw bytes, which works for
+    the uncompressed info dictionary and page tree most PDFs carry.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        PdfReader = None
+
+    if PdfReader is not None:
+        reader = PdfReader(path)
+        info = reader.metadata or {}
+        first_page = reader.pages[0].extract_text() if reader.pages else ""
+        return FileMetadata(
+            author=(info.get("/Author") or None),
+            isbn=_normalise_isbn(first_page or ""),
+            page_count=len(reader.pages),
+        )
+
+    with open(path, "rb") as f:
+        data = f.read()
+    metadata = FileMetadata()
+    pages = len(re.findall(rb"/Type\s*/Page(?![s\w])", data))
+    metadata.page_count = pages or None
+    author = re.search(rb"/Author\s*\(((?:\\.|[^\\)])*)\)", data)
+    if author:
+        metadata.author = author.group(1).decode("latin-1").strip() or None
+    isbn = re.search(rb"ISBN(?:-1[03])?:?\s*([0-9Xx][0-9Xx -]{8,16})", data)
+    if isbn:
+        metadata.isbn = _normalise_isbn(isbn.group(1).decode("ascii", "ignore"))
+    return metadata
+
+
+def extract_metadata(path: str) -> FileMetadata:
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".epub":
+            return extract_epub_metadata(path)
+        if ext == ".pdf":
+            return extract_pdf_metadata(path)
+    except Exception as e:
+        logger.warning("Could not read metadata from {}: {}", path, e)
+    return FileMetadata()
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _path_component(value: str) -> str:
+    """Make a single directory name from a language/genre value (first genre only)."""
+    value = value.split(",")[0].strip() or UNKNOWN
+    return _UNSAFE_PATH_CHARS.sub("_", value).strip(". ") or UNKNOWN
+
+
+def library_path(root: str, layout: str, filename: str, language: str, genre: str) -> str:
+    """Build the destination path for a file from a layout such as "{language}/{genre}"."""
+    if not layout:
+        return os.path.join(root, filename)
+    subdir = layout.format(language=_path_component(language), genre=_path_component(genre))
+    return os.path.join(root, *subdir.split("/"), filename)
+
+
+def _move_atomic(src: str, dest: str) -> str:
+    """Move src to dest without ever exposing a half-written dest; returns the final path."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    base, ext = os.path.splitext(dest)
+    n = 1
+    while os.path.exists(dest) and not os.path.samefile(src, dest):
+        dest = f"{base} ({n}){ext}"
+        n += 1
+    try:
+        os.replace(src, dest)
+    except OSError:
+        # Different filesystem: copy next to the target, then rename into place
+        tmp = dest + ".part"
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+        os.remove(src)
+    return dest
+
+
+def process_download(
+    book_id: int, path: str, language: str, genre: str, root: str, layout: str,
+) -> PostProcessResult:
+    """Extract metadata, hash and file a downloaded book. Runs in a worker process."""
+    metadata = extract_metadata(path)
+    if language == UNKNOWN and metadata.language:
+        language = metadata.language
+    if genre == UNKNOWN and metadata.genre:
+        genre = metadata.genre
+    sha256 = hash_file(path)
+    size = os.path.getsize(path)
+    dest = library_path(root, layout, os.path.basename(path), language, genre)
+    final_path = _move_atomic(path, dest) if os.path.abspath(dest) != os.path.abspath(path) else path
+    return PostProcessResult(book_id=book_id, path=final_path, sha256=sha256, size=size, metadata=metadata)
+
+
+class PostProcessor:
+    """Runs post-download processing on a process pool so it overlaps with downloads.
+
+    Results are written back to the repository from the calling thread by
+    collect(), which keeps all database access on the downloader's connection.
+    """
+
+    def __init__(self, config: Config, repo: BookRepository) -> None:
+        self.config = config
+        self.repo = repo
+        self._executor = ProcessPoolExecutor(max_workers=config.post_process_workers)
+        self._pending: list[tuple[BookRecord, Future]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def submit(self, record: BookRecord, path: str) -> None:
+        future = self._executor.submit(
+            process_download, record.id, path, record.language, record.genre,
+            self.config.download_dir, self.config.library_layout,
+        )
+        self._pending.append((record, future))
+
+    def collect(self, wait: bool = False) -> list[PostProcessResult]:
+        """Store results of finished jobs; with wait=True, block until all jobs are done."""
+        results: list[PostProcessResult] = []
+        still_pending: list[tuple[BookRecord, Future]] = []
+        for record, future in self._pending:
+            if not wait and not future.done():
+                still_pending.append((record, future))
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error("Post-processing failed for '{}': {}", record.title, e)
+                continue
+            self._store(result)
+            results.append(result)
+        self._pending = still_pending
+        return results
+
+    def _store(self, result: PostProcessResult) -> None:
+        meta = result.metadata
+        self.repo.add_book_file(
+            result.book_id, result.path, result.sha256, result.size,
+            author=meta.author, isbn=meta.isbn, page_count=meta.page_count,
+        )
+        self.repo.fill_unknown_details(
+            result.book_id, language=meta.language, genre=meta.genre, author=meta.author,
+        )
+        logger.info("Filed {} ({} bytes, sha256 {}…)", result.path, result.size, result.sha256[:12])
+
+    def close(self) -> None:
+        self.collect(wait=True)
+        self._executor.shutdown()
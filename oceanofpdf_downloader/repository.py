@@ -1,7 +1,20 @@
+import functools
+import json
 import os
+import queue
+import re
 import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
 
-from oceanofpdf_downloader.models import Book, BookRecord, BookState
+from loguru import logger
+
+from oceanofpdf_downloader.format_policy import FETCHED, FormatDecision
+from oceanofpdf_downloader.models import Book, BookRecord, BookState, ServerStats
+from oceanofpdf_downloader.utils import split_genres, url_key
 
 DB_DIR = os.path.expanduser("~/.config/oceanofpdf-downloader")
 DB_PATH = os.path.join(DB_DIR, "books.db")
@@ -19,88 +32,1299 @@ CREATE TABLE IF NOT EXISTS books (
 )
 """
 
-INSERT_BOOK_SQL = """
-INSERT OR IGNORE INTO books (title, detail_url, language, genre)
-VALUES (?, ?, ?, ?)
+CREATE_BOOK_FILES_SQL = """
+CREATE TABLE IF NOT EXISTS book_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER NOT NULL REFERENCES books(id),
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    author TEXT,
+    isbn TEXT,
+    page_count INTEGER,
+    created_at TEXT NOT NULL DEFAULT (datetime('now'))
+)
+"""
+
+CREATE_MIRROR_STATS_SQL = """
+CREATE TABLE IF NOT EXISTS mirror_stats (
+    server_id TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    success_rate REAL NOT NULL DEFAULT 1.0,
+    latency_s REAL,
+    throughput_bps REAL,
+    open_until REAL NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+)
+"""
+
+CREATE_FORMAT_DECISIONS_SQL = """
+CREATE TABLE IF NOT EXISTS format_decisions (
+    book_id INTEGER NOT NULL REFERENCES books(id),
+    filename TEXT NOT NULL,
+    format TEXT NOT NULL,
+    decision TEXT NOT NULL,
+    reason TEXT NOT NULL DEFAULT '',
+    size INTEGER,
+    updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY (book_id, filename)
+)
+"""
+
+# Millisecond timestamps, so changes within the same second keep their order.
+# They sort correctly against the second-precision datetime('now') defaults.
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# Column order expected by _book_row; select books with this instead of *
+BOOK_COLUMNS = "id, title, detail_url, language, genre, state, created_at, updated_at, author"
+
+INSERT_BOOK_SQL = f"""
+INSERT OR IGNORE INTO books (title, detail_url, language, genre, author, url_key, state, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, {NOW_SQL}, {NOW_SQL})
 """
 
+BOOKS_PREFIXED = ", ".join(f"books.{column}" for column in BOOK_COLUMNS.split(", "))
+
+
+# Ordered schema migrations. Each one runs once, in its own transaction, and
+# PRAGMA user_version records how many have been applied. A step is either an
+# SQL statement or a callable taking the connection. Append only — never edit
+# a migration that has shipped.
+MIGRATIONS: list[tuple[str, list]] = [
+    ("base schema", [
+        CREATE_TABLE_SQL,
+        CREATE_BOOK_FILES_SQL,
+        CREATE_MIRROR_STATS_SQL,
+        CREATE_FORMAT_DECISIONS_SQL,
+    ]),
+    ("indexes for state and recency queries", [
+        # get_books_by_state: WHERE state = ?
+        "CREATE INDEX IF NOT EXISTS idx_books_state_updated ON books (state, updated_at, id)",
+        # get_all_books / editor: ORDER BY updated_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_books_updated ON books (updated_at, id)",
+        # get_expected_sizes: SUM(size) GROUP BY book_id
+        "CREATE INDEX IF NOT EXISTS idx_book_files_book ON book_files (book_id, size)",
+        # get_books_missing_format: WHERE format = ? AND decision ...
+        "CREATE INDEX IF NOT EXISTS idx_format_decisions_format ON format_decisions (format, decision, book_id)",
+    ]),
+]
+
+def _fts5_available(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _create_books_fts(conn: sqlite3.Connection) -> None:
+    """External-content FTS5 index over books, kept in sync by triggers.
+
+    Skipped when SQLite is built without FTS5; search_books then uses LIKE.
+    """
+    if not _fts5_available(conn):
+        logger.warning("SQLite has no FTS5 support — search falls back to LIKE scans")
+        return
+    conn.execute(
+        """CREATE VIRTUAL TABLE books_fts USING fts5(
+               title, language, genre, author,
+               content='books', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+           )"""
+    )
+    conn.execute(
+        """CREATE TRIGGER books_fts_insert AFTER INSERT ON books BEGIN
+               INSERT INTO books_fts (rowid, title, language, genre, author)
+               VALUES (new.id, new.title, new.language, new.genre, new.author);
+           END"""
+    )
+    conn.execute(
+        """CREATE TRIGGER books_fts_delete AFTER DELETE ON books BEGIN
+               INSERT INTO books_fts (books_fts, rowid, title, language, genre, author)
+               VALUES ('delete', old.id, old.title, old.language, old.genre, old.author);
+           END"""
+    )
+    conn.execute(
+        """CREATE TRIGGER books_fts_update AFTER UPDATE OF title, language, genre, author ON books BEGIN
+               INSERT INTO books_fts (books_fts, rowid, title, language, genre, author)
+               VALUES ('delete', old.id, old.title, old.language, old.genre, old.author);
+               INSERT INTO books_fts (rowid, title, language, genre, author)
+               VALUES (new.id, new.title, new.language, new.genre, new.author);
+           END"""
+    )
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+MIGRATIONS.append(("author column and full-text search", [
+    "ALTER TABLE books ADD COLUMN author TEXT NOT NULL DEFAULT 'Unknown'",
+    _create_books_fts,
+]))
+
+
+
+def link_lookups(conn: sqlite3.Connection, books: list[tuple[int, str, str, str]]) -> None:
+    """Point (id, language, genre, author) books at their lookup-table rows and
+    replace their genre tags. Runs inside the caller's transaction."""
+    if not books:
+        return
+    conn.executemany("INSERT OR IGNORE INTO languages (name) VALUES (?)", {(b[1],) for b in books})
+    conn.executemany("INSERT OR IGNORE INTO authors (name) VALUES (?)", {(b[3],) for b in books})
+    tags = [(book_id, tag) for book_id, _, genre, _ in books for tag in split_genres(genre)]
+    conn.executemany("INSERT OR IGNORE INTO genres (name) VALUES (?)", {(tag,) for _, tag in tags})
+    conn.executemany(
+        """UPDATE books
+           SET language_id = (SELECT id FROM languages WHERE name = ?),
+               author_id = (SELECT id FROM authors WHERE name = ?)
+           WHERE id = ?""",
+        [(language, author, book_id) for book_id, language, _, author in books],
+    )
+    conn.executemany("DELETE FROM book_genres WHERE book_id = ?", [(b[0],) for b in books])
+    conn.executemany(
+        "INSERT OR IGNORE INTO book_genres (book_id, genre_id) SELECT ?, id FROM genres WHERE name = ?",
+        tags,
+    )
+
+
+def _backfill_lookups(conn: sqlite3.Connection) -> None:
+    rows = conn.execute("SELECT id, language, genre, author FROM books").fetchall()
+    link_lookups(conn, [tuple(row) for row in rows])
+
+
+MIGRATIONS.append(("language, genre and author lookup tables", [
+    "CREATE TABLE languages (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE genres (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "ALTER TABLE books ADD COLUMN language_id INTEGER REFERENCES languages(id)",
+    "ALTER TABLE books ADD COLUMN author_id INTEGER REFERENCES authors(id)",
+    """CREATE TABLE book_genres (
+           book_id INTEGER NOT NULL REFERENCES books(id),
+           genre_id INTEGER NOT NULL REFERENCES genres(id),
+           PRIMARY KEY (book_id, genre_id)
+       ) WITHOUT ROWID""",
+    "CREATE INDEX idx_book_genres_genre ON book_genres (genre_id, book_id)",
+    "CREATE INDEX idx_books_language ON books (language_id)",
+    "CREATE INDEX idx_books_author ON books (author_id)",
+    _backfill_lookups,
+]))
+
+MIGRATIONS.append(("state transition log and per-state counters", [
+    f"""CREATE TABLE state_transitions (
+           id INTEGER PRIMARY KEY,
+           book_id INTEGER NOT NULL REFERENCES books(id),
+           from_state TEXT,
+           to_state TEXT NOT NULL,
+           source TEXT NOT NULL DEFAULT '',
+           created_at TEXT NOT NULL DEFAULT ({NOW_SQL})
+       )""",
+    # revert_transitions: WHERE created_at BETWEEN ? AND ? [AND source = ?]
+    "CREATE INDEX idx_transitions_created ON state_transitions (created_at)",
+    "CREATE INDEX idx_transitions_source ON state_transitions (source, created_at)",
+    "CREATE INDEX idx_transitions_book ON state_transitions (book_id, id)",
+    "CREATE TABLE state_counts (state TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID",
+    "INSERT INTO state_counts (state, count) SELECT state, COUNT(*) FROM books GROUP BY state",
+    """CREATE TRIGGER state_counts_insert AFTER INSERT ON books BEGIN
+           INSERT INTO state_counts (state, count) VALUES (new.state, 1)
+           ON CONFLICT(state) DO UPDATE SET count = count + 1;
+       END""",
+    """CREATE TRIGGER state_counts_delete AFTER DELETE ON books BEGIN
+           UPDATE state_counts SET count = count - 1 WHERE state = old.state;
+       END""",
+    """CREATE TRIGGER state_counts_update AFTER UPDATE OF state ON books
+       WHEN old.state != new.state BEGIN
+           UPDATE state_counts SET count = count - 1 WHERE state = old.state;
+           INSERT INTO state_counts (state, count) VALUES (new.state, 1)
+           ON CONFLICT(state) DO UPDATE SET count = count + 1;
+       END""",
+]))
+
+def _backfill_url_keys(conn: sqlite3.Connection) -> None:
+    """Fill url_key; on a key clash the oldest book keeps it, later ones stay NULL."""
+    seen: set[int] = set()
+    keys: list[tuple[int, int]] = []
+    clashes = 0
+    for book_id, detail_url in conn.execute("SELECT id, detail_url FROM books ORDER BY id"):
+        key = url_key(detail_url)
+        if key in seen:
+            clashes += 1
+            continue
+        seen.add(key)
+        keys.append((key, book_id))
+    conn.executemany("UPDATE books SET url_key = ? WHERE id = ?", keys)
+    if clashes:
+        logger.warning("{} book(s) share a canonical URL with an older book and were left without a url_key",
+                       clashes)
+
+
+MIGRATIONS.append(("canonical URL key", [
+    "ALTER TABLE books ADD COLUMN url_key INTEGER",
+    _backfill_url_keys,
+    "CREATE UNIQUE INDEX idx_books_url_key ON books (url_key)",
+]))
+
+MIGRATIONS.append(("archive table for settled books", [
+    f"""CREATE TABLE books_archive (
+           id INTEGER PRIMARY KEY,
+           title TEXT NOT NULL,
+           detail_url TEXT NOT NULL,
+           language TEXT NOT NULL,
+           genre TEXT NOT NULL,
+           state TEXT NOT NULL,
+           created_at TEXT NOT NULL,
+           updated_at TEXT NOT NULL,
+           author TEXT NOT NULL,
+           url_key INTEGER,
+           archived_at TEXT NOT NULL DEFAULT ({NOW_SQL})
+       )""",
+    # get_by_url and the insert trigger below: archived URLs still count as known
+    "CREATE UNIQUE INDEX idx_archive_url_key ON books_archive (url_key)",
+    "CREATE INDEX idx_archive_state ON books_archive (state)",
+    """CREATE TRIGGER books_skip_archived BEFORE INSERT ON books
+       WHEN EXISTS (SELECT 1 FROM books_archive WHERE url_key = new.url_key) BEGIN
+           SELECT RAISE(IGNORE);
+       END""",
+    f"""CREATE VIEW all_books AS
+        SELECT {BOOK_COLUMNS} FROM books
+        UNION ALL
+        SELECT {BOOK_COLUMNS} FROM books_archive""",
+]))
+
+MIGRATIONS.append(("filter rule set history", [
+    f"""CREATE TABLE filter_rulesets (
+           id INTEGER PRIMARY KEY,
+           fingerprint TEXT NOT NULL UNIQUE,
+           rules TEXT NOT NULL,
+           created_at TEXT NOT NULL DEFAULT ({NOW_SQL}),
+           applied_at TEXT
+       )""",
+]))
+
+MIGRATIONS.append(("filter rule hit counters and timings", [
+    """CREATE TABLE filter_rule_hits (
+           rule TEXT NOT NULL,
+           keyword TEXT NOT NULL,
+           hits INTEGER NOT NULL,
+           last_hit_at TEXT NOT NULL,
+           PRIMARY KEY (rule, keyword)
+       ) WITHOUT ROWID""",
+    f"""CREATE TABLE filter_timings (
+           rule TEXT PRIMARY KEY,
+           calls INTEGER NOT NULL,
+           elapsed_ns INTEGER NOT NULL,
+           since TEXT NOT NULL DEFAULT ({NOW_SQL})
+       ) WITHOUT ROWID""",
+]))
+
+MIGRATIONS.append(("stored ML scores", [
+    "ALTER TABLE books ADD COLUMN score REAL",
+    "ALTER TABLE books ADD COLUMN model_version TEXT",
+    # score_stats aggregates from this index alone
+    "CREATE INDEX idx_books_scores ON books (model_version, state, score)",
+]))
+
+
+def _rekey_urls(conn: sqlite3.Connection) -> None:
+    """Recompute url_key now that canonical_url keeps non-tracking query parameters.
+
+    The new keys only tell more URLs apart, so archived keys cannot clash;
+    hot books are re-backfilled so ones left keyless by a clash get a key.
+    """
+    conn.executemany("UPDATE books_archive SET url_key = ? WHERE id = ?",
+                     [(url_key(detail_url), archive_id)
+                      for archive_id, detail_url in conn.execute("SELECT id, detail_url FROM books_archive")])
+    conn.execute("UPDATE books SET url_key = NULL")
+    _backfill_url_keys(conn)
+
+
+MIGRATIONS.append(("URL keys keep meaningful query parameters", [
+    _rekey_urls,
+]))
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Columns written by export and read back by upsert_rows (ids are not portable)
+EXPORT_FIELDS = ("title", "detail_url", "language", "genre", "author", "state", "created_at", "updated_at")
+
+# States that are never picked up again once set; archive_books moves these.
+SETTLED_STATES = (BookState.SKIPPED, BookState.BLACKLISTED, BookState.INVALID)
+
+_STATES = {state.value: state for state in BookState}
+
+
+def _book_row(cursor: sqlite3.Cursor, row: tuple) -> BookRecord:
+    """Row factory for BOOK_COLUMNS queries: positional, no per-row name lookups.
+
+    Language, genre and author repeat across thousands of rows, so they are
+    interned and all records share one string object per distinct value.
+    """
+    book_id, title, detail_url, language, genre, state, created_at, updated_at, author = row
+    return BookRecord(
+        book_id, title, detail_url, sys.intern(language), sys.intern(genre),
+        _STATES[state], created_at, updated_at, sys.intern(author),
+    )
+
+
+# Rows per batch for page_books/iter_books
+DEFAULT_PAGE_SIZE = 500
+
+# Relevance for books_fts, weighting columns title, language, genre, author
+FTS_RANK_SQL = "bm25(books_fts, 10.0, 1.0, 2.0, 5.0)"
+
+
+def fts_query(query: str) -> str | None:
+    """Translate a user search into an FTS5 MATCH expression.
+
+    Quoted parts become phrase queries, every other word a prefix query;
+    all parts must match. Returns None if the query has no searchable words.
+    """
+    parts: list[str] = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            tokens = re.findall(r"\w+", phrase)
+            if tokens:
+                parts.append('"' + " ".join(tokens) + '"')
+        else:
+            parts.extend(f'"{token}"*' for token in re.findall(r"\w+", word))
+    return " ".join(parts) or None
+
+# Connection tuning for file databases: WAL lets readers run alongside a writer,
+# synchronous=NORMAL is durable in WAL mode except on power loss, and the
+# cache/mmap sizes keep the hot part of a large DB in memory.
+FILE_DB_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+# Seconds a connection waits for another process's write lock before failing
+BUSY_TIMEOUT_S = 30.0
+# Extra attempts for writes that still fail with "database is locked"
+LOCK_RETRIES = 4
+
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+def retry_locked(method):
+    """Retry a write transaction with backoff when the database stays locked past
+    the busy timeout. The wrapped method must roll back on error (with conn:)."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                return method(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _is_locked(e) or attempt == LOCK_RETRIES:
+                    raise
+                delay = 0.1 * 2 ** attempt
+                logger.warning("{}: {} — retrying in {:.1f}s", method.__name__, e, delay)
+                time.sleep(delay)
+    return wrapper
+
+
+def _move_to_archive(conn: sqlite3.Connection, where: str, params: list) -> int:
+    """Move the books matching where from the hot table to books_archive. Returns the count."""
+    conn.execute(
+        f"""INSERT OR REPLACE INTO books_archive ({BOOK_COLUMNS}, url_key)
+            SELECT {BOOK_COLUMNS}, url_key FROM books WHERE {where}""",
+        params,
+    )
+    conn.execute(f"DELETE FROM book_genres WHERE book_id IN (SELECT id FROM books WHERE {where})", params)
+    return conn.execute(f"DELETE FROM books WHERE {where}", params).rowcount
+
 
 class BookRepository:
-    def __init__(self, db_path: str | None = None) -> None:
+    """Book database access, safe to share between threads and processes.
+
+    Each thread gets its own connection (file databases only; an in-memory
+    database is a single shared connection). Connections wait up to
+    busy_timeout for locks held by other processes, and write transactions
+    start with BEGIN IMMEDIATE so two writers never deadlock upgrading a read
+    lock. Together with WAL this lets a download run, the editor and a
+    crawler use one database at the same time.
+    """
+
+    def __init__(self, db_path: str | None = None, busy_timeout: float = BUSY_TIMEOUT_S) -> None:
         self.db_path = db_path or DB_PATH
-        if self.db_path != ":memory:":
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._shared: sqlite3.Connection | None = None
+        if self.db_path == ":memory:":
+            self._shared = self._open()
+        else:
             os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._conn = sqlite3.connect(self.db_path)
-        self._conn.row_factory = sqlite3.Row
-        self._create_table()
+        self._migrate()
 
-    def _connect(self) -> sqlite3.Connection:
-        return self._conn
-
-    def _create_table(self) -> None:
-        self._conn.execute(CREATE_TABLE_SQL)
-        self._conn.commit()
-
-    def _row_to_record(self, row: sqlite3.Row) -> BookRecord:
-        return BookRecord(
-            id=row["id"],
-            title=row["title"],
-            detail_url=row["detail_url"],
-            language=row["language"],
-            genre=row["genre"],
-            state=BookState(row["state"]),
-            created_at=row["created_at"],
-            updated_at=row["updated_at"],
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            isolation_level="IMMEDIATE",
+            check_same_thread=False,
         )
+        conn.row_factory = sqlite3.Row
+        if self.db_path != ":memory:":
+            for pragma in FILE_DB_PRAGMAS:
+                conn.execute(pragma)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return self._connect()
+
+    @retry_locked
+    def archive_books(self, older_than_days: float, states: tuple[BookState, ...] = SETTLED_STATES) -> int:
+        """Move books in a settled state, unchanged for older_than_days, to books_archive.
+
+        Archived books leave the hot table (and its indexes, search index and
+        state counts) but their URLs still count as known, so they are never
+        imported again. Returns the number of books archived.
+        """
+        # One cutoff for the copy and both deletes, so a row crossing it mid-way
+        # is neither deleted without being archived nor archived twice
+        cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+        placeholders = ", ".join("?" for _ in states)
+        where = f"state IN ({placeholders}) AND updated_at < ?"
+        params = [state.value for state in states] + [cutoff.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]]
+        with self._conn as conn:
+            moved = _move_to_archive(conn, where, params)
+        logger.info("Archived {} book(s) not changed in {} days", moved, older_than_days)
+        return moved
+
+    def compact(self) -> None:
+        """Merge the search index, refresh planner statistics and VACUUM the database file."""
+        conn = self._conn
+        if self._has_fts():
+            with conn:
+                conn.execute("INSERT INTO books_fts (books_fts) VALUES ('optimize')")
+        conn.execute("PRAGMA optimize")
+        conn.execute("VACUUM")
+        if self.db_path != ":memory:":
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        """Close every connection opened by any thread."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def writer(self, max_batch: int = 500, max_delay: float = 0.5) -> "BatchWriter":
+        return BatchWriter(self, max_batch=max_batch, max_delay=max_delay)
+
+    def schema_version(self) -> int:
+        return self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _migrate(self) -> None:
+        """Apply all migrations newer than the database's user_version.
+
+        Each migration re-reads user_version under the write lock, so processes
+        starting together apply it once.
+        """
+        conn = self._conn
+        while self.schema_version() < SCHEMA_VERSION:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                number = self.schema_version() + 1
+                if number > SCHEMA_VERSION:
+                    conn.execute("COMMIT")
+                    break
+                description, steps = MIGRATIONS[number - 1]
+                logger.info("Migrating database to schema version {}: {}", number, description)
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _books(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Execute a BOOK_COLUMNS query on a cursor that yields BookRecords."""
+        cursor = self._conn.cursor()
+        cursor.row_factory = _book_row
+        return cursor.execute(sql, params)
 
     def insert_book(self, book: Book) -> BookRecord | None:
-        cursor = self._conn.execute(INSERT_BOOK_SQL, (book.title, book.detail_url, book.language, book.genre))
-        self._conn.commit()
-        if cursor.rowcount == 0:
-            return None
-        record_row = self._conn.execute("SELECT * FROM books WHERE id = ?", (cursor.lastrowid,)).fetchone()
-        return self._row_to_record(record_row)
+        records = self.insert_books([book])
+        return records[0] if records else None
+
+    @retry_locked
+    def insert_books(self, books: list[Book], states: list[BookState] | None = None,
+                     source: str = "") -> list[BookRecord]:
+        """Insert books in a single transaction. Returns records for the rows that were new;
+        books whose detail_url, or another URL with the same canonical form, is already
+        known are skipped.
+
+        states gives each book's initial state (default NEW); a book inserted in
+        any other state is logged as a NEW -> state transition tagged with source.
+        """
+        states = states or [BookState.NEW] * len(books)
+        with self._conn as conn:
+            inserted = conn.executemany(
+                INSERT_BOOK_SQL,
+                [(book.title, book.detail_url, book.language, book.genre, book.author,
+                  url_key(book.detail_url), state.value)
+                 for book, state in zip(books, states, strict=True)],
+            ).rowcount
+            # The transaction holds the write lock since the first insert and ids are
+            # AUTOINCREMENT, so the new rows are exactly the highest `inserted` ids
+            records = self._books(
+                f"SELECT {BOOK_COLUMNS} FROM books ORDER BY id DESC LIMIT ?", (max(inserted, 0),),
+            ).fetchall()[::-1]
+            link_lookups(conn, [(r.id, r.language, r.genre, r.author) for r in records])
+            conn.executemany(
+                f"""INSERT INTO state_transitions (book_id, from_state, to_state, source, created_at)
+                    VALUES (?, ?, ?, ?, {NOW_SQL})""",
+                [(r.id, BookState.NEW.value, r.state.value, source) for r in records if r.state != BookState.NEW],
+            )
+        return records
 
     def import_books(self, books: list[Book]) -> int:
-        count = 0
-        for book in books:
-            if self.insert_book(book) is not None:
-                count += 1
-        return count
+        return len(self.insert_books(books))
+
+    @retry_locked
+    def upsert_rows(self, rows: list[dict]) -> int:
+        """Insert or update exported book rows (EXPORT_FIELDS keys) in one transaction.
+
+        Rows match existing books by canonical URL; an existing book is only
+        overwritten by a row with a newer updated_at, and its state change is
+        logged with source "import". Rows with a true "archived" key go to
+        books_archive unless their URL is already in the hot table. Returns
+        the number of books inserted or updated.
+        """
+        if not rows:
+            return 0
+        params = [
+            (r["title"], r["detail_url"], r["language"], r["genre"], r["author"],
+             r["state"], r["created_at"], r["updated_at"], url_key(r["detail_url"]))
+            for r in rows
+        ]
+        archived = [p for p, r in zip(params, rows) if r.get("archived")]
+        with self._conn as conn:
+            archived_keys = json.dumps([p[8] for p in archived])
+            hot_keys = {key for (key,) in conn.execute(
+                "SELECT url_key FROM books WHERE url_key IN (SELECT value FROM json_each(?))", (archived_keys,),
+            )}
+            written = conn.executemany(
+                """UPDATE books_archive SET title = ?, detail_url = ?, language = ?, genre = ?, author = ?,
+                                            state = ?, updated_at = ?
+                   WHERE url_key = ? AND updated_at < ?""",
+                [(*p[:6], p[7], p[8], p[7]) for p in archived],
+            ).rowcount
+            conn.executemany(
+                f"""INSERT INTO state_transitions (book_id, from_state, to_state, source, created_at)
+                    SELECT id, state, ?, 'import', {NOW_SQL} FROM books
+                    WHERE url_key = ? AND state != ? AND updated_at < ?""",
+                [(p[5], p[8], p[5], p[7]) for p in params],
+            )
+            written += conn.executemany(
+                """INSERT INTO books (title, detail_url, language, genre, author, state, created_at, updated_at, url_key)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url_key) DO UPDATE SET
+                       title = excluded.title,
+                       language = excluded.language,
+                       genre = excluded.genre,
+                       author = excluded.author,
+                       state = excluded.state,
+                       updated_at = excluded.updated_at
+                   WHERE excluded.updated_at > books.updated_at
+                   ON CONFLICT DO NOTHING""",
+                params,
+            ).rowcount
+            changed = conn.execute(
+                "SELECT id, language, genre, author FROM books WHERE url_key IN (SELECT value FROM json_each(?))",
+                (json.dumps([p[8] for p in params]),),
+            ).fetchall()
+            link_lookups(conn, [tuple(row) for row in changed])
+            # New archived rows went through the hot table for a fresh id; move them on
+            _move_to_archive(conn, "url_key IN (SELECT value FROM json_each(?))",
+                             [json.dumps([p[8] for p in archived if p[8] not in hot_keys])])
+        return written
+
+    def iter_export_rows(self, batch_size: int = 10_000) -> Iterator[dict]:
+        """Stream every book, hot then archived, as an EXPORT_FIELDS dict plus "archived"."""
+        cursor = self._conn.execute(
+            f"""SELECT {", ".join(EXPORT_FIELDS)}, 0 AS archived FROM books
+                UNION ALL
+                SELECT {", ".join(EXPORT_FIELDS)}, 1 AS archived FROM books_archive"""
+        )
+        names = [*EXPORT_FIELDS, "archived"]
+        while rows := cursor.fetchmany(batch_size):
+            for row in rows:
+                yield dict(zip(names, row))
 
     def get_by_url(self, detail_url: str) -> BookRecord | None:
-        row = self._conn.execute("SELECT * FROM books WHERE detail_url = ?", (detail_url,)).fetchone()
-        if row is None:
-            return None
-        return self._row_to_record(row)
-
-    def get_books_by_state(self, state: BookState) -> list[BookRecord]:
-        rows = self._conn.execute("SELECT * FROM books WHERE state = ?", (state.value,)).fetchall()
-        return [self._row_to_record(row) for row in rows]
-
-    def update_state(self, book_id: int, state: BookState) -> None:
-        self._conn.execute(
-            "UPDATE books SET state = ?, updated_at = datetime('now') WHERE id = ?",
-            (state.value, book_id),
+        """Look a book up by any URL variant of its detail page (see utils.canonical_url).
+
+        Archived books are found too.
+        """
+        key = url_key(detail_url)
+        return (
+            self._books(f"SELECT {BOOK_COLUMNS} FROM books WHERE url_key = ?", (key,)).fetchone()
+            or self._books(f"SELECT {BOOK_COLUMNS} FROM books WHERE detail_url = ?", (detail_url,)).fetchone()
+            or self._books(f"SELECT {BOOK_COLUMNS} FROM books_archive WHERE url_key = ?", (key,)).fetchone()
         )
-        self._conn.commit()
+
+    def iter_url_keys(self) -> Iterator[int]:
+        """Every known url_key, hot and archived (index-only scans)."""
+        for (key,) in self._conn.execute(
+            """SELECT url_key FROM books WHERE url_key IS NOT NULL
+               UNION ALL
+               SELECT url_key FROM books_archive WHERE url_key IS NOT NULL"""
+        ):
+            yield key
+
+    def count_url_keys(self) -> int:
+        archived = self._conn.execute("SELECT COUNT(*) FROM books_archive").fetchone()[0]
+        return sum(self.state_counts().values()) + archived
+
+    def url_key_fingerprint(self) -> tuple[int, int, int]:
+        """Changes whenever books are imported or archived; tags saved KnownUrlFilter snapshots."""
+        max_hot, max_archived = self._conn.execute(
+            "SELECT (SELECT COALESCE(MAX(id), 0) FROM books), (SELECT COALESCE(MAX(id), 0) FROM books_archive)"
+        ).fetchone()
+        return max_hot, max_archived, self.count_url_keys()
+
+    def get_books_by_state(self, state: BookState, include_archived: bool = False) -> list[BookRecord]:
+        table = "all_books" if include_archived else "books"
+        return self._books(f"SELECT {BOOK_COLUMNS} FROM {table} WHERE state = ?", (state.value,)).fetchall()
+
+    def update_state(self, book_id: int, state: BookState, source: str = "") -> None:
+        self.update_states([book_id], state, source)
+
+    def update_states(self, book_ids: list[int], state: BookState, source: str = "") -> None:
+        """Move all given books to state in a single transaction."""
+        self.apply_state_changes([(book_id, state) for book_id in book_ids], source)
+
+    @retry_locked
+    def apply_state_changes(self, changes: list[tuple[int, BookState]], source: str = "") -> None:
+        """Apply (book_id, state) pairs in a single transaction.
+
+        Every actual change is appended to state_transitions in the same
+        transaction, tagged with source (e.g. "filter", "ml", "editor") so it
+        can be undone with revert_transitions.
+        """
+        if not changes:
+            return
+        with self._conn as conn:
+            conn.executemany(
+                f"""INSERT INTO state_transitions (book_id, from_state, to_state, source, created_at)
+                    SELECT id, state, ?, ?, {NOW_SQL} FROM books WHERE id = ? AND state != ?""",
+                [(state.value, source, book_id, state.value) for book_id, state in changes],
+            )
+            conn.executemany(
+                f"UPDATE books SET state = ?, updated_at = {NOW_SQL} WHERE id = ?",
+                [(state.value, book_id) for book_id, state in changes],
+            )
+
+    def get_transitions(
+        self,
+        since: str | None = None,
+        until: str | None = None,
+        source: str | None = None,
+        book_id: int | None = None,
+    ) -> list[sqlite3.Row]:
+        """Logged transitions, oldest first. Times are UTC "YYYY-MM-DD HH:MM[:SS]" strings."""
+        clauses, params = self._transition_filter(since, until, source)
+        if book_id is not None:
+            clauses.append("book_id = ?")
+            params.append(book_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._conn.execute(f"SELECT * FROM state_transitions {where} ORDER BY id", params).fetchall()
+
+    @staticmethod
+    def _transition_filter(since: str | None, until: str | None, source: str | None) -> tuple[list[str], list]:
+        clauses: list[str] = []
+        params: list = []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at <= ?")
+            params.append(until)
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        return clauses, params
+
+    def revert_transitions(self, since: str, until: str | None = None, source: str | None = None) -> int:
+        """Undo the transitions logged between since and until (UTC), optionally only those by source.
+
+        Each affected book goes back to the state it had before its first
+        transition in the window. Books changed again after their last
+        transition in the window are left alone. The undo is itself logged
+        with source "revert". Returns the number of books reverted.
+        """
+        clauses, params = self._transition_filter(since, until, source)
+        where = " AND ".join(clauses)
+        first_from: dict[int, str] = {}
+        last_to: dict[int, str] = {}
+        for book_id, from_state, to_state in self._conn.execute(
+            f"SELECT book_id, from_state, to_state FROM state_transitions WHERE {where} ORDER BY id", params
+        ):
+            first_from.setdefault(book_id, from_state)
+            last_to[book_id] = to_state
+        current = dict(self._conn.execute(
+            f"SELECT id, state FROM books WHERE id IN (SELECT book_id FROM state_transitions WHERE {where})",
+            params,
+        ).fetchall())
+
+        changes = []
+        for book_id, state in first_from.items():
+            if current.get(book_id) != last_to[book_id]:
+                logger.warning("Not reverting book {}: changed again since (now {})", book_id, current.get(book_id))
+            elif state is not None and state != last_to[book_id]:
+                changes.append((book_id, BookState(state)))
+        self.apply_state_changes(changes, source="revert")
+        return len(changes)
+
+    def applied_ruleset(self) -> tuple[str, dict[str, list[str]]] | None:
+        """(fingerprint, rules) of the filter rule set last applied to the stored books, if any."""
+        row = self._conn.execute(
+            "SELECT fingerprint, rules FROM filter_rulesets WHERE applied_at IS NOT NULL "
+            "ORDER BY applied_at DESC, id DESC LIMIT 1"
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    @retry_locked
+    def record_ruleset(self, fingerprint: str, rules: dict[str, list[str]]) -> None:
+        """Mark the rule set with this fingerprint as applied now (stored on first sight)."""
+        with self._conn as conn:
+            conn.execute(
+                f"""INSERT INTO filter_rulesets (fingerprint, rules, applied_at) VALUES (?, ?, {NOW_SQL})
+                    ON CONFLICT(fingerprint) DO UPDATE SET applied_at = excluded.applied_at""",
+                (fingerprint, json.dumps(rules)),
+            )
+
+    @retry_locked
+    def record_filter_stats(self, hits: dict[tuple[str, str], int], timings: dict[str, tuple[int, int]]) -> None:
+        """Add (rule, keyword) hit counts and per-rule (calls, elapsed_ns) to the stored totals."""
+        with self._conn as conn:
+            conn.executemany(
+                f"""INSERT INTO filter_rule_hits (rule, keyword, hits, last_hit_at) VALUES (?, ?, ?, {NOW_SQL})
+                    ON CONFLICT(rule, keyword) DO UPDATE SET
+                        hits = hits + excluded.hits, last_hit_at = excluded.last_hit_at""",
+                [(rule, keyword, count) for (rule, keyword), count in hits.items()],
+            )
+            conn.executemany(
+                """INSERT INTO filter_timings (rule, calls, elapsed_ns) VALUES (?, ?, ?)
+                   ON CONFLICT(rule) DO UPDATE SET
+                       calls = calls + excluded.calls, elapsed_ns = elapsed_ns + excluded.elapsed_ns""",
+                [(rule, calls, elapsed) for rule, (calls, elapsed) in timings.items()],
+            )
+
+    def filter_rule_hits(self) -> dict[tuple[str, str], tuple[int, str]]:
+        """(rule, keyword) -> (hits, last_hit_at) for every rule that has fired."""
+        return {
+            (rule, keyword): (hits, last_hit_at)
+            for rule, keyword, hits, last_hit_at in self._conn.execute(
+                "SELECT rule, keyword, hits, last_hit_at FROM filter_rule_hits")
+        }
+
+    def filter_timings(self) -> dict[str, tuple[int, int, str]]:
+        """rule -> (calls, elapsed_ns, counting since)."""
+        return {
+            rule: (calls, elapsed, since)
+            for rule, calls, elapsed, since in self._conn.execute(
+                "SELECT rule, calls, elapsed_ns, since FROM filter_timings")
+        }
+
+    def books_with_keywords(
+        self,
+        state: BookState,
+        field: str,
+        keywords: list[str],
+        sources: tuple[str, ...] | None = None,
+    ) -> list[BookRecord]:
+        """Books in state whose field (title, genre or language) may contain one of keywords.
+
+        The substring test runs in SQL as instr(lower(field), keyword). SQLite's
+        lower() only folds ASCII, so when any keyword is non-ASCII every book in
+        the state is returned; callers re-check candidates with filters.KeywordMatcher.
+        With sources, only books whose latest logged transition came from one of
+        them are returned.
+        """
+        if field not in ("title", "genre", "language") or not keywords:
+            raise ValueError(f"Cannot match keywords against {field!r}")
+        clauses, params = ["state = ?"], [state.value]
+        needles = [word.lower() for word in keywords]
+        if all(needle.isascii() for needle in needles):
+            clauses.append("(" + " OR ".join([f"instr(lower({field}), ?) > 0"] * len(needles)) + ")")
+            params.extend(needles)
+        if sources:
+            clauses.append(
+                "(SELECT source FROM state_transitions WHERE book_id = books.id ORDER BY id DESC LIMIT 1) "
+                f"IN ({', '.join('?' * len(sources))})"
+            )
+            params.extend(sources)
+        return self._books(f"SELECT {BOOK_COLUMNS} FROM books WHERE {' AND '.join(clauses)}", params).fetchall()
+
+    def iter_unscored_books(
+        self, model_version: str, states: list[BookState], batch_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[list[BookRecord]]:
+        """Batches of books in states with no score from model_version (id order, keyset paged)."""
+        placeholders = ", ".join("?" * len(states))
+        after = 0
+        while True:
+            batch = self._books(
+                f"""SELECT {BOOK_COLUMNS} FROM books
+                    WHERE state IN ({placeholders}) AND model_version IS NOT ? AND id > ?
+                    ORDER BY id LIMIT ?""",
+                (*[state.value for state in states], model_version, after, batch_size),
+            ).fetchall()
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1].id
+
+    def get_scores(self, book_ids: list[int]) -> dict[int, tuple[float, str]]:
+        """book id -> (score, model_version) for the given books that have a stored score."""
+        return {
+            book_id: (score, version)
+            for book_id, score, version in self._conn.execute(
+                """SELECT id, score, model_version FROM books
+                   WHERE id IN (SELECT value FROM json_each(?)) AND score IS NOT NULL""",
+                (json.dumps(book_ids),),
+            )
+        }
+
+    @retry_locked
+    def store_scores(self, scores: list[tuple[int, float]], model_version: str) -> None:
+        """Save (book id, score) pairs computed by model_version."""
+        with self._conn as conn:
+            conn.executemany(
+                "UPDATE books SET score = ?, model_version = ? WHERE id = ?",
+                [(score, model_version, book_id) for book_id, score in scores],
+            )
+
+    def score_stats(self, model_version: str, threshold: float) -> dict[BookState, tuple[int, int, float, float, float]]:
+        """state -> (books, books scoring >= threshold, avg, min, max) over model_version's stored scores."""
+        return {
+            _STATES[state]: (total, above, avg, low, high)
+            for state, total, above, avg, low, high in self._conn.execute(
+                """SELECT state, COUNT(*), SUM(score >= ?), AVG(score), MIN(score), MAX(score)
+                   FROM books WHERE model_version = ? GROUP BY state""",
+                (threshold, model_version),
+            )
+        }
+
+    def state_counts(self) -> dict[BookState, int]:
+        """Books per state, from the trigger-maintained state_counts table."""
+        return {
+            _STATES[state]: count
+            for state, count in self._conn.execute("SELECT state, count FROM state_counts WHERE count > 0")
+        }
 
     def get_all_books(self) -> list[BookRecord]:
         """Return all non-blacklisted books ordered by updated_at DESC."""
-        rows = self._conn.execute(
-            "SELECT * FROM books WHERE state != 'blacklisted' ORDER BY updated_at DESC"
+        return self._books(
+            f"SELECT {BOOK_COLUMNS} FROM books WHERE state != 'blacklisted' ORDER BY updated_at DESC"
+        ).fetchall()
+
+    def _book_filter(
+        self,
+        state: BookState | None = None,
+        exclude_blacklisted: bool = False,
+        query: str | None = None,
+    ) -> tuple[list[str], list]:
+        """WHERE clauses and parameters shared by the paginated queries."""
+        clauses: list[str] = []
+        params: list = []
+        if state is not None:
+            clauses.append("state = ?")
+            params.append(state.value)
+        if exclude_blacklisted:
+            clauses.append("state != 'blacklisted'")
+        if query:
+            match = fts_query(query)
+            if match and self._has_fts():
+                clauses.append("id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)")
+                params.append(match)
+            else:
+                clauses.append("(title LIKE ? OR language LIKE ? OR genre LIKE ? OR author LIKE ?)")
+                params.extend([f"%{query}%"] * 4)
+        return clauses, params
+
+    def page_books(
+        self,
+        state: BookState | None = None,
+        after: tuple[str, int] | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        exclude_blacklisted: bool = False,
+        query: str | None = None,
+    ) -> list[BookRecord]:
+        """Return up to limit books ordered by (updated_at, id) DESC, starting after the
+        (updated_at, id) key of the previous page's last record.
+
+        Keyset pagination: every page is an index range scan, however deep.
+        """
+        clauses, params = self._book_filter(state, exclude_blacklisted, query)
+        if after is not None:
+            clauses.append("(updated_at, id) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._books(
+            f"SELECT {BOOK_COLUMNS} FROM books {where} ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (*params, limit),
         ).fetchall()
-        return [self._row_to_record(row) for row in rows]
+
+    def iter_books(
+        self,
+        state: BookState | None = None,
+        batch_size: int = DEFAULT_PAGE_SIZE,
+        exclude_blacklisted: bool = False,
+        query: str | None = None,
+    ) -> Iterator[BookRecord]:
+        """Stream books page by page (see page_books) in constant memory.
+
+        Books updated while iterating move ahead of the current position and
+        are not yielded again.
+        """
+        after = None
+        while True:
+            page = self.page_books(state, after, batch_size, exclude_blacklisted, query)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = (page[-1].updated_at, page[-1].id)
+
+    def count_books(
+        self,
+        state: BookState | None = None,
+        exclude_blacklisted: bool = False,
+        query: str | None = None,
+    ) -> int:
+        if not query:
+            counts = self.state_counts()
+            if state is not None:
+                return counts.get(state, 0)
+            return sum(n for s, n in counts.items() if not (exclude_blacklisted and s == BookState.BLACKLISTED))
+        clauses, params = self._book_filter(state, exclude_blacklisted, query)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._conn.execute(f"SELECT COUNT(*) FROM books {where}", params).fetchone()[0]
+
+    def _has_fts(self) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+        ).fetchone() is not None
 
     def search_books(self, query: str) -> list[BookRecord]:
-        """Search non-blacklisted books by title, language, or genre (SQL LIKE),
-        ordered by updated_at DESC."""
+        """Search non-blacklisted books by title, language, genre or author.
+
+        Uses the FTS5 index: words match as prefixes ("pyth" finds "Python"),
+        "quoted words" match as a phrase, and results are ranked by relevance
+        (title hits first), then updated_at DESC. Falls back to a LIKE
+        substring scan when FTS5 is unavailable or the query has no words.
+        """
+        match = fts_query(query)
+        if match and self._has_fts():
+            try:
+                return self._books(
+                    f"""SELECT {BOOKS_PREFIXED} FROM books_fts
+                        JOIN books ON books.id = books_fts.rowid
+                        WHERE books_fts MATCH ? AND books.state != 'blacklisted'
+                        ORDER BY {FTS_RANK_SQL}, books.updated_at DESC""",
+                    (match,),
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                logger.debug("FTS query {!r} failed ({}), falling back to LIKE", match, e)
+        return self._search_books_like(query)
+
+    def _search_books_like(self, query: str) -> list[BookRecord]:
         like = f"%{query}%"
-        rows = self._conn.execute(
-            """SELECT * FROM books
+        return self._books(
+            f"""SELECT {BOOK_COLUMNS} FROM books
                WHERE state != 'blacklisted'
-                 AND (title LIKE ? OR language LIKE ? OR genre LIKE ?)
+                 AND (title LIKE ? OR language LIKE ? OR genre LIKE ? OR author LIKE ?)
                ORDER BY updated_at DESC""",
-            (like, like, like),
+            (like, like, like, like),
+        ).fetchall()
+
+    @retry_locked
+    def add_book_file(
+        self,
+        book_id: int,
+        path: str,
+        sha256: str,
+        size: int,
+        author: str | None = None,
+        isbn: str | None = None,
+        page_count: int | None = None,
+    ) -> None:
+        """Record a downloaded file and the metadata extracted from it."""
+        with self._conn as conn:
+            conn.execute(
+                """INSERT INTO book_files (book_id, path, sha256, size, author, isbn, page_count)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (book_id, path, sha256, size, author, isbn, page_count),
+            )
+
+    @retry_locked
+    def fill_unknown_details(
+        self,
+        book_id: int,
+        language: str | None = None,
+        genre: str | None = None,
+        author: str | None = None,
+    ) -> None:
+        """Set language/genre/author from file metadata where the listing page had none ("Unknown")."""
+        with self._conn:
+            row = self._conn.execute(
+                """UPDATE books
+                   SET language = CASE WHEN language = 'Unknown' AND ? IS NOT NULL THEN ? ELSE language END,
+                       genre = CASE WHEN genre = 'Unknown' AND ? IS NOT NULL THEN ? ELSE genre END,
+                       author = CASE WHEN author = 'Unknown' AND ? IS NOT NULL THEN ? ELSE author END
+                   WHERE id = ?
+                   RETURNING id, language, genre, author""",
+                (language, language, genre, genre, author, author, book_id),
+            ).fetchone()
+            if row is not None:
+                link_lookups(self._conn, [tuple(row)])
+
+    def get_books_by_genre(self, genre: str, state: BookState | None = None) -> list[BookRecord]:
+        """Books tagged with genre (one tag of the comma-separated genre text), via book_genres."""
+        where, params = "", [genre]
+        if state is not None:
+            where, params = "AND books.state = ?", [genre, state.value]
+        return self._books(
+            f"""SELECT {BOOKS_PREFIXED} FROM genres
+                JOIN book_genres ON book_genres.genre_id = genres.id
+                JOIN books ON books.id = book_genres.book_id
+                WHERE genres.name = ? {where}
+                ORDER BY books.updated_at DESC""",
+            params,
+        ).fetchall()
+
+    def get_books_by_author(self, author: str) -> list[BookRecord]:
+        return self._books(
+            f"""SELECT {BOOKS_PREFIXED} FROM authors
+                JOIN books ON books.author_id = authors.id
+                WHERE authors.name = ?
+                ORDER BY books.updated_at DESC""",
+            (author,),
+        ).fetchall()
+
+    def genre_counts(self, state: BookState | None = None) -> dict[str, int]:
+        """Number of books per genre tag, most common first."""
+        where, params = "", []
+        if state is not None:
+            where, params = "WHERE books.state = ?", [state.value]
+        rows = self._conn.execute(
+            f"""SELECT genres.name, COUNT(*) FROM book_genres
+                JOIN genres ON genres.id = book_genres.genre_id
+                JOIN books ON books.id = book_genres.book_id
+                {where}
+                GROUP BY genres.id ORDER BY COUNT(*) DESC, genres.name""",
+            params,
         ).fetchall()
-        return [self._row_to_record(row) for row in rows]
+        return {name: count for name, count in rows}
+
+    def load_mirror_stats(self) -> dict[str, ServerStats]:
+        rows = self._conn.execute("SELECT * FROM mirror_stats").fetchall()
+        return {
+            row["server_id"]: ServerStats(
+                attempts=row["attempts"],
+                successes=row["successes"],
+                consecutive_failures=row["consecutive_failures"],
+                success_rate=row["success_rate"],
+                latency_s=row["latency_s"],
+                throughput_bps=row["throughput_bps"],
+                open_until=row["open_until"],
+            )
+            for row in rows
+        }
+
+    @retry_locked
+    def save_mirror_stats(self, stats: dict[str, ServerStats]) -> None:
+        with self._conn as conn:
+            conn.executemany(
+                """INSERT INTO mirror_stats (server_id, attempts, successes, consecutive_failures,
+                                             success_rate, latency_s, throughput_bps, open_until)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(server_id) DO UPDATE SET
+                       attempts = excluded.attempts,
+                       successes = excluded.successes,
+                       consecutive_failures = excluded.consecutive_failures,
+                       success_rate = excluded.success_rate,
+                       latency_s = excluded.latency_s,
+                       throughput_bps = excluded.throughput_bps,
+                       open_until = excluded.open_until,
+                       updated_at = datetime('now')""",
+                [
+                    (server_id, s.attempts, s.successes, s.consecutive_failures,
+                     s.success_rate, s.latency_s, s.throughput_bps, s.open_until)
+                    for server_id, s in stats.items()
+                ],
+            )
+
+    def get_expected_sizes(self) -> dict[str, float]:
+        """Average downloaded bytes per book, keyed by genre ("" for the overall average)."""
+        rows = self._conn.execute(
+            """SELECT b.genre AS genre, AVG(f.total) AS avg_size
+               FROM (SELECT book_id, SUM(size) AS total FROM book_files GROUP BY book_id) f
+               JOIN books b ON b.id = f.book_id
+               GROUP BY b.genre"""
+        ).fetchall()
+        sizes = {row["genre"]: row["avg_size"] for row in rows}
+        overall = self._conn.execute(
+            "SELECT AVG(total) FROM (SELECT SUM(size) AS total FROM book_files GROUP BY book_id)"
+        ).fetchone()[0]
+        if overall is not None:
+            sizes[""] = overall
+        return sizes
+
+    @retry_locked
+    def record_format_decisions(self, book_id: int, decisions: list[FormatDecision]) -> None:
+        """Store what was done with each of a book's formats; a later fetch overwrites earlier rows."""
+        with self._conn as conn:
+            conn.executemany(
+                """INSERT INTO format_decisions (book_id, filename, format, decision, reason, size)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(book_id, filename) DO UPDATE SET
+                       decision = excluded.decision,
+                       reason = excluded.reason,
+                       size = COALESCE(excluded.size, format_decisions.size),
+                       updated_at = datetime('now')""",
+                [(book_id, d.filename, d.fmt, d.decision, d.reason, d.size) for d in decisions],
+            )
+
+    def get_known_file_sizes(self, book_id: int) -> dict[str, int]:
+        """Sizes of a book's files seen in earlier runs, keyed by server filename."""
+        rows = self._conn.execute(
+            "SELECT filename, size FROM format_decisions WHERE book_id = ? AND size IS NOT NULL",
+            (book_id,),
+        ).fetchall()
+        return {row["filename"]: row["size"] for row in rows}
+
+    def get_books_missing_format(self, fmt: str) -> list[BookRecord]:
+        """DONE books that offer fmt but have not had it fetched yet."""
+        return self._books(
+            f"""SELECT {BOOK_COLUMNS} FROM books
+               WHERE state = 'done'
+                 AND id IN (SELECT book_id FROM format_decisions WHERE format = ? AND decision != ?)
+                 AND id NOT IN (SELECT book_id FROM format_decisions WHERE format = ? AND decision = ?)""",
+            (fmt, FETCHED, fmt, FETCHED),
+        ).fetchall()
+
+
+class BatchWriter:
+    """Background thread that commits queued state and mirror-stat updates in batches.
+
+    update_state()/save_mirror_stats() return immediately; updates are grouped
+    into one commit of up to max_batch updates, or whatever arrived within
+    max_delay seconds of the first. State changes go through
+    apply_state_changes, so they are logged in state_transitions like any
+    other. flush() blocks until everything queued so far is committed and
+    re-raises the first error a batch hit.
+    """
+
+    def __init__(self, repo: BookRepository, max_batch: int = 500, max_delay: float = 0.5) -> None:
+        self.repo = repo
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Exception | None = None
+        self._thread = threading.Thread(target=self._run, name="BatchWriter", daemon=True)
+        self._thread.start()
+
+    def update_state(self, book_id: int, state: BookState, source: str = "") -> None:
+        self._queue.put(("state", (book_id, state, source)))
+
+    def save_mirror_stats(self, stats: dict[str, ServerStats]) -> None:
+        self._queue.put(("mirror_stats", dict(stats)))
+
+    def flush(self) -> None:
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self) -> None:
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: list[tuple[str, object]] = []
+            waiters: list[threading.Event] = []
+            stop = False
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    logger.error("Batch of {} update(s) failed: {}", len(batch), e)
+                    self._error = self._error or e
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _commit(self, batch: list[tuple[str, object]]) -> None:
+        # Consecutive changes from the same source share one transaction; runs
+        # are applied in queue order so a book changed twice ends in its last state.
+        changes: list[tuple[int, BookState]] = []
+        source = None
+        stats: dict[str, ServerStats] | None = None
+        for kind, payload in batch:
+            if kind == "mirror_stats":
+                stats = payload
+                continue
+            book_id, state, change_source = payload
+            if change_source != source and changes:
+                self.repo.apply_state_changes(changes, source)
+                changes = []
+            source = change_source
+            changes.append((book_id, state))
+        self.repo.apply_state_changes(changes, source or "")
+        if stats is not None:
+            self.repo.save_mirror_stats(stats)
@@ -0,0 +1,122 @@
+import datetime
+import shutil
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable
+
+from loguru import logger
+
+from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.models import BookRecord
+
+
+class Priority(IntEnum):
+    """Why a book was scheduled; lower values download first."""
+    SELECTED = 0
+    AUTOSELECT = 1
+    ML = 2
+
+
+def parse_deadline(value: str, now: datetime.datetime | None = None) -> float | None:
+    """Turn "HH:MM" into the epoch time of its next occurrence (today or tomorrow)."""
+    if not value:
+        return None
+    now = now or datetime.datetime.now()
+    hour, minute = (int(part) for part in value.split(":", 1))
+    deadline = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if deadline <= now:
+        deadline += datetime.timedelta(days=1)
+    return deadline.timestamp()
+
+
+@dataclass
+class DownloadBudget:
+    """Limits for one download run; 0 / None means unlimited."""
+    max_books: int = 0
+    max_bytes: int = 0
+    min_free_bytes: int = 0
+    deadline: float | None = None
+
+    @classmethod
+    def from_config(cls, config: Config) -> "DownloadBudget":
+        return cls(
+            max_books=config.max_books_per_run,
+            max_bytes=config.max_mb_per_run * 1024 * 1024,
+            min_free_bytes=config.min_free_disk_mb * 1024 * 1024,
+            deadline=parse_deadline(config.run_deadline),
+        )
+
+
+class DownloadScheduler:
+    """Orders scheduled books by priority and stops the run when a budget runs out.
+
+    Books are ordered by Priority, then ML score (highest first), then
+    expected size (smallest first, so more books fit a byte budget). Expected
+    sizes are per-genre averages of earlier downloads. When stop_reason()
+    returns a reason the caller stops; books not reached stay SCHEDULED.
+    """
+
+    def __init__(
+        self,
+        budget: DownloadBudget,
+        download_dir: str,
+        expected_sizes: dict[str, float] | None = None,
+        clock: Callable[[], float] = time.time,
+        disk_usage: Callable = shutil.disk_usage,
+    ) -> None:
+        self.budget = budget
+        self.download_dir = download_dir
+        self.expected_sizes = expected_sizes or {}
+        self._clock = clock
+        self._disk_usage = disk_usage
+        self._priorities: dict[int, Priority] = {}
+        self._scores: dict[int, float] = {}
+
+    def prioritise(self, records: list[BookRecord], priority: Priority, scores: dict[int, float] | None = None) -> None:
+        """Register why records were scheduled; the first (highest) priority given wins."""
+        for record in records:
+            current = self._priorities.get(record.id)
+            if current is None or priority < current:
+                self._priorities[record.id] = priority
+        if scores:
+            self._scores.update(scores)
+
+    def expected_size(self, record: BookRecord) -> float | None:
+        return self.expected_sizes.get(record.genre, self.expected_sizes.get(""))
+
+    def order(self, records: list[BookRecord]) -> list[BookRecord]:
+        def key(record: BookRecord):
+            size = self.expected_size(record)
+            return (
+                self._priorities.get(record.id, Priority.SELECTED),
+                -self._scores.get(record.id, 0.0),
+                size if size is not None else float("inf"),
+            )
+        return sorted(records, key=key)
+
+    def stop_reason(self, books_done: int, bytes_done: int, next_record: BookRecord | None = None) -> str | None:
+        """Return why the run must stop before the next book, or None to continue."""
+        budget = self.budget
+        if budget.max_books and books_done >= budget.max_books:
+            return f"book limit of {budget.max_books} reached"
+        if budget.max_bytes:
+            expected = (self.expected_size(next_record) or 0) if next_record else 0
+            if bytes_done >= budget.max_bytes or bytes_done + expected > budget.max_bytes:
+                return f"byte budget of {budget.max_bytes / 1024 / 1024:.0f} MB exhausted"
+        if budget.min_free_bytes:
+            free = self._disk_usage(self.download_dir).free
+            if free < budget.min_free_bytes:
+                return f"free disk space below {budget.min_free_bytes / 1024 / 1024:.0f} MB"
+        if budget.deadline is not None and self._clock() >= budget.deadline:
+            return "run deadline reached"
+        return None
+
+    def log_plan(self, records: list[BookRecord]) -> None:
+        counts = {p: 0 for p in Priority}
+        for record in records:
+            counts[self._priorities.get(record.id, Priority.SELECTED)] += 1
+        logger.info(
+            "Download order: {} selected, {} rule-autoselected, {} ML-selected",
+            counts[Priority.SELECTED], counts[Priority.AUTOSELECT], counts[Priority.ML],
+        )
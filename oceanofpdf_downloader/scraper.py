@@ -7,6 +7,7 @@ from oceanofpdf_downloader.browser import BrowserSession
 from oceanofpdf_downloader.config import Config
 from oceanofpdf_downloader.models import Book
 from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.url_filter import KnownUrlFilter
 
 
 def parse_books_from_html(html: str) -> list[Book]:
@@ -14,8 +15,8 @@ def parse_books_from_html(html: str) -> list[Book]:
 
     Extracts books from <article> elements containing <header class="entry-header">.
     Title and URL come from a.entry-title-link.
-    Language and genre come from <strong>Language: </strong> and <strong>Genre: </strong>
-    tags in the article's content.
+    Author, language and genre come from <strong>Author: </strong>, <strong>Language: </strong>
+    and <strong>Genre: </strong> tags in the article's postmetainfo block.
     """
     books: list[Book] = []
 
@@ -58,11 +59,18 @@ def parse_books_from_html(html: str) -> list[Book]:
         )
         genre = genre_match.group(1).strip() if genre_match else "Unknown"
 
+        # Extract author
+        author_match = re.search(
+            r'<strong>\s*Author:\s*</strong>\s*([^<]+)', article_html
+        )
+        author = author_match.group(1).strip() if author_match else "Unknown"
+
         books.append(Book(
             title=title,
             detail_url=detail_url,
             language=language,
             genre=genre,
+            author=author,
         ))
 
     return books
@@ -89,6 +97,16 @@ def parse_new_releases_from_html(html: str) -> list[Book]:
     return books
 
 
+def is_known(url: str, repo: BookRepository, known: KnownUrlFilter | None = None) -> bool:
+    """Whether url is in the database, asking SQLite only when a Bloom filter says maybe."""
+    if known is not None:
+        if not known.might_contain(url):
+            return False
+        if not known.bloom:
+            return True
+    return repo.get_by_url(url) is not None
+
+
 class BookScraper:
     """Scrapes book listings from oceanofpdf.com using a shared BrowserSession."""
 
@@ -121,11 +139,17 @@ class BookScraper:
         finally:
             page.close()
 
-    def scrape_all_pages(self, repo: BookRepository | None = None, live_display=None) -> list[Book]:
+    def scrape_all_pages(
+        self,
+        repo: BookRepository | None = None,
+        live_display=None,
+        known: KnownUrlFilter | None = None,
+    ) -> list[Book]:
         """Scrape all listing pages up to max_pages.
 
         If a repository is provided, stops early when duplicates (books already
-        in the database) are found on at least 2 different pages.
+        in the database) are found on at least 2 different pages. With a
+        known-URL filter, only URLs it may contain are looked up in the database.
         """
         all_books: list[Book] = []
         pages_with_duplicates = 0
@@ -139,7 +163,7 @@ class BookScraper:
             books = self.scrape_listing_page(page_num)
             all_books.extend(books)
 
-            if repo and any(repo.get_by_url(b.detail_url) for b in books):
+            if repo and any(is_known(b.detail_url, repo, known) for b in books):
                 pages_with_duplicates += 1
                 if pages_with_duplicates >= 2:
                     logger.info("Duplicates found on {} pages, stopping early", pages_with_duplicates)
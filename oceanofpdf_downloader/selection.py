@@ -1,3 +1,5 @@
+from typing import Callable
+
 from loguru import logger
 from rich.console import Console
 from rich.panel import Panel
@@ -9,6 +11,10 @@ from oceanofpdf_downloader.repository import BookRepository
 
 PAGE_SIZE = 15
 
+# Receives each page's decisions as (record, 1 = wanted / 0 = not wanted),
+# e.g. MLSelector.update for online learning
+Learner = Callable[[list[tuple[BookRecord, int]]], None]
+
 
 def parse_selection(input_str: str, max_index: int) -> set[int]:
     """Parse user input into a set of 1-based indices.
@@ -58,6 +64,7 @@ def _select_page(
     total_pages: int,
     repo: BookRepository,
     console: Console,
+    learn: Learner | None = None,
 ) -> list[BookRecord] | None:
     """Display one page of books and prompt for selection.
 
@@ -76,9 +83,10 @@ def _select_page(
     indices = set() if quit_requested else parse_selection(answer, len(page_records))
 
     scheduled: list[BookRecord] = []
+    changes: list[tuple[int, BookState]] = []
     for i, record in enumerate(page_records, 1):
         if i in indices:
-            repo.update_state(record.id, BookState.SCHEDULED)
+            changes.append((record.id, BookState.SCHEDULED))
             scheduled.append(BookRecord(
                 id=record.id,
                 title=record.title,
@@ -88,9 +96,14 @@ def _select_page(
                 state=BookState.SCHEDULED,
                 created_at=record.created_at,
                 updated_at=record.updated_at,
+                author=record.author,
             ))
         elif record.state == BookState.NEW:
-            repo.update_state(record.id, BookState.SKIPPED)
+            changes.append((record.id, BookState.SKIPPED))
+    repo.apply_state_changes(changes, source="selection")
+    if learn and not quit_requested:
+        learn([(record, int(i in indices)) for i, record in enumerate(page_records, 1)
+               if i in indices or record.state == BookState.NEW])
 
     return None if quit_requested else scheduled
 
@@ -102,6 +115,7 @@ def _review_ml_page(
     total_records: int,
     repo: BookRepository,
     console: Console,
+    learn: Learner | None = None,
 ) -> list[BookRecord]:
     """Display one page of ML-selected books and prompt for books to skip or blacklist.
 
@@ -136,11 +150,11 @@ def _review_ml_page(
             console=console,
         )
         if confirmed:
-            for i, record in enumerate(page_records, 1):
-                if i in to_skip:
-                    repo.update_state(record.id, BookState.SKIPPED)
-                    logger.info("Skipped after ML review: {}", record.title)
-                    removed.append(record)
+            skipped = [record for i, record in enumerate(page_records, 1) if i in to_skip]
+            repo.update_states([record.id for record in skipped], BookState.SKIPPED, source="ml-review")
+            for record in skipped:
+                logger.info("Skipped after ML review: {}", record.title)
+            removed.extend(skipped)
 
     # --- Blacklist prompt ---
     already_removed = {r.id for r in removed}
@@ -160,12 +174,15 @@ def _review_ml_page(
             console=console,
         )
         if confirmed:
-            for i, record in enumerate(page_records, 1):
-                if i in to_blacklist:
-                    repo.update_state(record.id, BookState.BLACKLISTED)
-                    logger.info("Blacklisted after ML review: {}", record.title)
-                    removed.append(record)
-
+            blacklisted = [record for i, record in enumerate(page_records, 1) if i in to_blacklist]
+            repo.update_states([record.id for record in blacklisted], BookState.BLACKLISTED, source="ml-review")
+            for record in blacklisted:
+                logger.info("Blacklisted after ML review: {}", record.title)
+            removed.extend(blacklisted)
+
+    if learn:
+        removed_ids = {r.id for r in removed}
+        learn([(record, int(record.id not in removed_ids)) for record in page_records])
     return removed
 
 
@@ -173,10 +190,12 @@ def review_ml_selected(
     records: list[BookRecord],
     repo: BookRepository,
     console: Console,
+    learn: Learner | None = None,
 ) -> list[BookRecord]:
     """Show ML-selected books paged and let the user blacklist unwanted ones by number.
 
-    Returns the records that remain SCHEDULED.
+    Returns the records that remain SCHEDULED. With learn, each page's kept
+    (1) and removed (0) books are passed to it.
     """
     total_pages = (len(records) + PAGE_SIZE - 1) // PAGE_SIZE
     removed_ids: set[int] = set()
@@ -184,7 +203,7 @@ def review_ml_selected(
     for page_num in range(1, total_pages + 1):
         start = (page_num - 1) * PAGE_SIZE
         page_records = records[start:start + PAGE_SIZE]
-        for r in _review_ml_page(page_records, page_num, total_pages, len(records), repo, console):
+        for r in _review_ml_page(page_records, page_num, total_pages, len(records), repo, console, learn):
             removed_ids.add(r.id)
 
     return [r for r in records if r.id not in removed_ids]
@@ -194,8 +213,12 @@ def select_books(
     records: list[BookRecord],
     repo: BookRepository,
     console: Console | None = None,
+    learn: Learner | None = None,
 ) -> list[BookRecord]:
-    """Prompt user to select NEW books for download, paged. Returns SCHEDULED records."""
+    """Prompt user to select NEW books for download, paged. Returns SCHEDULED records.
+
+    With learn, each answered page's selected (1) and skipped (0) books are passed to it.
+    """
     if console is None:
         console = Console()
 
@@ -211,7 +234,7 @@ def select_books(
         end = start + PAGE_SIZE
         page_records = records[start:end]
 
-        scheduled = _select_page(page_records, page_num, total_pages, repo, console)
+        scheduled = _select_page(page_records, page_num, total_pages, repo, console, learn)
         if scheduled is None:
             break
         all_scheduled.extend(scheduled)
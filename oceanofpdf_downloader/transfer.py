@@ -0,0 +1,208 @@
+import csv
+import gzip
+import json
+import os
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from loguru import logger
+
+from oceanofpdf_downloader.repository import EXPORT_FIELDS, BookRepository
+
+# Rows per read/write batch and per import transaction; memory stays flat at any DB size.
+BATCH_SIZE = 10_000
+
+FIELDS = (*EXPORT_FIELDS, "archived")
+
+
+# Full suffix -> (format, gzip-compressed); Parquet compresses internally, so no .parquet.gz
+SUFFIXES = {
+    ".jsonl": ("jsonl", False), ".jsonl.gz": ("jsonl", True),
+    ".ndjson": ("jsonl", False), ".ndjson.gz": ("jsonl", True),
+    ".csv": ("csv", False), ".csv.gz": ("csv", True),
+    ".parquet": ("parquet", False),
+}
+
+
+def _split_suffix(path: str) -> tuple[str, str, bool]:
+    """(path without its suffix, format, gzip-compressed), from the full suffix of path."""
+    name = path.lower()
+    for suffix in sorted(SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return path[: -len(suffix)], *SUFFIXES[suffix]
+    if name.endswith(".parquet.gz"):
+        raise ValueError(f"Cannot write or read {path!r}: Parquet is compressed internally, drop the .gz")
+    raise ValueError(f"Unknown export format for {path!r}: use .jsonl, .csv or .parquet (.gz for the text formats)")
+
+
+def file_format(path: str) -> str:
+    """"jsonl", "csv" or "parquet", from the full suffix (.gz is allowed for the text formats)."""
+    return _split_suffix(path)[1]
+
+
+def _have_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _open_text(path: str, mode: str, gz: bool) -> IO[str]:
+    if gz:
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+# --- export ---
+
+def export_books(repo: BookRepository, path: str) -> tuple[str, int]:
+    """Stream every book (hot and archived) to path. Returns (path written, row count).
+
+    Parquet needs pyarrow; without it the export falls back to CSV next to path.
+    """
+    stem, fmt, gz = _split_suffix(path)
+    if fmt == "parquet" and not _have_pyarrow():
+        path = stem + ".csv"
+        fmt = "csv"
+        logger.warning("pyarrow is not installed — exporting CSV to {} instead", path)
+
+    tmp = f"{path}.tmp"
+    writer = {"jsonl": _write_jsonl, "csv": _write_csv, "parquet": _write_parquet}[fmt]
+    count = writer(repo.iter_export_rows(BATCH_SIZE), tmp, gz)
+    os.replace(tmp, path)
+    logger.info("Exported {} book(s) to {}", count, path)
+    return path, count
+
+
+def _write_jsonl(rows: Iterable[dict], path: str, gz: bool = False) -> int:
+    count = 0
+    with _open_text(path, "w", gz) as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def _write_csv(rows: Iterable[dict], path: str, gz: bool = False) -> int:
+    count = 0
+    with _open_text(path, "w", gz) as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for batch in _batches(rows, BATCH_SIZE):
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def _write_parquet(rows: Iterable[dict], path: str, gz: bool = False) -> int:
+    # gz is always False here: _split_suffix rejects .parquet.gz
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.string()) for name in EXPORT_FIELDS] + [("archived", pa.bool_())])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in _batches(rows, BATCH_SIZE):
+            for row in batch:
+                row["archived"] = bool(row["archived"])
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+# --- import ---
+
+def _read_jsonl(path: str) -> Iterator[dict]:
+    with _open_text(path, "r", _split_suffix(path)[2]) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_csv(path: str) -> Iterator[dict]:
+    with _open_text(path, "r", _split_suffix(path)[2]) as f:
+        yield from csv.DictReader(f)
+
+
+def _read_parquet(path: str) -> Iterator[dict]:
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    columns = [name for name in FIELDS if name in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=BATCH_SIZE, columns=columns):
+        yield from batch.to_pylist()
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    fmt = file_format(path)
+    if fmt == "parquet" and not _have_pyarrow():
+        raise RuntimeError("Reading Parquet needs pyarrow (pip install pyarrow)")
+    return {"jsonl": _read_jsonl, "csv": _read_csv, "parquet": _read_parquet}[fmt](path)
+
+
+def _progress_path(path: str) -> str:
+    return f"{path}.import-progress"
+
+
+def _source_identity(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _read_progress(path: str) -> int:
+    """Rows already imported from path, or 0 if there is no progress for this version of the file."""
+    try:
+        with open(_progress_path(path)) as f:
+            progress = json.load(f)
+        rows_done = int(progress["rows"])
+    except (OSError, ValueError, TypeError, KeyError):
+        return 0
+    if {key: progress.get(key) for key in ("size", "mtime_ns")} != _source_identity(path):
+        logger.info("{} changed since the interrupted import — starting over", path)
+        return 0
+    return rows_done
+
+
+def _write_progress(path: str, rows_done: int) -> None:
+    progress = _progress_path(path)
+    with open(f"{progress}.tmp", "w") as f:
+        json.dump({**_source_identity(path), "rows": rows_done}, f)
+    os.replace(f"{progress}.tmp", progress)
+
+
+def import_books(repo: BookRepository, path: str, batch_size: int = BATCH_SIZE) -> int:
+    """Upsert every row of an export file through BookRepository.upsert_rows.
+
+    Each batch commits on its own and the number of rows done is recorded in
+    <path>.import-progress together with the file's size and mtime, so an
+    interrupted import of the same file resumes after the last committed
+    batch (re-applying a batch is harmless). Rows exported as archived are
+    imported into the archive. Returns the number of books inserted or
+    updated by this call.
+    """
+    done = _read_progress(path)
+    if done:
+        logger.info("Resuming import of {} after row {}", path, done)
+    rows = islice(read_rows(path), done, None)
+    written = 0
+    for batch in _batches(rows, batch_size):
+        for row in batch:
+            for field in ("language", "genre", "author"):
+                row[field] = row.get(field) or "Unknown"
+            # 1 in JSONL, "1" in CSV, True in Parquet
+            row["archived"] = str(row.get("archived", "")).lower() in ("1", "true")
+        written += repo.upsert_rows(batch)
+        done += len(batch)
+        _write_progress(path, done)
+    if os.path.exists(_progress_path(path)):
+        os.remove(_progress_path(path))
+    logger.info("Imported {}: {} row(s) read, {} book(s) inserted or updated", path, done, written)
+    return written
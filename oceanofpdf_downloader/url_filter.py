@@ -0,0 +1,129 @@
+import math
+import os
+import struct
+from array import array
+from typing import Iterable
+
+from loguru import logger
+
+from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.utils import url_key
+
+# Up to this many URLs are kept as an exact set of url_keys (~70 bytes each);
+# larger histories use a Bloom filter (~1.2 bytes each at 1% false positives).
+DEFAULT_BLOOM_THRESHOLD = 500_000
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+_MAGIC = b"KURL"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sBBxxqqqqq")  # magic, version, kind, k, m, fingerprint (3)
+_EXACT, _BLOOM = 0, 1
+_MASK64 = (1 << 64) - 1
+
+
+class KnownUrlFilter:
+    """In-memory "seen this detail URL before?" check, keyed by utils.url_key.
+
+    Exact mode holds the keys in a set. Bloom mode answers "maybe" for every
+    known URL and, rarely (false_positive_rate), for an unknown one, so a
+    positive answer must be confirmed with BookRepository.get_by_url; a
+    negative answer is always right. Rebuild with from_repository, or
+    save/load a snapshot that is discarded when the database has changed.
+    """
+
+    def __init__(self, expected: int = 0, bloom: bool = False,
+                 false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> None:
+        self.bloom = bloom
+        self._keys: set[int] = set()
+        self._bits = bytearray()
+        self._m = self._k = 0
+        if bloom:
+            n = max(expected, 1)
+            self._m = max(8, math.ceil(-n * math.log(false_positive_rate) / math.log(2) ** 2))
+            self._k = max(1, round(self._m / n * math.log(2)))
+            self._bits = bytearray((self._m + 7) // 8)
+
+    @classmethod
+    def from_repository(cls, repo: BookRepository, bloom_threshold: int = DEFAULT_BLOOM_THRESHOLD,
+                        false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> "KnownUrlFilter":
+        """Build a filter from every url_key in the hot and archive tables."""
+        count = repo.count_url_keys()
+        known = cls(count, bloom=count > bloom_threshold, false_positive_rate=false_positive_rate)
+        known.add_keys(repo.iter_url_keys())
+        logger.info("Loaded {} known URL(s) into a {} filter", count, "Bloom" if known.bloom else "set")
+        return known
+
+    def _positions(self, key: int) -> Iterable[int]:
+        # Double hashing: k positions from the two halves of the 64-bit key
+        key &= _MASK64
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        return ((h1 + i * h2) % self._m for i in range(self._k))
+
+    def add_keys(self, keys: Iterable[int]) -> None:
+        if not self.bloom:
+            self._keys.update(keys)
+            return
+        bits = self._bits
+        for key in keys:
+            for pos in self._positions(key):
+                bits[pos >> 3] |= 1 << (pos & 7)
+
+    def add(self, url: str) -> None:
+        self.add_keys([url_key(url)])
+
+    def might_contain(self, url: str) -> bool:
+        key = url_key(url)
+        if not self.bloom:
+            return key in self._keys
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    __contains__ = might_contain
+
+    def save(self, path: str, fingerprint: tuple[int, int, int]) -> None:
+        """Write the filter to path atomically, tagged with the repository fingerprint."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            kind = _BLOOM if self.bloom else _EXACT
+            f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, kind, self._k, self._m, *fingerprint))
+            if self.bloom:
+                f.write(self._bits)
+            else:
+                array("q", sorted(self._keys)).tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: tuple[int, int, int]) -> "KnownUrlFilter | None":
+        """Read a saved filter; None if missing, unreadable or saved for a different database state."""
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                magic, version, kind, k, m, *saved = _HEADER.unpack(header)
+                if magic != _MAGIC or version != _FORMAT_VERSION or tuple(saved) != tuple(fingerprint):
+                    return None
+                body = f.read()
+        except (OSError, struct.error):
+            return None
+        known = cls()
+        if kind == _BLOOM:
+            known.bloom, known._k, known._m, known._bits = True, k, m, bytearray(body)
+        else:
+            keys = array("q")
+            keys.frombytes(body)
+            known._keys = set(keys)
+        return known
+
+    @classmethod
+    def open(cls, repo: BookRepository, path: str | None = None,
+             bloom_threshold: int = DEFAULT_BLOOM_THRESHOLD) -> "KnownUrlFilter":
+        """Load the snapshot at path if it matches the database, else rebuild (and save) it."""
+        fingerprint = repo.url_key_fingerprint()
+        if path:
+            known = cls.load(path, fingerprint)
+            if known is not None:
+                return known
+        known = cls.from_repository(repo, bloom_threshold)
+        if path:
+            known.save(path, fingerprint)
+        return known
@@ -1,3 +1,52 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
 def rename_file(filename: str) -> str:
     """Rename a downloaded file by stripping the _OceanofPDF.com_ prefix."""
     return filename.replace("_OceanofPDF.com_", "")
+
+
+def split_genres(genre: str) -> list[str]:
+    """Split a listing's genre text ("Historical Fiction, Romance") into distinct tags."""
+    tags: list[str] = []
+    for tag in genre.split(","):
+        tag = tag.strip()
+        if tag and tag != "Unknown" and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+# Query parameters that only track where a link came from; utm_* is matched by prefix
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "ref", "ref_src",
+})
+
+
+def _is_tracking(param: str) -> bool:
+    param = param.lower()
+    return param.startswith("utm") or param in TRACKING_PARAMS
+
+
+def canonical_url(url: str) -> str:
+    """Normalise a book URL so links to the same page compare equal.
+
+    Scheme and "www." are dropped, host and path lower-cased, tracking
+    parameters (utm_*, fbclid, ref, ...), fragment, repeated and trailing
+    slashes removed; the remaining query parameters are kept, sorted:
+    "http://www.OceanofPDF.com/authors/x/book/?ref=1&p=2" -> "oceanofpdf.com/authors/x/book?p=2".
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    path = "/".join(segment for segment in parts.path.lower().split("/") if segment)
+    query = urlencode(sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(name)
+    ))
+    canonical = f"{host}/{path}" if path else host
+    return f"{canonical}?{query}" if query else canonical
+
+
+def url_key(url: str) -> int:
+    """64-bit signed hash of canonical_url(url), for the books.url_key unique index."""
+    digest = hashlib.blake2b(canonical_url(url).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
@@ -0,0 +1,48 @@
+from oceanofpdf_downloader.dedupe import NearDuplicateIndex, find_duplicates, minhash, normalise_title, similarity
+from oceanofpdf_downloader.models import BookRecord, BookState
+
+
+def make_record(id: int, title: str, author: str = "Unknown") -> BookRecord:
+    return BookRecord(id=id, title=title, detail_url=f"https://x/{id}", language="English", genre="Fiction",
+                      state=BookState.SCHEDULED, created_at="", updated_at="", author=author)
+
+
+def test_normalise_title_strips_decoration_and_byline():
+    assert normalise_title("[PDF] [EPUB] Book One Download", "Jane Doe") == "book one jane doe"
+    assert normalise_title("Book One by Jane Doe") == "book one jane doe"
+    assert normalise_title("Bóok Óne!", "Jane Doe") == "book one jane doe"
+
+
+def test_similarity_estimates_jaccard():
+    assert similarity(minhash("book one jane doe"), minhash("book one jane doe")) == 1.0
+    assert similarity(minhash("book one jane doe"), minhash("a different title entirely")) < 0.2
+
+
+def test_index_finds_near_duplicates_only():
+    index = NearDuplicateIndex(threshold=0.7)
+    index.add(1, "the silent patient alex michaelides")
+    index.add(2, "the midnight library matt haig")
+    assert [key for key, _ in index.query("the silent patient a novel alex michaelides")] == [1]
+    assert index.query("project hail mary andy weir") == []
+
+
+def test_find_duplicates_against_library_and_batch():
+    library = [make_record(1, "Book One", "Jane Doe")]
+    candidates = [
+        make_record(2, "Book One by Jane Doe"),
+        make_record(3, "Another Story", "John Roe"),
+        make_record(4, "[PDF] [EPUB] Another Story Download", "John Roe"),
+    ]
+    duplicates = find_duplicates(candidates, library)
+    assert {k: v.id for k, v in duplicates.items()} == {2: 1, 4: 3}
+
+
+def test_series_volumes_are_not_duplicates():
+    library = [make_record(1, "Reaper Academy Book 1"), make_record(2, "The Complete Collection Volume 1")]
+    candidates = [
+        make_record(3, "Reaper Academy Book 2"),
+        make_record(4, "The Complete Collection Volume 2"),
+        make_record(5, "[PDF] [EPUB] Reaper Academy Book 1 Download"),
+    ]
+    duplicates = find_duplicates(candidates, library)
+    assert {k: v.id for k, v in duplicates.items()} == {5: 1}
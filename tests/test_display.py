@@ -2,7 +2,13 @@ from io import StringIO
 
 from rich.console import Console
 
-from oceanofpdf_downloader.display import display_book_records, display_books
+from oceanofpdf_downloader.display import (
+    display_book_records,
+    display_books,
+    display_filter_report,
+    display_rule_changes,
+)
+from oceanofpdf_downloader.filters import RuleChange, RuleReport, RuleTiming
 from oceanofpdf_downloader.models import Book, BookRecord, BookState
 
 
@@ -46,3 +52,37 @@ def test_display_book_records_empty():
     display_book_records([], console=console)
     output = console.file.getvalue()
     assert "No books found" in output
+
+
+def test_display_rule_changes_output():
+    record = BookRecord(id=1, title="Dark Romance", detail_url="http://a.com", language="English",
+                        genre="Fiction", state=BookState.NEW, created_at="", updated_at="")
+    console = Console(file=StringIO(), width=120)
+    display_rule_changes([RuleChange(record, BookState.BLACKLISTED, "title matches 'romance'")], console=console)
+    output = console.file.getvalue()
+    assert "Dark Romance" in output
+    assert "new" in output
+    assert "blacklisted" in output
+    assert "title matches 'romance'" in output
+
+
+def test_display_filter_report_output():
+    report = RuleReport(
+        since="2026-01-01 00:00:00.000",
+        hits={("title_blacklist", "romance"): (3, "2026-02-01 10:00:00.000")},
+        dead=[("title_blacklist", "vampire")],
+        shadowed=[("title_blacklist", "dark romance", "title_blacklist", "romance")],
+        timings=[RuleTiming("title_blacklist", 3, 10, 25_000)],
+    )
+    console = Console(file=StringIO(), width=120)
+    display_filter_report(report, console=console)
+    output = console.file.getvalue()
+    assert "vampire" in output
+    assert "dark romance" in output
+    assert "2.5" in output
+
+
+def test_display_filter_report_empty():
+    console = Console(file=StringIO(), width=120)
+    display_filter_report(RuleReport(None, {}, [], [], []), console=console)
+    assert "No filter statistics" in console.file.getvalue()
@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from oceanofpdf_downloader.download_watchdog import DownloadProgress, DownloadStalledError, DownloadWatchdog
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.on_sleep = None
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.on_sleep:
+            self.on_sleep(self.now)
+
+
+def _make_watchdog(tmp_path, clock, start_ms=1000, stall_ms=2000):
+    return DownloadWatchdog(
+        str(tmp_path), start_timeout_ms=start_ms, stall_timeout_ms=stall_ms,
+        poll_interval_ms=100, use_inotify=False, clock=clock, sleep=clock.sleep,
+    )
+
+
+def test_returns_immediately_when_file_completes(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock)
+    watchdog.snapshot()
+    (tmp_path / "Book.pdf").write_bytes(b"x" * 10)
+    assert watchdog.wait("Book.pdf") == os.path.join(str(tmp_path), "Book.pdf")
+    assert clock.now == 0.0
+
+
+def test_raises_when_download_never_starts(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock, start_ms=1000)
+    watchdog.snapshot()
+    with pytest.raises(DownloadStalledError, match="did not start"):
+        watchdog.wait("Book.pdf")
+    assert clock.now == pytest.approx(1.0, abs=0.15)
+
+
+def test_progressing_download_outlives_stall_timeout(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock, stall_ms=500)
+    watchdog.snapshot()
+    partial = tmp_path / "Book.pdf.crdownload"
+    partial.write_bytes(b"x")
+
+    def grow(now):
+        if now < 3.0:
+            partial.write_bytes(b"x" * int(now * 100 + 2))
+        else:
+            partial.rename(tmp_path / "Book.pdf")
+
+    clock.on_sleep = grow
+    assert watchdog.wait("Book.pdf").endswith("Book.pdf")
+    assert clock.now >= 3.0
+
+
+def test_raises_when_transfer_stalls(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock, stall_ms=500)
+    watchdog.snapshot()
+    (tmp_path / "Book.pdf.crdownload").write_bytes(b"x" * 5)
+    with pytest.raises(DownloadStalledError, match="stalled"):
+        watchdog.wait("Book.pdf")
+    assert clock.now == pytest.approx(0.5, abs=0.15)
+
+
+def test_ignores_files_present_before_snapshot(tmp_path):
+    clock = FakeClock()
+    (tmp_path / "Old.pdf").write_bytes(b"old")
+    (tmp_path / "Leftover.crdownload").write_bytes(b"dead")
+    watchdog = _make_watchdog(tmp_path, clock, start_ms=300)
+    watchdog.snapshot()
+    with pytest.raises(DownloadStalledError, match="did not start"):
+        watchdog.wait("Book.pdf")
+
+
+def test_accepts_renamed_file_once_partials_are_gone(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock)
+    watchdog.snapshot()
+    (tmp_path / "Book (1).pdf").write_bytes(b"x")
+    assert watchdog.wait("Book.pdf").endswith("Book (1).pdf")
+
+
+def test_without_require_start_returns_none_when_nothing_visible(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock)
+    watchdog.snapshot()
+    assert watchdog.wait("Book.pdf", require_start=False) is None
+    assert clock.now == 0.0
+
+
+def test_follow_returns_when_browser_reports_completion(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock, stall_ms=1000)
+    watchdog.snapshot()
+    progress = DownloadProgress()
+    received = iter([10, 20, 20, 30])
+
+    def pump(ms):
+        clock.sleep(ms / 1000)
+        size = next(received, None)
+        progress.update({"state": "inProgress", "receivedBytes": size} if size else {"state": "completed"})
+
+    watchdog.follow(progress, pump)
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_follow_raises_when_bytes_stop_arriving(tmp_path):
+    clock = FakeClock()
+    watchdog = _make_watchdog(tmp_path, clock, stall_ms=1000)
+    watchdog.snapshot()
+    progress = DownloadProgress()
+    progress.update({"state": "inProgress", "receivedBytes": 100})
+    with pytest.raises(DownloadStalledError, match="100 bytes"):
+        watchdog.follow(progress, lambda ms: clock.sleep(ms / 1000))
+    assert 1.0 <= clock.now < 1.2
+
+
+def test_follow_raises_when_browser_cancels(tmp_path):
+    watchdog = _make_watchdog(tmp_path, FakeClock())
+    progress = DownloadProgress()
+    progress.update({"state": "canceled", "receivedBytes": 5})
+    with pytest.raises(DownloadStalledError, match="canceled"):
+        watchdog.follow(progress, lambda ms: None)
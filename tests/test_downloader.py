@@ -1,10 +1,12 @@
 from unittest.mock import MagicMock, patch
 import os
+import time
 
 import pytest
 
 from oceanofpdf_downloader.downloader import DownloadForm, parse_download_forms, BookDownloader
 from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.download_watchdog import DownloadProgress
 from oceanofpdf_downloader.models import BookRecord, BookState
 from oceanofpdf_downloader.repository import BookRepository
 
@@ -34,6 +36,21 @@ TWO_FORMS_HTML = """
 </body></html>
 """
 
+TWO_MIRRORS_HTML = """
+<html><body>
+<form method="post" action="https://oceanofpdf.com/Fetching_Resource.php">
+  <input type="hidden" name="id" value="srv1">
+  <input type="hidden" name="filename" value="MyBook.pdf">
+  <input type="submit" value="Download PDF">
+</form>
+<form method="post" action="https://oceanofpdf.com/Fetching_Resource.php">
+  <input type="hidden" name="id" value="srv2">
+  <input type="hidden" name="filename" value="MyBook.pdf">
+  <input type="submit" value="Download PDF">
+</form>
+</body></html>
+"""
+
 NO_FORMS_HTML = """
 <html><body>
 <p>No download forms here.</p>
@@ -112,7 +129,7 @@ class TestBookDownloader:
 
     def test_download_book_success(self, tmp_path):
         repo = BookRepository(db_path=":memory:")
-        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0)
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0, download_poll_interval_ms=10)
 
         mock_session = MagicMock()
 
@@ -137,6 +154,10 @@ class TestBookDownloader:
         mock_form_locator.locator.return_value = mock_ancestor_form
         mock_ancestor_form.locator.return_value = mock_submit
         mock_page.locator.return_value.first = mock_form_locator
+        # The browser reports the download complete over CDP
+        progress = DownloadProgress()
+        mock_session.download_progress.return_value = progress
+        mock_submit.click.side_effect = lambda: progress.update({"state": "completed", "receivedBytes": 4})
 
         mock_session.new_page.return_value = mock_page
         downloader = BookDownloader(config, repo, mock_session)
@@ -149,8 +170,38 @@ class TestBookDownloader:
         mock_download.save_as.assert_called_once_with(
             os.path.join(str(tmp_path), "MyBook.pdf")
         )
+        mock_download.delete.assert_called_once()
         mock_page.close.assert_called_once()
 
+    def test_download_book_cancels_stalled_awaited_download(self, tmp_path):
+        repo = BookRepository(db_path=":memory:")
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0,
+                        download_stall_timeout_ms=50, download_poll_interval_ms=10)
+
+        mock_page = MagicMock()
+        mock_page.content.return_value = SINGLE_FORM_HTML
+        mock_page.wait_for_timeout.side_effect = lambda ms: time.sleep(ms / 1000)
+        mock_download = mock_page.expect_download.return_value.__enter__.return_value.value
+        progress = DownloadProgress()
+        mock_submit = mock_page.locator.return_value.first.locator.return_value.locator.return_value
+        # Some bytes arrive, then nothing: the size holds but the browser never reports completion
+        mock_submit.click.side_effect = lambda: progress.update({"state": "inProgress", "receivedBytes": 100})
+        mock_session = MagicMock()
+        mock_session.new_page.return_value = mock_page
+        mock_session.download_progress.return_value = progress
+        downloader = BookDownloader(config, repo, mock_session)
+
+        assert downloader.download_book(self._make_record()) is False
+        mock_download.cancel.assert_called_once()
+        mock_download.save_as.assert_not_called()
+
+    def test_close_releases_watchdog(self, tmp_path):
+        downloader = BookDownloader(Config(max_pages=1, download_dir=str(tmp_path)),
+                                    BookRepository(db_path=":memory:"), MagicMock())
+        downloader.watchdog = MagicMock()
+        downloader.close()
+        downloader.watchdog.close.assert_called_once()
+
     def test_download_book_no_forms(self, tmp_path):
         repo = BookRepository(db_path=":memory:")
         config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0)
@@ -208,3 +259,108 @@ class TestBookDownloader:
 
         updated = repo.get_by_url("https://example.com/b")
         assert updated.state == BookState.RETRY
+
+    def test_download_book_without_await_returns_when_file_lands(self, tmp_path):
+        repo = BookRepository(db_path=":memory:")
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0,
+                        await_download=False, download_wait_ms=2000)
+
+        mock_page = MagicMock()
+        mock_page.content.return_value = SINGLE_FORM_HTML
+        mock_submit = mock_page.locator.return_value.first.locator.return_value.locator.return_value
+        mock_submit.click.side_effect = lambda: (tmp_path / "MyBook.pdf").write_bytes(b"%PDF")
+
+        mock_session = MagicMock()
+        mock_session.new_page.return_value = mock_page
+        downloader = BookDownloader(config, repo, mock_session)
+
+        assert downloader.download_book(self._make_record()) is True
+        mock_page.expect_download.assert_not_called()
+
+    def test_download_book_without_await_fails_when_nothing_arrives(self, tmp_path):
+        repo = BookRepository(db_path=":memory:")
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0,
+                        await_download=False, download_wait_ms=50, download_poll_interval_ms=10)
+
+        mock_page = MagicMock()
+        mock_page.content.return_value = SINGLE_FORM_HTML
+        mock_session = MagicMock()
+        mock_session.new_page.return_value = mock_page
+        downloader = BookDownloader(config, repo, mock_session)
+
+        assert downloader.download_book(self._make_record()) is False
+
+    def _mock_page_for(self, html, tmp_path, dead_servers=()):
+        """Page whose submit buttons write the clicked form's file into tmp_path."""
+        mock_page = MagicMock()
+        mock_page.content.return_value = html
+        clicked = []
+
+        def locator(selector):
+            server_id = selector.split('name="id"][value="')[1].split('"')[0]
+            filename = selector.split('name="filename"][value="')[1].split('"')[0]
+
+            def click():
+                clicked.append(filename if not dead_servers else (server_id, filename))
+                if server_id not in dead_servers:
+                    (tmp_path / filename).write_bytes(b"x" * 100)
+
+            submit = MagicMock()
+            submit.click.side_effect = click
+            loc = MagicMock()
+            loc.first.locator.return_value.locator.return_value = submit
+            return loc
+
+        mock_page.locator.side_effect = locator
+        return mock_page, clicked
+
+    def test_download_book_fetches_only_preferred_format(self, tmp_path):
+        repo = BookRepository(db_path=":memory:")
+        from oceanofpdf_downloader.models import Book
+        record = repo.insert_book(Book(title="T", detail_url="https://x/t", language="En", genre="F"))
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0,
+                        await_download=False, preferred_formats=["epub", "pdf"])
+        mock_page, clicked = self._mock_page_for(TWO_FORMS_HTML, tmp_path)
+        mock_session = MagicMock()
+        mock_session.new_page.return_value = mock_page
+
+        assert BookDownloader(config, repo, mock_session).download_book(record) is True
+        assert clicked == ["MyBook.epub"]
+        rows = repo._connect().execute(
+            "SELECT format, decision FROM format_decisions ORDER BY format").fetchall()
+        assert [tuple(r) for r in rows] == [("epub", "fetched"), ("pdf", "skipped")]
+
+    def test_download_book_falls_back_when_file_too_large(self, tmp_path):
+        repo = BookRepository(db_path=":memory:")
+        from oceanofpdf_downloader.format_policy import FormatPolicy
+        from oceanofpdf_downloader.models import Book
+        record = repo.insert_book(Book(title="T", detail_url="https://x/t", language="En", genre="F"))
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0, await_download=False)
+        mock_page, clicked = self._mock_page_for(TWO_FORMS_HTML, tmp_path)
+        mock_session = MagicMock()
+        mock_session.new_page.return_value = mock_page
+        downloader = BookDownloader(config, repo, mock_session)
+
+        policy = FormatPolicy(["epub", "pdf"], max_bytes=50)
+        assert downloader.download_book(record, policy=policy) is False
+        assert clicked == ["MyBook.epub", "MyBook.pdf"]
+        assert not (tmp_path / "MyBook.epub").exists()
+        assert repo.get_known_file_sizes(record.id) == {"MyBook.epub": 100, "MyBook.pdf": 100}
+
+    def test_download_book_tries_next_mirror_when_first_fails(self, tmp_path):
+        repo = BookRepository(db_path=":memory:")
+        from oceanofpdf_downloader.models import Book
+        record = repo.insert_book(Book(title="T", detail_url="https://x/t", language="En", genre="F"))
+        config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0, await_download=False,
+                        download_wait_ms=50, download_poll_interval_ms=10)
+        mock_page, clicked = self._mock_page_for(TWO_MIRRORS_HTML, tmp_path, dead_servers={"srv1"})
+        mock_session = MagicMock()
+        mock_session.new_page.return_value = mock_page
+        downloader = BookDownloader(config, repo, mock_session)
+
+        assert downloader.download_book(record) is True
+        assert clicked == [("srv1", "MyBook.pdf"), ("srv2", "MyBook.pdf")]
+        assert (tmp_path / "MyBook.pdf").exists()
+        assert downloader.mirrors.stats["srv1"].consecutive_failures == 1
+        rows = repo._connect().execute("SELECT decision FROM format_decisions").fetchall()
+        assert [r[0] for r in rows] == ["fetched"]
@@ -128,3 +128,105 @@ def test_search_books_partial_match():
     insert(repo, "Advanced Python Programming")
     results = repo.search_books("Pytho")
     assert len(results) == 1
+
+
+def test_search_books_matches_author():
+    repo = make_repo()
+    bid = insert(repo, "Sweet Temptation")
+    repo.fill_unknown_details(bid, author="Cora Kent")
+    results = repo.search_books("kent")
+    assert [r.title for r in results] == ["Sweet Temptation"]
+
+
+def test_search_books_phrase_query():
+    repo = make_repo()
+    insert(repo, "History of Rome")
+    insert(repo, "Rome History Atlas")
+    results = repo.search_books('"history of rome"')
+    assert [r.title for r in results] == ["History of Rome"]
+
+
+def test_search_books_all_words_must_match():
+    repo = make_repo()
+    insert(repo, "Python Programming")
+    insert(repo, "Python Cookbook")
+    results = repo.search_books("pyth cook")
+    assert [r.title for r in results] == ["Python Cookbook"]
+
+
+def test_search_books_ranks_title_hits_first():
+    repo = make_repo()
+    insert(repo, "A Garden Story", genre="Romance")
+    insert(repo, "Romance Collection", genre="Fiction")
+    results = repo.search_books("romance")
+    assert results[0].title == "Romance Collection"
+
+
+def test_search_index_follows_title_changes():
+    repo = make_repo()
+    bid = insert(repo, "Old Title")
+    repo._connect().execute("UPDATE books SET title = 'New Title' WHERE id = ?", (bid,))
+    assert repo.search_books("old") == []
+    assert len(repo.search_books("new")) == 1
+
+
+def test_search_books_punctuation_only_uses_like():
+    repo = make_repo()
+    insert(repo, "C++ Primer")
+    assert [r.title for r in repo.search_books("++")] == ["C++ Primer"]
+
+
+def test_fts_query():
+    from oceanofpdf_downloader.repository import fts_query
+    assert fts_query("pyth cook") == '"pyth"* "cook"*'
+    assert fts_query('"history of rome" atlas') == '"history of rome" "atlas"*'
+    assert fts_query("++") is None
+
+
+# --- page_books / iter_books / count_books ---
+
+def test_page_books_keyset_pagination_covers_all_rows():
+    repo = make_repo()
+    ids = [insert(repo, f"Book {i}") for i in range(7)]
+    repo.update_state(ids[2], BookState.BLACKLISTED)
+
+    seen = []
+    after = None
+    while True:
+        page = repo.page_books(after=after, limit=3, exclude_blacklisted=True)
+        seen.extend(page)
+        if len(page) < 3:
+            break
+        after = (page[-1].updated_at, page[-1].id)
+
+    assert len(seen) == 6
+    assert ids[2] not in {b.id for b in seen}
+    keys = [(b.updated_at, b.id) for b in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_iter_books_streams_one_state():
+    repo = make_repo()
+    ids = [insert(repo, f"Book {i}") for i in range(5)]
+    repo.update_states(ids[:3], BookState.DONE)
+    done = list(repo.iter_books(BookState.DONE, batch_size=2))
+    assert sorted(b.id for b in done) == sorted(ids[:3])
+
+
+def test_iter_books_with_query():
+    repo = make_repo()
+    insert(repo, "Python Programming")
+    insert(repo, "Java Basics")
+    insert(repo, "Python Cookbook")
+    assert {b.title for b in repo.iter_books(query="python", batch_size=1)} == {
+        "Python Programming", "Python Cookbook"}
+
+
+def test_count_books():
+    repo = make_repo()
+    ids = [insert(repo, f"Book {i}") for i in range(4)]
+    repo.update_state(ids[0], BookState.BLACKLISTED)
+    assert repo.count_books() == 4
+    assert repo.count_books(exclude_blacklisted=True) == 3
+    assert repo.count_books(state=BookState.NEW) == 3
+    assert repo.count_books(query="book", exclude_blacklisted=True) == 3
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from oceanofpdf_downloader.embedding_cache import EmbeddingCache
+from oceanofpdf_downloader.ml_selector import SentenceTransformerEmbedder
+
+
+def _vectors(n, dim=4, start=0):
+    return np.arange(start, start + n * dim, dtype=np.float32).reshape(n, dim) / 8
+
+
+def test_lookup_and_persist(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "org/model-a")
+    vectors, hit = cache.lookup(["x"])
+    assert not hit.any()
+
+    cache.add(["a", "b", "a"], _vectors(3))
+    assert len(cache) == 2
+    cache.add(["b", "c"], _vectors(2, start=100))
+    assert len(cache) == 3
+
+    reopened = EmbeddingCache(str(tmp_path), "org/model-a")
+    vectors, hit = reopened.lookup(["c", "zzz", "a", "b"])
+    assert hit.tolist() == [True, False, True, True]
+    assert vectors.dtype == np.float32
+    assert np.array_equal(vectors[[2, 3]], _vectors(2))
+    assert np.array_equal(vectors[0], _vectors(2, start=100)[1])
+    assert not vectors[1].any()
+
+
+def test_torn_append_is_cut_back(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m")
+    cache.add(["a", "b"], _vectors(2))
+    with open(os.path.join(cache.path, "vectors.f16"), "ab") as f:
+        f.write(b"\0" * 5)  # vectors of a row whose key was never written
+
+    reopened = EmbeddingCache(str(tmp_path), "m")
+    assert len(reopened) == 2
+    reopened.add(["c"], _vectors(1, start=50))
+    vectors, hit = EmbeddingCache(str(tmp_path), "m").lookup(["a", "b", "c"])
+    assert hit.all()
+    assert np.array_equal(vectors[2], _vectors(1, start=50)[0])
+
+
+def test_wrong_dimension_is_rejected(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m")
+    cache.add(["a"], _vectors(1))
+    with pytest.raises(ValueError):
+        cache.add(["b"], _vectors(1, dim=3))
+
+
+def test_add_sees_rows_other_writers_appended(tmp_path):
+    first, second = EmbeddingCache(str(tmp_path), "m"), EmbeddingCache(str(tmp_path), "m")
+    first.add(["a"], _vectors(1))
+    second.add(["a", "b"], _vectors(2, start=100))
+    assert len(second) == 2
+    vectors, hit = EmbeddingCache(str(tmp_path), "m").lookup(["a", "b"])
+    assert hit.all()
+    assert np.array_equal(vectors[0], _vectors(1)[0])
+
+
+def _add_rows(directory, start):
+    cache = EmbeddingCache(directory, "m")
+    for i in range(start, start + 40, 2):
+        cache.add([f"t{i}", f"t{i + 1}"], _vectors(2, start=i * 4))
+
+
+def test_concurrent_processes_never_interleave(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_add_rows, args=(str(tmp_path), start)) for start in (0, 20, 20, 40)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(p.exitcode == 0 for p in processes)
+
+    cache = EmbeddingCache(str(tmp_path), "m")
+    texts = [f"t{i}" for i in range(80)]
+    vectors, hit = cache.lookup(texts)
+    assert len(cache) == 80 and hit.all()
+    assert np.array_equal(vectors, _vectors(80))
+
+
+class _CountingEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_embedder_encodes_only_cache_misses(tmp_path):
+    embedder = SentenceTransformerEmbedder("m", cache_dir=str(tmp_path))
+    embedder._model = encoder = _CountingEncoder()
+    first = embedder.transform(["banana", "apple"])
+    second = embedder.transform(["apple", "kiwi", "banana"])
+    assert encoder.encoded == ["banana", "apple", "kiwi"]
+    assert np.array_equal(second[[0, 2]], first[[1, 0]])
+    assert second.dtype == np.float32
@@ -1,7 +1,23 @@
 from unittest.mock import patch
 
-from oceanofpdf_downloader.filters import filter_books, is_autoselected, is_blacklisted
-from oceanofpdf_downloader.models import Book
+from oceanofpdf_downloader import filters
+from oceanofpdf_downloader.filters import (
+    FilterMatch,
+    FilterStats,
+    KeywordMatcher,
+    autoselect_match,
+    blacklist_match,
+    classify,
+    flush_stats,
+    filter_books,
+    is_autoselected,
+    is_blacklisted,
+    report_rules,
+    rules_fingerprint,
+    sync_rules,
+)
+from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.repository import BookRepository
 
 
 def _book(title="Book A", genre="Fiction"):
@@ -74,3 +90,174 @@ class TestIsAutoselected:
 
     def test_empty_autoselect(self):
         assert is_autoselected(_book()) is False
+
+
+class TestKeywordMatcher:
+    def test_shared_prefixes(self):
+        matcher = KeywordMatcher(["Roman", "romance", "rome"])
+        assert matcher.search("a ROMANCE story") == "romance"
+        assert matcher.search("the roman empire") == "Roman"
+        assert matcher.search("all roads lead to rome") == "rome"
+        assert matcher.search("paris") is None
+
+    def test_regex_characters_are_literal(self):
+        matcher = KeywordMatcher(["c++", "(draft)"])
+        assert matcher.search("Learning C++ Fast") == "c++"
+        assert matcher.search("Notes (Draft)") == "(draft)"
+        assert matcher.search("cc draft") is None
+
+    def test_empty_list_matches_nothing(self):
+        assert KeywordMatcher([]).search("anything") is None
+
+    def test_matcher_is_compiled_once_per_rule_list(self):
+        words = ["romance"]
+        matcher = filters._matcher(words)
+        assert filters._matcher(words) is matcher
+        assert filters._matcher(["vampire"]).search("Dark Romance") is None
+        assert filters._matchers[id(words)][0] is words
+
+
+class TestMatchedRule:
+    @patch("oceanofpdf_downloader.filters._title_blacklist", ["romance", "Erotica"])
+    def test_blacklist_reports_field_and_keyword(self):
+        assert blacklist_match(_book(title="Dark Erotica")) == FilterMatch("title", "Erotica")
+        assert blacklist_match(_book(title="Algebra")) is None
+
+    @patch("oceanofpdf_downloader.filters._genre_autoselect", ["textbooks"])
+    def test_autoselect_reports_field_and_keyword(self):
+        assert autoselect_match(_book(genre="Math, Textbooks")) == FilterMatch("genre", "textbooks")
+
+    def test_list_changes_are_picked_up(self):
+        words = ["romance"]
+        with patch("oceanofpdf_downloader.filters._title_blacklist", words):
+            assert not is_blacklisted(_book(title="Thriller"))
+            words.append("thriller")
+            assert is_blacklisted(_book(title="Thriller"))
+
+
+class TestClassify:
+    @patch("oceanofpdf_downloader.filters._title_blacklist", ["romance"])
+    @patch("oceanofpdf_downloader.filters._genre_autoselect", ["textbooks"])
+    def test_initial_states(self):
+        assert classify(_book(title="Romance", genre="Textbooks")) == (
+            BookState.BLACKLISTED, FilterMatch("title", "romance"))
+        assert classify(_book(genre="Textbooks")) == (BookState.SCHEDULED, FilterMatch("genre", "textbooks"))
+        assert classify(_book()) == (BookState.NEW, None)
+
+
+class TestSyncRules:
+    def _repo(self):
+        repo = BookRepository(db_path=":memory:")
+        books = [_book(title=t) for t in ("Dark Romance", "Romance Atlas", "College Algebra", "Thriller")]
+        for i, book in enumerate(books):
+            book.detail_url = f"http://example.com/{i}"
+        with patch("oceanofpdf_downloader.filters._title_autoselect", ["atlas"]), \
+                patch("oceanofpdf_downloader.filters._title_blacklist", []):
+            repo.insert_books(books, [classify(b)[0] for b in books], source="filter")
+            sync_rules(repo)
+        return repo
+
+    def _states(self, repo):
+        return {r.title: r.state for r in repo.iter_books()}
+
+    def test_fingerprint_ignores_case_and_order(self):
+        assert rules_fingerprint({"title_blacklist": ["A", "b"]}) == rules_fingerprint({"title_blacklist": ["B", "a", "a"]})
+        assert rules_fingerprint({"title_blacklist": ["a"]}) != rules_fingerprint({"genre_blacklist": ["a"]})
+
+    def test_unchanged_rules_do_nothing(self):
+        repo = self._repo()
+        with patch("oceanofpdf_downloader.filters._title_autoselect", ["ATLAS"]):
+            assert sync_rules(repo) == []
+
+    @patch("oceanofpdf_downloader.filters._title_autoselect", ["atlas"])
+    @patch("oceanofpdf_downloader.filters._title_blacklist", ["romance"])
+    def test_added_blacklist_word_applies_to_new_and_rule_scheduled_books(self):
+        repo = self._repo()
+        repo.update_state(repo.get_by_url("http://example.com/3").id, BookState.SCHEDULED, source="selection")
+        changes = sync_rules(repo, dry_run=True)
+        assert sorted((c.record.title, c.state) for c in changes) == [
+            ("Dark Romance", BookState.BLACKLISTED), ("Romance Atlas", BookState.BLACKLISTED),
+        ]
+        assert self._states(repo)["Dark Romance"] == BookState.NEW
+
+        sync_rules(repo)
+        assert self._states(repo) == {
+            "Dark Romance": BookState.BLACKLISTED, "Romance Atlas": BookState.BLACKLISTED,
+            "College Algebra": BookState.NEW, "Thriller": BookState.SCHEDULED,
+        }
+        assert sync_rules(repo) == []
+
+    def test_removed_keywords_release_only_rule_decisions(self):
+        repo = self._repo()
+        with patch("oceanofpdf_downloader.filters._title_autoselect", ["atlas"]), \
+                patch("oceanofpdf_downloader.filters._title_blacklist", ["romance", "algebra"]):
+            sync_rules(repo)
+        algebra = repo.get_by_url("http://example.com/2").id
+        repo.update_state(algebra, BookState.NEW, source="editor")
+        repo.update_state(algebra, BookState.BLACKLISTED, source="editor")
+
+        with patch("oceanofpdf_downloader.filters._title_autoselect", ["atlas"]):
+            changes = sync_rules(repo)
+        assert sorted((c.record.title, c.state) for c in changes) == [
+            ("Dark Romance", BookState.NEW), ("Romance Atlas", BookState.SCHEDULED),
+        ]
+        assert self._states(repo)["College Algebra"] == BookState.BLACKLISTED
+
+
+class TestRuleStats:
+    @patch("oceanofpdf_downloader.filters._title_blacklist", ["romance", "Dark Romance", "vampire"])
+    @patch("oceanofpdf_downloader.filters._genre_autoselect", ["textbooks"])
+    def test_hits_are_counted_flushed_and_reported(self, monkeypatch):
+        monkeypatch.setattr(filters, "stats", FilterStats())
+        repo = BookRepository(db_path=":memory:")
+        for book in (_book(title="Romance"), _book(title="A romance"), _book(genre="Textbooks"), _book()):
+            classify(book)
+        assert filters.stats.hits == {("title_blacklist", "romance"): 2, ("genre_autoselect", "textbooks"): 1}
+        assert filters.stats.calls["title_blacklist"] == 4
+        assert filters.stats.calls["genre_autoselect"] == 2
+
+        flush_stats(repo)
+        assert not filters.stats
+        classify(_book(title="Romance"))
+        flush_stats(repo)
+
+        report = report_rules(repo)
+        assert report.hits[("title_blacklist", "romance")][0] == 3
+        assert report.dead == [("title_blacklist", "dark romance"), ("title_blacklist", "vampire")]
+        assert report.shadowed == []  # "Dark Romance" titles match "dark romance", the longer keyword
+        assert [(t.rule, t.keywords, t.calls) for t in sorted(report.timings, key=lambda t: t.rule)] == [
+            ("genre_autoselect", 1, 2), ("title_blacklist", 3, 5),
+        ]
+
+    def test_dry_run_sync_is_not_counted(self, monkeypatch):
+        repo = BookRepository(db_path=":memory:")
+        sync_rules(repo)
+        repo.insert_books([Book("Dark Romance", "http://example.com/1", "English", "Fiction"),
+                           Book("Romance Atlas", "http://example.com/2", "English", "Fiction")])
+        monkeypatch.setattr(filters, "stats", FilterStats())
+        with patch("oceanofpdf_downloader.filters._title_blacklist", ["romance"]):
+            assert len(sync_rules(repo, dry_run=True)) == 2
+            assert not filters.stats
+            assert len(sync_rules(repo)) == 2
+        assert filters.stats.hits == {("title_blacklist", "romance"): 2}
+
+    @patch("oceanofpdf_downloader.filters._genre_blacklist", ["erotica"])
+    @patch("oceanofpdf_downloader.filters._genre_autoselect", ["erotica thriller", "thriller"])
+    def test_autoselect_shadowed_by_blacklist(self):
+        report = report_rules(BookRepository(db_path=":memory:"))
+        assert report.since is None
+        assert report.shadowed == [("genre_autoselect", "erotica thriller", "genre_blacklist", "erotica")]
+
+    @patch("oceanofpdf_downloader.filters._title_blacklist", ["Roman", "romance"])
+    @patch("oceanofpdf_downloader.filters._title_autoselect", ["romance novel", "romantic", "novel"])
+    def test_shadowing_follows_the_compiled_matcher(self):
+        # Same list: the trie prefers the longer keyword, so neither "roman" nor "romance" is shadowed
+        assert blacklist_match(_book(title="Roman")) == FilterMatch("title", "Roman")
+        assert blacklist_match(_book(title="A Romance")) == FilterMatch("title", "romance")
+        # Across lists: the blacklist claims the autoselect keyword with what it actually matches
+        assert classify(_book(title="Romance Novel")) == (BookState.BLACKLISTED, FilterMatch("title", "romance"))
+        report = report_rules(BookRepository(db_path=":memory:"))
+        assert report.shadowed == [
+            ("title_autoselect", "romance novel", "title_blacklist", "romance"),
+            ("title_autoselect", "romantic", "title_blacklist", "roman"),
+        ]
@@ -0,0 +1,62 @@
+from oceanofpdf_downloader.format_policy import (
+    FALLBACK,
+    FETCH,
+    SKIPPED,
+    TOO_LARGE,
+    FormatDecision,
+    FormatPolicy,
+    form_format,
+)
+from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.repository import BookRepository
+
+
+def _decisions(plan):
+    return [(d.filename, d.decision) for d in plan]
+
+
+def test_form_format():
+    assert form_format("_OceanofPDF.com_My_Book.EPUB") == "epub"
+    assert form_format("noext") == ""
+
+
+def test_prefers_first_format_and_keeps_other_as_fallback():
+    policy = FormatPolicy(["epub", "pdf"])
+    plan = policy.plan(["Book.pdf", "Book.epub"])
+    assert _decisions(plan) == [("Book.epub", FETCH), ("Book.pdf", FALLBACK)]
+
+
+def test_fetch_all_fetches_every_wanted_format():
+    policy = FormatPolicy(["epub", "pdf"], fetch_all=True)
+    assert _decisions(policy.plan(["Book.pdf", "Book.epub"])) == [("Book.epub", FETCH), ("Book.pdf", FETCH)]
+
+
+def test_unwanted_format_is_skipped():
+    policy = FormatPolicy(["epub"])
+    assert _decisions(policy.plan(["Book.pdf", "Book.epub"])) == [("Book.epub", FETCH), ("Book.pdf", SKIPPED)]
+
+
+def test_known_oversize_form_is_skipped_and_fallback_promoted():
+    policy = FormatPolicy(["epub", "pdf"], max_bytes=1000)
+    plan = policy.plan(["Book.pdf", "Book.epub"], sizes={"Book.epub": 5000})
+    assert _decisions(plan) == [("Book.pdf", FETCH), ("Book.epub", TOO_LARGE)]
+
+
+def test_missing_format_query():
+    repo = BookRepository(db_path=":memory:")
+    a = repo.insert_book(Book(title="A", detail_url="https://a", language="En", genre="F"))
+    b = repo.insert_book(Book(title="B", detail_url="https://b", language="En", genre="F"))
+    for record in (a, b):
+        repo.update_state(record.id, BookState.DONE)
+    repo.record_format_decisions(a.id, [
+        FormatDecision("A.epub", "epub", "fetched", "preferred format", 100),
+        FormatDecision("A.pdf", "pdf", "skipped", "epub already fetched"),
+    ])
+    repo.record_format_decisions(b.id, [
+        FormatDecision("B.epub", "epub", "fetched", "all formats wanted", 100),
+        FormatDecision("B.pdf", "pdf", "fetched", "all formats wanted", 900),
+    ])
+
+    assert [r.id for r in repo.get_books_missing_format("pdf")] == [a.id]
+    assert repo.get_books_missing_format("epub") == []
+    assert repo.get_known_file_sizes(b.id) == {"B.epub": 100, "B.pdf": 900}
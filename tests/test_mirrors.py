@@ -0,0 +1,75 @@
+from oceanofpdf_downloader.downloader import DownloadForm
+from oceanofpdf_downloader.mirrors import MirrorHealth
+from oceanofpdf_downloader.models import ServerStats
+from oceanofpdf_downloader.repository import BookRepository
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _forms(*server_ids):
+    return [DownloadForm(server_id=s, filename=f"{s}.pdf") for s in server_ids]
+
+
+def test_unknown_servers_keep_page_order():
+    health = MirrorHealth()
+    assert [f.server_id for f in health.order(_forms("srv1", "srv2"))] == ["srv1", "srv2"]
+
+
+def test_failing_server_is_tried_last():
+    health = MirrorHealth()
+    health.record_failure("srv1", 5.0)
+    health.record_success("srv2", 2.0, 1_000_000)
+    assert [f.server_id for f in health.order(_forms("srv1", "srv2"))] == ["srv2", "srv1"]
+
+
+def test_faster_server_wins_between_healthy_ones():
+    health = MirrorHealth()
+    health.record_success("slow", 10.0, 1_000_000)
+    health.record_success("fast", 1.0, 1_000_000)
+    assert [f.server_id for f in health.order(_forms("slow", "fast"))] == ["fast", "slow"]
+
+
+def test_circuit_opens_after_threshold_and_recovers():
+    clock = FakeClock()
+    health = MirrorHealth(failure_threshold=2, cooldown_seconds=60, clock=clock)
+    health.record_failure("srv1", 1.0)
+    assert not health.is_open("srv1")
+    health.record_failure("srv1", 1.0)
+    assert health.is_open("srv1")
+    assert [f.server_id for f in health.order(_forms("srv1", "srv2"))] == ["srv2"]
+
+    clock.now += 61
+    assert not health.is_open("srv1")
+    health.record_success("srv1", 1.0)
+    assert health.stats["srv1"].consecutive_failures == 0
+
+
+def test_all_open_still_returns_forms():
+    clock = FakeClock()
+    health = MirrorHealth(failure_threshold=1, cooldown_seconds=60, clock=clock)
+    health.record_failure("srv1", 1.0)
+    assert [f.server_id for f in health.order(_forms("srv1"))] == ["srv1"]
+
+
+def test_pause_backs_off_with_consecutive_failures():
+    health = MirrorHealth(failure_threshold=10)
+    assert health.pause_for("srv1", 2.0) == 2.0
+    health.record_failure("srv1", 1.0)
+    health.record_failure("srv1", 1.0)
+    assert health.pause_for("srv1", 2.0) == 6.0
+
+
+def test_stats_persist_through_repository():
+    repo = BookRepository(db_path=":memory:")
+    repo.save_mirror_stats({"srv1": ServerStats(attempts=3, successes=2, success_rate=0.6, latency_s=1.5)})
+    repo.save_mirror_stats({"srv1": ServerStats(attempts=4, successes=3, success_rate=0.7, latency_s=1.2)})
+    loaded = repo.load_mirror_stats()
+    assert loaded["srv1"].attempts == 4
+    assert loaded["srv1"].latency_s == 1.2
+    assert loaded["srv1"].throughput_bps is None
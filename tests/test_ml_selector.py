@@ -0,0 +1,128 @@
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+
+from oceanofpdf_downloader import ml_selector
+from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.ml_selector import MLSelector, SentenceTransformerEmbedder
+from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.repository import BookRepository
+
+
+def _book(title, genre="Fiction"):
+    return Book(title=title, detail_url=f"http://example.com/{title}", language="English", genre=genre)
+
+
+def _selector():
+    # A hashing vectoriser stands in for the sentence transformer so scoring runs offline
+    ml = MLSelector(Config(max_pages=1))
+    ml._pipeline = Pipeline([
+        ("embed", HashingVectorizer(n_features=256)),
+        ("clf", LogisticRegression()),
+    ]).fit(
+        ["algebra textbooks", "calculus textbooks", "physics textbooks", "dark romance", "vampire romance", "love"],
+        [1, 1, 1, 0, 0, 0],
+    )
+    return ml
+
+
+def test_score_batch_matches_single_scores(monkeypatch):
+    monkeypatch.setattr(ml_selector, "SCORE_CHUNK_SIZE", 2)
+    ml = _selector()
+    books = [_book("Linear Algebra", "Textbooks"), _book("Dark Romance"), _book("Calculus", "Textbooks")]
+    scores = ml.score_batch(iter(books))
+    assert scores.shape == (3,)
+    assert scores[0] > 0.5 > scores[1]
+    assert np.allclose(scores, [ml.score(b) for b in books])
+
+
+def test_predict_batch_applies_threshold():
+    ml = _selector()
+    ml.config.ml_confidence_threshold = 0.5
+    books = [_book("Linear Algebra", "Textbooks"), _book("Dark Romance")]
+    assert ml.predict_batch(books).tolist() == [True, False]
+    assert ml.predict(books[0]) is True
+
+
+def test_score_batch_empty_and_unloaded():
+    assert _selector().score_batch([]).shape == (0,)
+    with pytest.raises(RuntimeError):
+        MLSelector(Config(max_pages=1)).score_batch([_book("A")])
+
+
+def test_embedder_pickle_keeps_settings_not_weights():
+    embedder = SentenceTransformerEmbedder("some-model", batch_size=32)
+    embedder._model = object()
+    restored = pickle.loads(pickle.dumps(embedder))
+    assert (restored.model_name, restored.batch_size, restored._model) == ("some-model", 32, None)
+
+    old = SentenceTransformerEmbedder.__new__(SentenceTransformerEmbedder)
+    old.__setstate__({"model_name": "some-model", "_model": None})
+    assert old.batch_size == 128
+
+
+def test_refresh_scores_only_scores_stale_books():
+    repo = BookRepository(db_path=":memory:")
+    repo.insert_books([_book("Linear Algebra", "Textbooks"), _book("Dark Romance"), _book("Calculus", "Textbooks")])
+    ml = _selector()
+    ml.model_id = "m1"
+    assert ml.refresh_scores(repo, [BookState.NEW]) == (3, 0)
+    assert ml.refresh_scores(repo, [BookState.NEW]) == (0, 0)
+    stats = repo.score_stats("m1", ml.config.ml_confidence_threshold)
+    assert stats[BookState.NEW][0] == 3
+
+    # A retrained model with the opposite taste flips the decisions
+    ml.config.ml_confidence_threshold = 0.5
+    ml._pipeline.named_steps["clf"].coef_ *= -1
+    ml._pipeline.named_steps["clf"].intercept_ *= -1
+    ml.model_id = "m2"
+    assert ml.refresh_scores(repo, [BookState.NEW]) == (3, 3)
+
+
+def _online_selector(tmp_path):
+    ml = MLSelector(Config(max_pages=1, ml_online_updates=True, ml_full_retrain_every=4,
+                           ml_model_path=str(tmp_path / "model.pkl"), ml_embedding_cache_dir=None))
+    ml._pipeline = Pipeline([
+        ("embed", HashingVectorizer(n_features=256)),
+        ("clf", SGDClassifier(loss="log_loss", random_state=0)),
+    ]).fit(["algebra textbooks", "calculus textbooks", "dark romance", "vampire romance"], [1, 1, 0, 0])
+    ml.model_id = "base"
+    return ml
+
+
+def test_update_learns_online_and_checkpoints(tmp_path):
+    ml = _online_selector(tmp_path)
+    book = _book("Poetry Anthology", "Poetry")
+    before = ml.score(book)
+    for _ in range(3):
+        ml.update([(book, 1)])
+    assert ml.score(book) > before
+    assert (ml.model_id, ml.online_updates) == ("base+3", 3)
+
+    restored = MLSelector(ml.config)
+    assert restored.load()
+    assert (restored.model_id, restored.online_updates) == ("base+3", 3)
+    assert restored.score(book) == pytest.approx(ml.score(book))
+    assert not (tmp_path / "model.pkl.tmp").exists()
+
+
+def test_update_triggers_periodic_full_retrain(tmp_path, monkeypatch):
+    ml = _online_selector(tmp_path)
+    retrained = []
+    monkeypatch.setattr(ml, "train", lambda repo, compare_with=None: retrained.append(compare_with))
+    repo = BookRepository(db_path=":memory:")
+    ml.update([(_book("A"), 0), (_book("B"), 1)], repo)
+    assert retrained == []
+    ml.update([(_book("C"), 0), (_book("D"), 1)], repo)
+    assert retrained == [ml._pipeline]
+
+
+def test_update_needs_an_online_model():
+    ml = _selector()
+    ml.model_id = "base"
+    ml.update([(_book("Poetry"), 1)])
+    assert (ml.model_id, ml.online_updates) == ("base", 0)
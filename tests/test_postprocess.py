@@ -0,0 +1,133 @@
+import hashlib
+import os
+import zipfile
+
+from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.models import Book
+from oceanofpdf_downloader.postprocess import (
+    PostProcessor,
+    extract_epub_metadata,
+    extract_pdf_metadata,
+    library_path,
+    process_download,
+)
+from oceanofpdf_downloader.repository import BookRepository
+
+CONTAINER_XML = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>
+"""
+
+CONTENT_OPF = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    <dc:title>Sweet Temptation</dc:title>
+    <dc:creator>Cora Kent</dc:creator>
+    <dc:identifier opf:scheme="uuid">1234567890-abcd</dc:identifier>
+    <dc:identifier opf:scheme="ISBN">978-1-4028-9462-6</dc:identifier>
+    <dc:language>en-US</dc:language>
+    <dc:subject>Romance</dc:subject>
+    <dc:subject>Contemporary</dc:subject>
+  </metadata>
+</package>
+"""
+
+RAW_PDF = (
+    b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+    b"2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >> endobj\n"
+    b"3 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+    b"4 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+    b"5 0 obj << /Author (Margaret L. Lial) >> endobj\n"
+    b"BT (ISBN: 0-306-40615-2) Tj ET\n%%EOF\n"
+)
+
+
+def _write_epub(path):
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("mimetype", "application/epub+zip")
+        zf.writestr("META-INF/container.xml", CONTAINER_XML)
+        zf.writestr("OEBPS/content.opf", CONTENT_OPF)
+
+
+def test_extract_epub_metadata(tmp_path):
+    path = tmp_path / "Book.epub"
+    _write_epub(path)
+    meta = extract_epub_metadata(str(path))
+    assert meta.author == "Cora Kent"
+    assert meta.isbn == "9781402894626"
+    assert meta.language == "English"
+    assert meta.genre == "Romance, Contemporary"
+    assert meta.page_count is None
+
+
+def test_extract_pdf_metadata_raw(tmp_path, monkeypatch):
+    import builtins
+    real_import = builtins.__import__
+
+    def no_pypdf(name, *args, **kwargs):
+        if name == "pypdf":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_pypdf)
+    path = tmp_path / "Book.pdf"
+    path.write_bytes(RAW_PDF)
+    meta = extract_pdf_metadata(str(path))
+    assert meta.page_count == 2
+    assert meta.author == "Margaret L. Lial"
+    assert meta.isbn == "0306406152"
+
+
+def test_library_path_uses_first_genre_and_sanitises():
+    path = library_path("/books", "{language}/{genre}", "a.pdf", "English", "Sci/Fi, Fantasy")
+    assert path == os.path.join("/books", "English", "Sci_Fi", "a.pdf")
+
+
+def test_library_path_empty_layout():
+    assert library_path("/books", "", "a.pdf", "English", "Fiction") == os.path.join("/books", "a.pdf")
+
+
+def test_process_download_moves_and_fills_unknown(tmp_path):
+    src = tmp_path / "Book.epub"
+    _write_epub(src)
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()
+
+    result = process_download(7, str(src), "Unknown", "Unknown", str(tmp_path), "{language}/{genre}")
+
+    assert result.book_id == 7
+    assert result.path == os.path.join(str(tmp_path), "English", "Romance", "Book.epub")
+    assert os.path.exists(result.path)
+    assert not src.exists()
+    assert result.sha256 == digest
+
+
+def test_process_download_does_not_overwrite(tmp_path):
+    (tmp_path / "English" / "Fiction").mkdir(parents=True)
+    (tmp_path / "English" / "Fiction" / "Book.pdf").write_bytes(b"other")
+    src = tmp_path / "Book.pdf"
+    src.write_bytes(RAW_PDF)
+
+    result = process_download(1, str(src), "English", "Fiction", str(tmp_path), "{language}/{genre}")
+
+    assert result.path.endswith("Book (1).pdf")
+    assert (tmp_path / "English" / "Fiction" / "Book.pdf").read_bytes() == b"other"
+
+
+def test_post_processor_writes_back_to_repository(tmp_path):
+    repo = BookRepository(db_path=":memory:")
+    record = repo.insert_book(Book(title="Sweet", detail_url="https://x/sweet", language="Unknown", genre="Unknown"))
+    src = tmp_path / "Book.epub"
+    _write_epub(src)
+    config = Config(max_pages=1, download_dir=str(tmp_path), post_process_workers=1)
+
+    with PostProcessor(config, repo) as processor:
+        processor.submit(record, str(src))
+
+    updated = repo.get_by_url("https://x/sweet")
+    assert updated.language == "English"
+    assert updated.genre == "Romance, Contemporary"
+    row = repo._connect().execute("SELECT author, isbn, path FROM book_files WHERE book_id = ?", (record.id,)).fetchone()
+    assert row["author"] == "Cora Kent"
+    assert row["isbn"] == "9781402894626"
+    assert os.path.exists(row["path"])
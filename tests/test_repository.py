@@ -1,5 +1,13 @@
+import multiprocessing
+import sqlite3
+import threading
+
+import pytest
+
 from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader import repository
 from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.utils import url_key
 
 
 def test_create_table():
@@ -76,3 +84,376 @@ def test_update_state():
     updated = repo.get_by_url("https://test")
     assert updated.state == BookState.SCHEDULED
     assert updated.updated_at >= record.updated_at
+
+
+def test_fill_unknown_details_only_replaces_unknown():
+    repo = BookRepository(db_path=":memory:")
+    a = repo.insert_book(Book(title="A", detail_url="https://a", language="Unknown", genre="Fiction"))
+    repo.fill_unknown_details(a.id, language="English", genre="Romance")
+    updated = repo.get_by_url("https://a")
+    assert updated.language == "English"
+    assert updated.genre == "Fiction"
+
+
+def test_get_expected_sizes_averages_per_genre():
+    repo = BookRepository(db_path=":memory:")
+    a = repo.insert_book(Book(title="A", detail_url="https://a", language="En", genre="Textbooks"))
+    b = repo.insert_book(Book(title="B", detail_url="https://b", language="En", genre="Fiction"))
+    repo.add_book_file(a.id, "/a.pdf", "h1", 3000)
+    repo.add_book_file(a.id, "/a.epub", "h2", 1000)
+    repo.add_book_file(b.id, "/b.epub", "h3", 1000)
+    sizes = repo.get_expected_sizes()
+    assert sizes["Textbooks"] == 4000
+    assert sizes["Fiction"] == 1000
+    assert sizes[""] == 2500
+
+
+def test_insert_books_returns_only_new_rows():
+    repo = BookRepository(db_path=":memory:")
+    repo.insert_book(Book(title="A", detail_url="https://a", language="En", genre="F"))
+    records = repo.insert_books([
+        Book(title="A", detail_url="https://a", language="En", genre="F"),
+        Book(title="B", detail_url="https://b", language="En", genre="F"),
+        Book(title="B again", detail_url="https://b", language="En", genre="F"),
+        Book(title="C", detail_url="https://c", language="De", genre="S"),
+    ])
+    assert [r.title for r in records] == ["B", "C"]
+    assert all(r.state == BookState.NEW and r.id for r in records)
+
+
+def test_insert_books_is_atomic():
+    repo = BookRepository(db_path=":memory:")
+    books = [
+        Book(title="A", detail_url="https://a", language="En", genre="F"),
+        Book(title=["not", "bindable"], detail_url="https://b", language="En", genre="F"),
+    ]
+    with pytest.raises(sqlite3.Error):
+        repo.insert_books(books)
+    assert repo.get_by_url("https://a") is None
+
+
+def test_insert_books_with_initial_states():
+    repo = BookRepository(db_path=":memory:")
+    records = repo.insert_books([
+        Book(title=t, detail_url=f"https://{t}", language="En", genre="F") for t in "abc"
+    ], [BookState.BLACKLISTED, BookState.SCHEDULED, BookState.NEW], source="filter")
+    assert [r.state for r in records] == [BookState.BLACKLISTED, BookState.SCHEDULED, BookState.NEW]
+    assert repo.state_counts()[BookState.BLACKLISTED] == 1
+    logged = repo.get_transitions(source="filter")
+    assert [(t["book_id"], t["from_state"], t["to_state"]) for t in logged] == [
+        (records[0].id, "new", "blacklisted"), (records[1].id, "new", "scheduled"),
+    ]
+    repo.revert_transitions("2000-01-01 00:00", source="filter")
+    assert repo.get_by_url("https://a").state == BookState.NEW
+
+
+def test_update_states_and_apply_state_changes():
+    repo = BookRepository(db_path=":memory:")
+    records = repo.insert_books([
+        Book(title=t, detail_url=f"https://{t}", language="En", genre="F") for t in "abc"
+    ])
+    repo.update_states([records[0].id, records[1].id], BookState.SCHEDULED)
+    repo.apply_state_changes([(records[1].id, BookState.DONE), (records[2].id, BookState.SKIPPED)])
+    assert repo.get_by_url("https://a").state == BookState.SCHEDULED
+    assert repo.get_by_url("https://b").state == BookState.DONE
+    assert repo.get_by_url("https://c").state == BookState.SKIPPED
+    repo.update_states([], BookState.DONE)
+
+
+def test_migrations_record_schema_version():
+    from oceanofpdf_downloader.repository import SCHEMA_VERSION
+    repo = BookRepository(db_path=":memory:")
+    assert repo.schema_version() == SCHEMA_VERSION
+    indexes = {row[0] for row in repo._connect().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_books_state_updated" in indexes
+    assert "idx_books_updated" in indexes
+
+
+def test_migrates_pre_migration_database_and_enables_wal(tmp_path):
+    from oceanofpdf_downloader.repository import CREATE_TABLE_SQL, SCHEMA_VERSION
+    path = str(tmp_path / "books.db")
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute("INSERT INTO books (title, detail_url) VALUES ('Old', 'https://old')")
+    conn.commit()
+    conn.close()
+
+    repo = BookRepository(db_path=path)
+    assert repo.schema_version() == SCHEMA_VERSION
+    assert repo.get_by_url("https://old").title == "Old"
+    assert repo._connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    # Re-opening an up-to-date database applies nothing
+    assert BookRepository(db_path=path).schema_version() == SCHEMA_VERSION
+
+
+def test_by_state_query_uses_index():
+    repo = BookRepository(db_path=":memory:")
+    plan = repo._connect().execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM books WHERE state = ?", ("new",)).fetchall()
+    assert any("idx_books_state_updated" in row[-1] for row in plan)
+
+
+def test_records_are_slotted_and_share_interned_values():
+    repo = BookRepository(db_path=":memory:")
+    repo.insert_books([
+        Book(title=f"Book {i}", detail_url=f"https://example.com/{i}",
+             language="".join(["Eng", "lish"]), genre="".join(["Fic", "tion"]))
+        for i in range(3)
+    ])
+    records = repo.get_books_by_state(BookState.NEW)
+    assert not hasattr(records[0], "__dict__")
+    assert records[0].state is BookState.NEW
+    assert records[0].language is records[1].language is records[2].language
+    assert records[0].genre is records[2].genre
+
+
+def test_lookup_tables_populated_at_import():
+    repo = BookRepository(db_path=":memory:")
+    repo.insert_books([
+        Book("A", "https://example.com/a", "English", "Historical Fiction, Romance", "Jane Doe"),
+        Book("B", "https://example.com/b", "English", "Romance", "John Roe"),
+        Book("C", "https://example.com/c", "German", "Unknown"),
+    ])
+    assert {b.title for b in repo.get_books_by_genre("Romance")} == {"A", "B"}
+    assert [b.title for b in repo.get_books_by_genre("Historical Fiction")] == ["A"]
+    assert [b.title for b in repo.get_books_by_author("Jane Doe")] == ["A"]
+    assert repo.genre_counts() == {"Romance": 2, "Historical Fiction": 1}
+    conn = repo._connect()
+    assert conn.execute("SELECT COUNT(*) FROM languages").fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM books WHERE language_id IS NULL").fetchone()[0] == 0
+
+
+def test_fill_unknown_details_relinks_lookups():
+    repo = BookRepository(db_path=":memory:")
+    record = repo.insert_book(Book("C", "https://example.com/c", "Unknown", "Unknown"))
+    repo.fill_unknown_details(record.id, genre="Thriller", author="Ann Author")
+    assert [b.id for b in repo.get_books_by_genre("Thriller")] == [record.id]
+    assert [b.id for b in repo.get_books_by_author("Ann Author")] == [record.id]
+    assert repo.genre_counts(BookState.DONE) == {}
+
+
+def test_migration_backfills_new_columns_and_tables(tmp_path, monkeypatch):
+    path = str(tmp_path / "books.db")
+    monkeypatch.setattr(repository, "SCHEMA_VERSION", 3)
+    with BookRepository(path)._connect() as conn:
+        conn.execute("""INSERT INTO books (title, detail_url, language, genre, state)
+                        VALUES ('A', 'https://example.com/a', 'English', 'Fiction, Drama', 'done'),
+                               ('A', 'https://example.com/a/', 'Unknown', 'Unknown', 'new')""")
+    monkeypatch.undo()
+    repo = BookRepository(path)
+    assert repo.schema_version() == repository.SCHEMA_VERSION
+    assert repo.genre_counts() == {"Drama": 1, "Fiction": 1}
+    assert repo.state_counts() == {BookState.DONE: 1, BookState.NEW: 1}
+    # URL variants: the older book keeps the url_key
+    assert repo.get_by_url("https://example.com/a/").state == BookState.DONE
+
+
+def test_migration_rekeys_urls_with_query_parameters(tmp_path, monkeypatch):
+    path = str(tmp_path / "books.db")
+    monkeypatch.setattr(repository, "SCHEMA_VERSION", repository.SCHEMA_VERSION - 1)
+    with BookRepository(path)._connect() as conn:
+        # Keys as they were when the query string was dropped: the second book clashed and got none
+        conn.execute("""INSERT INTO books (title, detail_url, language, genre, state, url_key)
+                        VALUES ('A', 'https://example.com/read?id=1', 'English', 'Fiction', 'done', ?),
+                               ('B', 'https://example.com/read?id=2', 'English', 'Fiction', 'new', NULL)""",
+                     (url_key("https://example.com/read"),))
+    monkeypatch.undo()
+    repo = BookRepository(path)
+    assert repo.schema_version() == repository.SCHEMA_VERSION
+    assert repo.get_by_url("https://example.com/read?id=1").title == "A"
+    assert repo.get_by_url("https://example.com/read?id=2&utm_source=x").title == "B"
+    assert repo.get_by_url("https://example.com/read") is None
+
+
+def test_each_thread_gets_its_own_connection(tmp_path):
+    repo = BookRepository(str(tmp_path / "books.db"))
+    other = []
+    thread = threading.Thread(target=lambda: other.append(repo._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not repo._connect()
+    repo.close()
+
+
+def _write_books(path: str, prefix: str, n: int) -> None:
+    repo = BookRepository(path, busy_timeout=0.05)
+    for i in range(n):
+        record = repo.insert_book(Book(f"{prefix} {i}", f"https://example.com/{prefix}/{i}", "English", "Fiction"))
+        repo.update_state(record.id, BookState.SCHEDULED)
+    repo.close()
+
+
+def test_concurrent_processes_and_threads_can_write(tmp_path):
+    path = str(tmp_path / "books.db")
+    BookRepository(path).close()
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_write_books, args=(path, f"p{n}", 30)) for n in range(2)]
+    threads = [threading.Thread(target=_write_books, args=(path, f"t{n}", 30)) for n in range(2)]
+    for worker in processes + threads:
+        worker.start()
+    for worker in processes + threads:
+        worker.join()
+    assert all(p.exitcode == 0 for p in processes)
+    assert len(BookRepository(path).get_books_by_state(BookState.SCHEDULED)) == 120
+
+
+def test_write_retries_while_database_locked(tmp_path):
+    path = str(tmp_path / "books.db")
+    repo = BookRepository(path, busy_timeout=0.01)
+    blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.2, lambda: blocker.execute("COMMIT")).start()
+    assert repo.insert_book(Book("A", "https://example.com/a", "English", "Fiction")) is not None
+
+
+def test_batch_writer_flush_writes_states_and_transitions(tmp_path):
+    repo = BookRepository(str(tmp_path / "books.db"))
+    ids = [r.id for r in repo.insert_books([Book(f"B{i}", f"https://example.com/{i}", "English", "Fiction")
+                                            for i in range(10)])]
+    with repo.writer(max_batch=4) as writer:
+        for i in ids[:5]:
+            writer.update_state(i, BookState.DONE, source="download")
+        for i in ids[5:]:
+            writer.update_state(i, BookState.SKIPPED, source="editor")
+        writer.flush()
+        assert len(repo.get_books_by_state(BookState.DONE)) == 5
+        assert len(repo.get_books_by_state(BookState.SKIPPED)) == 5
+        assert repo.state_counts() == {BookState.DONE: 5, BookState.SKIPPED: 5}
+        transitions = repo.get_transitions()
+        assert sorted((t["book_id"], t["to_state"], t["source"]) for t in transitions) == sorted(
+            [(i, BookState.DONE.value, "download") for i in ids[:5]]
+            + [(i, BookState.SKIPPED.value, "editor") for i in ids[5:]]
+        )
+
+        writer.update_state(ids[0], BookState.DONE, source="download")
+        writer.flush()
+        assert len(repo.get_transitions()) == 10
+
+
+def test_state_changes_are_logged_with_source():
+    repo = BookRepository(db_path=":memory:")
+    record = repo.insert_book(Book("A", "https://example.com/a", "English", "Fiction"))
+    repo.update_state(record.id, BookState.SCHEDULED, source="filter")
+    repo.update_state(record.id, BookState.SCHEDULED, source="filter")
+    repo.update_state(record.id, BookState.DONE, source="download")
+    log = [(t["from_state"], t["to_state"], t["source"]) for t in repo.get_transitions(book_id=record.id)]
+    assert log == [("new", "scheduled", "filter"), ("scheduled", "done", "download")]
+
+
+def test_revert_transitions_by_source_and_window():
+    repo = BookRepository(db_path=":memory:")
+    ids = [r.id for r in repo.insert_books([
+        Book(f"B{i}", f"https://example.com/{i}", "English", "Fiction") for i in range(4)])]
+    repo.update_states(ids[:2], BookState.SCHEDULED, source="ml")
+    repo.update_states(ids[:2], BookState.BLACKLISTED, source="accident")
+    repo.update_states(ids[2:], BookState.BLACKLISTED, source="accident")
+    repo.update_state(ids[3], BookState.DONE, source="editor")
+    since = repo.get_transitions(source="accident")[0]["created_at"]
+
+    assert repo.revert_transitions(since, source="accident") == 3
+    assert {b.id for b in repo.get_books_by_state(BookState.SCHEDULED)} == set(ids[:2])
+    assert [b.id for b in repo.get_books_by_state(BookState.NEW)] == [ids[2]]
+    # changed again by the editor after the accident: left alone
+    assert [b.id for b in repo.get_books_by_state(BookState.DONE)] == [ids[3]]
+    assert len(repo.get_transitions(source="revert")) == 3
+    assert repo.revert_transitions(since, source="accident") == 0
+
+
+def test_state_counts_follow_inserts_and_changes():
+    repo = BookRepository(db_path=":memory:")
+    ids = [r.id for r in repo.insert_books([
+        Book(f"B{i}", f"https://example.com/{i}", "English", "Fiction") for i in range(5)])]
+    repo.update_states(ids[:2], BookState.BLACKLISTED)
+    repo.update_state(ids[2], BookState.DONE)
+    assert repo.state_counts() == {BookState.NEW: 2, BookState.BLACKLISTED: 2, BookState.DONE: 1}
+    assert repo.count_books(exclude_blacklisted=True) == 3
+    assert repo.count_books(state=BookState.NEW) == 2
+
+
+def test_url_variants_are_one_book():
+    repo = BookRepository(db_path=":memory:")
+    first = repo.insert_book(Book("A", "https://oceanofpdf.com/authors/x/book-a/", "English", "Fiction"))
+    assert repo.insert_book(Book("A", "http://www.oceanofpdf.com/authors/x/book-a?ref=nr", "Unknown", "Unknown")) is None
+    assert repo.get_by_url("https://oceanofpdf.com/authors/x/book-a").id == first.id
+
+
+def _age(repo: BookRepository, days: int) -> None:
+    with repo._connect() as conn:
+        conn.execute(f"UPDATE books SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now', '-{days} days')")
+
+
+def test_archive_moves_old_settled_books():
+    repo = BookRepository(db_path=":memory:")
+    ids = [r.id for r in repo.insert_books([
+        Book(f"B{i}", f"https://example.com/{i}", "English", "Fiction") for i in range(4)])]
+    repo.update_states(ids[:2], BookState.SKIPPED)
+    repo.update_state(ids[2], BookState.DONE)
+    _age(repo, 40)
+    repo.update_state(ids[1], BookState.BLACKLISTED)  # recent change: stays hot
+
+    assert repo.archive_books(30) == 1
+    assert ids[0] not in {b.id for b in repo.get_all_books()}
+    assert repo.state_counts() == {BookState.BLACKLISTED: 1, BookState.DONE: 1, BookState.NEW: 1}
+    assert [b.id for b in repo.get_books_by_state(BookState.SKIPPED, include_archived=True)] == [ids[0]]
+    assert repo.get_by_url("https://example.com/0/").id == ids[0]
+    # an archived URL is still known and not imported again
+    assert repo.insert_book(Book("B0", "https://example.com/0", "English", "Fiction")) is None
+
+
+def test_compact(tmp_path):
+    repo = BookRepository(str(tmp_path / "books.db"))
+    repo.insert_books([Book(f"B{i}", f"https://example.com/{i}", "English", "Fiction") for i in range(50)])
+    repo.compact()
+    assert len(repo.search_books("B1")) >= 1
+
+
+def test_books_with_keywords():
+    repo = BookRepository(db_path=":memory:")
+    records = repo.insert_books([
+        Book("Dark ROMANCE", "https://a", "English", "Fiction"),
+        Book("Ärzte Handbuch", "https://b", "German", "Medicine"),
+        Book("Algebra", "https://c", "English", "Textbooks"),
+    ])
+    repo.update_state(records[2].id, BookState.SCHEDULED, source="selection")
+    assert [r.title for r in repo.books_with_keywords(BookState.NEW, "title", ["romance", "zzz"])] == ["Dark ROMANCE"]
+    assert repo.books_with_keywords(BookState.SCHEDULED, "genre", ["textbooks"], sources=("filter",)) == []
+    assert len(repo.books_with_keywords(BookState.SCHEDULED, "genre", ["textbooks"], sources=("selection",))) == 1
+    # Non-ASCII keywords are not pushed down; every book in the state is a candidate
+    assert len(repo.books_with_keywords(BookState.NEW, "title", ["ärzte"])) == 2
+    with pytest.raises(ValueError):
+        repo.books_with_keywords(BookState.NEW, "state", ["new"])
+
+
+def test_record_filter_stats_accumulates():
+    repo = BookRepository(db_path=":memory:")
+    repo.record_filter_stats({("title_blacklist", "romance"): 2}, {"title_blacklist": (10, 5000)})
+    repo.record_filter_stats({("title_blacklist", "romance"): 1, ("genre_autoselect", "math"): 4},
+                             {"title_blacklist": (5, 1000), "genre_autoselect": (3, 900)})
+    hits = repo.filter_rule_hits()
+    assert {key: count for key, (count, _) in hits.items()} == {
+        ("title_blacklist", "romance"): 3, ("genre_autoselect", "math"): 4,
+    }
+    assert {rule: timing[:2] for rule, timing in repo.filter_timings().items()} == {
+        "title_blacklist": (15, 6000), "genre_autoselect": (3, 900),
+    }
+
+
+def test_stored_scores_and_stats():
+    repo = BookRepository(db_path=":memory:")
+    ids = [r.id for r in repo.insert_books([Book(f"B{i}", f"https://example.com/{i}", "English", "Fiction")
+                                            for i in range(5)])]
+    repo.update_state(ids[0], BookState.DONE)
+    assert [[b.id for b in batch] for batch in repo.iter_unscored_books("m1", [BookState.NEW], 3)] == [ids[1:4], ids[4:]]
+
+    repo.store_scores([(ids[0], 0.9), (ids[1], 0.8), (ids[2], 0.1)], "m1")
+    repo.store_scores([(ids[3], 0.5)], "m0")
+    assert [b.id for batch in repo.iter_unscored_books("m1", [BookState.NEW, BookState.DONE]) for b in batch] == ids[3:]
+    assert repo.get_scores([ids[0], ids[3], ids[4]]) == {ids[0]: (0.9, "m1"), ids[3]: (0.5, "m0")}
+
+    stats = repo.score_stats("m1", 0.7)
+    assert stats[BookState.DONE] == (1, 1, 0.9, 0.9, 0.9)
+    total, above, avg, low, high = stats[BookState.NEW]
+    assert (total, above, low, high) == (2, 1, 0.1, 0.8)
+    assert avg == pytest.approx(0.45)
@@ -0,0 +1,81 @@
+import datetime
+from collections import namedtuple
+from unittest.mock import MagicMock
+
+from oceanofpdf_downloader.config import Config
+from oceanofpdf_downloader.downloader import BookDownloader
+from oceanofpdf_downloader.models import Book, BookRecord, BookState
+from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.scheduler import DownloadBudget, DownloadScheduler, Priority, parse_deadline
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+def _record(id, genre="Fiction"):
+    return BookRecord(id=id, title=f"Book {id}", detail_url=f"https://x/{id}", language="English",
+                      genre=genre, state=BookState.SCHEDULED, created_at="", updated_at="")
+
+
+def test_order_by_priority_then_score_then_size():
+    scheduler = DownloadScheduler(DownloadBudget(), "/tmp", expected_sizes={"Textbooks": 50e6, "Fiction": 1e6})
+    ml_low, ml_high, auto, selected, selected_big = (
+        _record(1), _record(2), _record(3), _record(4), _record(5, genre="Textbooks"),
+    )
+    scheduler.prioritise([ml_low, ml_high], Priority.ML, {1: 0.75, 2: 0.95})
+    scheduler.prioritise([auto], Priority.AUTOSELECT)
+    scheduler.prioritise([selected_big, selected], Priority.SELECTED)
+
+    ordered = scheduler.order([ml_low, ml_high, auto, selected_big, selected])
+
+    assert [r.id for r in ordered] == [4, 5, 3, 2, 1]
+
+
+def test_highest_priority_wins():
+    scheduler = DownloadScheduler(DownloadBudget(), "/tmp")
+    record = _record(1)
+    scheduler.prioritise([record], Priority.SELECTED)
+    scheduler.prioritise([record], Priority.ML)
+    assert scheduler._priorities[1] == Priority.SELECTED
+
+
+def test_stop_reasons():
+    disk = DiskUsage(0, 0, 100 * 1024 * 1024)
+    scheduler = DownloadScheduler(
+        DownloadBudget(max_books=2, max_bytes=10 * 1024 * 1024, min_free_bytes=50 * 1024 * 1024, deadline=100.0),
+        "/tmp", expected_sizes={"Fiction": 4 * 1024 * 1024}, clock=lambda: 50.0, disk_usage=lambda _: disk,
+    )
+    assert scheduler.stop_reason(0, 0, _record(1)) is None
+    assert "book limit" in scheduler.stop_reason(2, 0, _record(1))
+    assert "byte budget" in scheduler.stop_reason(1, 7 * 1024 * 1024, _record(1))
+
+    disk = DiskUsage(0, 0, 10 * 1024 * 1024)
+    assert "free disk" in scheduler.stop_reason(0, 0, _record(1))
+
+    disk = DiskUsage(0, 0, 100 * 1024 * 1024)
+    scheduler._clock = lambda: 100.0
+    assert "deadline" in scheduler.stop_reason(0, 0, _record(1))
+
+
+def test_parse_deadline_rolls_over_to_tomorrow():
+    now = datetime.datetime(2026, 3, 1, 23, 30)
+    assert parse_deadline("07:00", now) == datetime.datetime(2026, 3, 2, 7, 0).timestamp()
+    assert parse_deadline("23:45", now) == datetime.datetime(2026, 3, 1, 23, 45).timestamp()
+    assert parse_deadline("", now) is None
+
+
+def test_download_all_stops_at_budget_and_leaves_rest_scheduled(tmp_path):
+    repo = BookRepository(db_path=":memory:")
+    for name in ("a", "b", "c"):
+        record = repo.insert_book(Book(title=name, detail_url=f"https://x/{name}", language="En", genre="F"))
+        repo.update_state(record.id, BookState.SCHEDULED)
+
+    config = Config(max_pages=1, download_dir=str(tmp_path), pause_seconds=0)
+    downloader = BookDownloader(config, repo, MagicMock())
+    downloader.download_book = MagicMock(return_value=True)
+    scheduler = DownloadScheduler(DownloadBudget(max_books=2), str(tmp_path))
+
+    records = repo.get_books_by_state(BookState.SCHEDULED)
+    done = downloader.download_all(records, MagicMock(), scheduler=scheduler)
+
+    assert done == 2
+    assert len(repo.get_books_by_state(BookState.SCHEDULED)) == 1
@@ -29,6 +29,7 @@ def test_parse_single_book():
     assert book.detail_url == "https://oceanofpdf.com/authors/a-denise/pdf-epub-state-of-betrayal-blurred-lines-1-download/"
     assert book.language == "English"
     assert book.genre == "Historical Fiction, Historical Romance, Christmas"
+    assert book.author == "A. Denise"
 
 
 # Three books: both fields present / genre absent / both absent.
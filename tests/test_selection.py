@@ -117,6 +117,17 @@ def test_select_books_all_selected():
     assert all(r.state == BookState.SCHEDULED for r in result)
 
 
+def test_select_books_passes_decisions_to_learner():
+    repo, records = _make_repo_with_books(3)
+    console = Console(file=open("/dev/null", "w"))
+    learned = []
+
+    with patch("oceanofpdf_downloader.selection.Prompt.ask", return_value="2"):
+        select_books(records, repo, console, learn=learned.extend)
+
+    assert [(record.title, label) for record, label in learned] == [("Book 1", 0), ("Book 2", 1), ("Book 3", 0)]
+
+
 def test_select_books_empty_list():
     repo = BookRepository(db_path=":memory:")
     console = Console(file=open("/dev/null", "w"))
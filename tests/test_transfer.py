@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from oceanofpdf_downloader import transfer
+from oceanofpdf_downloader.models import Book, BookState
+from oceanofpdf_downloader.repository import BookRepository
+
+
+def make_repo(n: int = 5) -> BookRepository:
+    repo = BookRepository(db_path=":memory:")
+    records = repo.insert_books([
+        Book(f"Book {i}", f"https://oceanofpdf.com/b/{i}/", "English", "Fiction, Drama", "Jane Doe")
+        for i in range(n)
+    ])
+    repo.update_state(records[0].id, BookState.DONE)
+    return repo
+
+
+@pytest.mark.parametrize("name", [f"books{suffix}" for suffix in transfer.SUFFIXES])
+def test_export_import_round_trip(tmp_path, name):
+    if name.endswith(".parquet"):
+        pytest.importorskip("pyarrow")
+    path = str(tmp_path / name)
+    assert transfer.export_books(make_repo(), path) == (path, 5)
+
+    target = BookRepository(db_path=":memory:")
+    assert transfer.import_books(target, path) == 5
+    assert len(target.get_books_by_state(BookState.NEW)) == 4
+    assert [b.title for b in target.get_books_by_state(BookState.DONE)] == ["Book 0"]
+    assert target.genre_counts() == {"Drama": 5, "Fiction": 5}
+    assert not (tmp_path / f"{name}.import-progress").exists()
+
+
+def test_parquet_falls_back_to_csv_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "_have_pyarrow", lambda: False)
+    path, count = transfer.export_books(make_repo(), str(tmp_path / "books.parquet"))
+    assert path.endswith("books.csv") and count == 5
+
+
+@pytest.mark.parametrize("name", ["books.parquet.gz", "books.csv.bz2", "books.txt"])
+def test_export_rejects_targets_it_cannot_write(tmp_path, name):
+    with pytest.raises(ValueError):
+        transfer.export_books(make_repo(), str(tmp_path / name))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_import_keeps_newer_local_rows_and_logs_state_changes(tmp_path):
+    path = str(tmp_path / "books.jsonl")
+    transfer.export_books(make_repo(), path)
+    target = make_repo()
+    newer = target.get_by_url("https://oceanofpdf.com/b/1/")
+    target.update_state(newer.id, BookState.SKIPPED)
+
+    transfer.import_books(target, path)
+    assert target.get_by_url("https://oceanofpdf.com/b/1/").state == BookState.SKIPPED
+    assert target.state_counts()[BookState.DONE] == 1
+
+
+def test_import_resumes_after_committed_batches(tmp_path, monkeypatch):
+    path = str(tmp_path / "books.jsonl")
+    transfer.export_books(make_repo(10), path)
+    target = BookRepository(db_path=":memory:")
+    calls = []
+    original = target.upsert_rows
+
+    def failing_upsert(rows):
+        calls.append(len(rows))
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return original(rows)
+
+    monkeypatch.setattr(target, "upsert_rows", failing_upsert)
+    with pytest.raises(KeyboardInterrupt):
+        transfer.import_books(target, path, batch_size=3)
+    assert json.loads((tmp_path / "books.jsonl.import-progress").read_text())["rows"] == 6
+
+    monkeypatch.setattr(target, "upsert_rows", original)
+    assert transfer.import_books(target, path, batch_size=3) == 4
+    assert target.count_books() == 10
+
+
+def test_import_restarts_when_the_file_changed(tmp_path):
+    path = str(tmp_path / "books.jsonl")
+    transfer.export_books(make_repo(3), path)
+    transfer._write_progress(path, 2)
+    assert transfer._read_progress(path) == 2
+    transfer.export_books(make_repo(4), path)
+    assert transfer._read_progress(path) == 0
+
+    target = BookRepository(db_path=":memory:")
+    assert transfer.import_books(target, path) == 4
+
+
+@pytest.mark.parametrize("name", ["books.jsonl", "books.csv"])
+def test_archived_rows_are_imported_into_the_archive(tmp_path, name):
+    source = make_repo(4)
+    source.update_states([source.get_by_url(f"https://oceanofpdf.com/b/{i}/").id for i in (1, 2)],
+                         BookState.SKIPPED)
+    with source._connect() as conn:
+        conn.execute("UPDATE books SET updated_at = '2020-01-01 00:00:00.000'")
+    assert source.archive_books(30) == 2
+    path = str(tmp_path / name)
+    transfer.export_books(source, path)
+
+    target = make_repo(1)
+    assert transfer.import_books(target, path) == 3
+    assert target.state_counts() == {BookState.DONE: 1, BookState.NEW: 1}
+    assert target.get_books_by_state(BookState.SKIPPED) == []
+    assert [b.title for b in target.get_books_by_state(BookState.SKIPPED, include_archived=True)] == [
+        "Book 1", "Book 2"]
+    assert transfer.import_books(target, path) == 0
@@ -0,0 +1,57 @@
+from unittest.mock import MagicMock
+
+from oceanofpdf_downloader.models import Book
+from oceanofpdf_downloader.repository import BookRepository
+from oceanofpdf_downloader.scraper import is_known
+from oceanofpdf_downloader.url_filter import KnownUrlFilter
+
+
+def make_repo(n: int) -> BookRepository:
+    repo = BookRepository(db_path=":memory:")
+    repo.insert_books([Book(f"B{i}", f"https://oceanofpdf.com/b/{i}/", "English", "Fiction") for i in range(n)])
+    return repo
+
+
+def test_exact_filter_from_repository():
+    known = KnownUrlFilter.from_repository(make_repo(20))
+    assert not known.bloom
+    assert "http://www.oceanofpdf.com/b/3" in known
+    assert "https://oceanofpdf.com/b/99/" not in known
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    known = KnownUrlFilter.from_repository(make_repo(2000), bloom_threshold=100)
+    assert known.bloom
+    assert all(f"https://oceanofpdf.com/b/{i}/" in known for i in range(2000))
+    false_positives = sum(f"https://oceanofpdf.com/other/{i}/" in known for i in range(5000))
+    assert false_positives < 5000 * 0.03
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "known.bin")
+    repo = make_repo(50)
+    for threshold in (1000, 10):
+        known = KnownUrlFilter.from_repository(repo, bloom_threshold=threshold)
+        known.save(path, repo.url_key_fingerprint())
+        loaded = KnownUrlFilter.load(path, repo.url_key_fingerprint())
+        assert loaded.bloom == known.bloom
+        assert all(f"https://oceanofpdf.com/b/{i}/" in loaded for i in range(50))
+
+
+def test_open_rebuilds_stale_snapshot(tmp_path):
+    path = str(tmp_path / "known.bin")
+    repo = make_repo(5)
+    KnownUrlFilter.open(repo, path)
+    repo.insert_book(Book("New", "https://oceanofpdf.com/b/new/", "English", "Fiction"))
+    assert KnownUrlFilter.load(path, repo.url_key_fingerprint()) is None
+    assert "https://oceanofpdf.com/b/new/" in KnownUrlFilter.open(repo, path)
+
+
+def test_is_known_only_queries_db_on_bloom_maybe():
+    repo = MagicMock()
+    known = KnownUrlFilter(expected=10, bloom=True)
+    known.add("https://oceanofpdf.com/b/1/")
+    assert not is_known("https://oceanofpdf.com/b/2/", repo, known)
+    repo.get_by_url.assert_not_called()
+    assert is_known("https://oceanofpdf.com/b/1/", repo, known)
+    repo.get_by_url.assert_called_once_with("https://oceanofpdf.com/b/1/")
@@ -1,4 +1,4 @@
-from oceanofpdf_downloader.utils import rename_file
+from oceanofpdf_downloader.utils import canonical_url, rename_file, split_genres, url_key
 
 
 def test_rename_file_strips_prefix():
@@ -15,3 +15,28 @@ def test_rename_file_empty():
 
 def test_rename_file_epub():
     assert rename_file("_OceanofPDF.com_My_Book.epub") == "My_Book.epub"
+
+
+def test_split_genres():
+    assert split_genres("Historical Fiction, Historical Romance,Christmas") == [
+        "Historical Fiction", "Historical Romance", "Christmas"]
+    assert split_genres("Fiction, Fiction, ") == ["Fiction"]
+    assert split_genres("Unknown") == []
+
+
+def test_canonical_url():
+    assert canonical_url("http://www.OceanofPDF.com/authors/x//book/?ref=1#top") == "oceanofpdf.com/authors/x/book"
+    assert canonical_url("https://oceanofpdf.com/authors/x/book") == "oceanofpdf.com/authors/x/book"
+    assert canonical_url("https://oceanofpdf.com/x/?utm_source=a&p=2&fbclid=z&id=B") == "oceanofpdf.com/x?id=B&p=2"
+
+
+def test_url_key_matches_variants():
+    assert url_key("https://oceanofpdf.com/a/b/") == url_key("http://www.oceanofpdf.com/a/b?utm=1")
+    assert url_key("https://oceanofpdf.com/a/b/") != url_key("https://oceanofpdf.com/a/c/")
+    assert url_key("https://oceanofpdf.com/a/b?p=2&id=1") == url_key("https://oceanofpdf.com/a/b/?id=1&utm_medium=x&p=2")
+    assert -(2 ** 63) <= url_key("https://oceanofpdf.com/a/b/") < 2 ** 63
+
+
+def test_url_key_keeps_meaningful_query_parameters():
+    assert url_key("https://oceanofpdf.com/read?id=1") != url_key("https://oceanofpdf.com/read?id=2")
+    assert url_key("https://oceanofpdf.com/read?id=1") != url_key("https://oceanofpdf.com/read")